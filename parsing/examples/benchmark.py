@@ -0,0 +1,21 @@
+import sys
+import time
+from compare import language
+from pg.grammar import Grammar, augmented
+from pg.items import lr0_collection
+
+
+def main(levels=(100, 500, 1000)):
+    print(f'{"grammar":<16}{"productions":>12}{"states":>10}{"items":>10}{"transitions":>13}{"time":>10}')
+    for n in levels:
+        grammar = augmented(Grammar(language(n)))
+        start = time.perf_counter()
+        collection = lr0_collection(grammar)
+        seconds = time.perf_counter() - start
+        items = sum(len(item_set) for item_set in collection.item_sets)
+        print(f'{f"language({n})":<16}{len(grammar.productions):>12}{len(collection):>10}{items:>10}'
+              f'{len(collection.transitions):>13}{seconds:>8.3f} s')
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or (100, 500, 1000))
@@ -0,0 +1,89 @@
+import sys
+import time
+from pg import lalr, lr, slr
+from pg.error import ConflictError
+from pg.grammar import Grammar
+
+
+# Sample grammars
+expressions = [
+    ['E', 'E', '+', 'T'],
+    ['E', 'T'],
+    ['T', 'T', '*', 'F'],
+    ['T', 'F'],
+    ['F', '(', 'E', ')'],
+    ['F', 'id']
+]
+
+# LALR(1), but not SLR(1)
+pointers = [
+    ['S', 'L', '=', 'R'],
+    ['S', 'R'],
+    ['L', '*', 'R'],
+    ['L', 'id'],
+    ['R', 'L']
+]
+
+# LR(1), but not LALR(1)
+not_lalr = [
+    ['S', 'a', 'E', 'c'],
+    ['S', 'a', 'F', 'd'],
+    ['S', 'b', 'F', 'c'],
+    ['S', 'b', 'E', 'd'],
+    ['E', 'e'],
+    ['F', 'e']
+]
+
+
+def language(levels):
+    """Statements and expressions with given number of binary operator precedence levels."""
+    productions = [
+        ['Program', 'Stmts'],
+        ['Stmts', 'Stmts', 'Stmt'],
+        ['Stmts', 'Stmt'],
+        ['Stmt', 'id', '=', 'E0', ';'],
+        ['Stmt', 'if', '(', 'E0', ')', 'Stmt'],
+        ['Stmt', 'while', '(', 'E0', ')', 'Stmt'],
+        ['Stmt', 'return', 'E0', ';'],
+        ['Stmt', '{', 'Stmts', '}'],
+    ]
+    for i in range(levels):
+        productions += [[f'E{i}', f'E{i}', f'op{i}', f'E{i + 1}'], [f'E{i}', f'E{i + 1}']]
+    productions += [
+        [f'E{levels}', '-', f'E{levels}'],
+        [f'E{levels}', '(', 'E0', ')'],
+        [f'E{levels}', 'id'],
+        [f'E{levels}', 'id', '(', 'Args', ')'],
+        ['Args', 'Args', ',', 'E0'],
+        ['Args', 'E0'],
+    ]
+    return productions
+
+
+def measure(build_table, grammar):
+    start = time.perf_counter()
+    try:
+        action, _ = build_table(grammar)
+    except ConflictError:
+        states, status = '-', 'conflict'
+    else:
+        states, status = len(action), 'ok'
+    return states, status, time.perf_counter() - start
+
+
+def main(levels=(5, 20, 40)):
+    grammars = [('expressions', expressions), ('pointers', pointers), ('not LALR(1)', not_lalr)]
+    grammars += [(f'language({n})', language(n)) for n in levels]
+    builders = [('SLR(1)', slr.build_table), ('LALR(1)', lalr.build_table), ('LR(1)', lr.build_table)]
+
+    print(f'{"grammar":<16}{"productions":>12}' + ''.join(f'{name:>28}' for name, _ in builders))
+    for name, productions in grammars:
+        row = f'{name:<16}{len(productions):>12}'
+        for _, build_table in builders:
+            states, status, seconds = measure(build_table, Grammar(productions))
+            row += f'{states:>6} states {status:<8} {seconds:>7.3f} s'
+        print(row)
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or (5, 20, 40))
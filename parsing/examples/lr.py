@@ -0,0 +1,43 @@
+from pprint import pprint
+from pg.grammar import augmented, Grammar
+from pg.items import item_repr, lr1_items
+from pg.lr import LR1Parser
+
+
+# LR(1)-grammar which is not SLR(1) (assignments of pointer dereferences)
+productions = [
+    ['S', 'L', '=', 'R'],
+    ['S', 'R'],
+    ['L', '*', 'R'],
+    ['L', 'id'],
+    ['R', 'L']
+]
+
+print('Augmented grammar:')
+grammar = Grammar(productions)
+aug_grammar = augmented(grammar)
+pprint(list(enumerate(aug_grammar.productions)))
+
+
+print('Canonical collection of LR(1)-item sets:')
+collection = lr1_items(aug_grammar)
+
+for item_set in collection.item_sets:
+    pprint([(item_repr(item, aug_grammar), sorted(collection.lookaheads(bits))) for item, bits in item_set.items()])
+pprint(collection.transitions)
+
+
+# Parsing
+parser = LR1Parser(grammar)
+
+print('LR(1)-parser action table:')
+pprint(list(enumerate(parser.action)))
+
+print('LR(1)-parser goto table:')
+pprint(list(enumerate(parser.goto)))
+
+string = ['*', 'id', '=', 'id']
+
+print(f'Right-most derivation for {" ".join(string)}:')
+derivation = parser.run(string)
+pprint(derivation)
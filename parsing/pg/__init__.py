@@ -1,2 +1,4 @@
 from .ll import LLParser
 from .slr import SLRParser
+from .lr import LR1Parser
+from .lalr import LALRParser
@@ -28,6 +28,19 @@ class Grammar:
         self.start = productions[0][0]
 
 
+def productions_by_lhs(grammar):
+    """Map (non-terminal -> numbers of its productions)."""
+    by_lhs = {nt: [] for nt in grammar.non_terminals}
+    for i, prod in enumerate(grammar.productions):
+        by_lhs[prod[0]].append(i)
+    return by_lhs
+
+
+def rhs(production):
+    """Right-hand side of the production (empty for EPS productions)."""
+    return [] if production[1:] == [EPS] else production[1:]
+
+
 def augmented(grammar):
     n_grammar = Grammar(grammar.productions)
     n_start = n_grammar.start + '<AUG>'
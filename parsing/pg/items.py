@@ -1,12 +1,12 @@
 from collections import defaultdict
-from copy import copy
 from dataclasses import dataclass
-from typing import Dict, List, Set, Tuple
-from pg.util import EPS
+from typing import Dict, List, NamedTuple, Set, Tuple
+from pg.grammar import productions_by_lhs, rhs
+from pg.util import END, EPS, FirstFollow, digraph
 
 
-@dataclass(frozen=True)
-class LR0Item:
+# Tuple - hashed and compared natively (collections of large grammars have millions of items)
+class LR0Item(NamedTuple):
     prod_no: int
     position: int
 
@@ -29,87 +29,227 @@ class LR0Collection:
         return len(self.item_sets)
 
 
+class LR0Context:
+    """Augmented grammar indexed for construction of LR(0)-item sets.
+
+    Items added to closures by each non-terminal (its initial items and the ones of non-terminals they start
+    with) and kernels they lead to are computed once per non-terminal, closures and kernels of a state are
+    unions of these (frozen) sets with ones of its kernel items.
+    """
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+        # Symbol after the dot for each production and position, None at the end of production
+        self.next_symbols = [list(prod[1:]) + [None] for prod in grammar.productions]
+
+        # Closure items of non-terminals - F(A) = initial items of A | F(B) for B starting productions of A
+        by_lhs = productions_by_lhs(grammar)
+        non_terminals = sorted(grammar.non_terminals)
+        initial = {NT: frozenset(LR0Item(prod_no, 0) for prod_no in by_lhs[NT]) for NT in non_terminals}
+        starts = {NT: {self.next_symbols[prod_no][0] for prod_no in by_lhs[NT]} & grammar.non_terminals
+                  for NT in non_terminals}
+        self.nt_closures = digraph(non_terminals, starts, initial)
+        self.nt_kernels = {}
+        self.initial_moves = [(symbols[0], LR0Item(prod_no, 1) if symbols[0] not in (None, EPS) else None)
+                              for prod_no, symbols in enumerate(self.next_symbols)]
+
+    def next_symbol(self, item):
+        return self.next_symbols[item.prod_no][item.position]
+
+    def nt_kernel(self, NT):
+        kernels = self.nt_kernels.get(NT)
+        if kernels is None:
+            # Closure items are initial ones, items they lead to are created once for all states
+            kernels = defaultdict(list)
+            for item in self.nt_closures[NT]:
+                symbol, next_item = self.initial_moves[item.prod_no]
+                if next_item is not None:
+                    kernels[symbol].append(next_item)
+            kernels = self.nt_kernels[NT] = {symbol: frozenset(kernel) for symbol, kernel in kernels.items()}
+        return kernels
+
+    def advance(self, items):
+        """Items with the dot moved over the symbol after it, map (symbol -> frozenset of items)."""
+        kernels = defaultdict(list)
+        for item in items:
+            symbol = self.next_symbols[item.prod_no][item.position]
+            if symbol is not None and symbol != EPS:
+                kernels[symbol].append(LR0Item(item.prod_no, item.position + 1))
+        return {symbol: frozenset(kernel) for symbol, kernel in kernels.items()}
+
+    def closure(self, kernel):
+        closure = set(kernel)
+        for item in kernel:
+            symbol = self.next_symbol(item)
+            if symbol in self.grammar.non_terminals:
+                closure |= self.nt_closures[symbol]
+        return closure
+
+    def kernels(self, kernel):
+        """Kernels of item sets reached from the item set of given kernel, map (symbol -> kernel)."""
+        kernels = self.advance(kernel)
+        for NT in {self.next_symbol(item) for item in kernel} & self.grammar.non_terminals:
+            for symbol, items in self.nt_kernel(NT).items():
+                kernels[symbol] = kernels[symbol] | items if symbol in kernels else items
+        return kernels
+
+
 def lr0_collection(grammar):
-    # Initialize collection of LR(0)-item sets
-    init_item = LR0Item(0, 0)
-    init_set = lr0_closure({init_item}, grammar)
+    context = LR0Context(grammar)
 
-    item_sets = [init_set]
+    # Initialize collection of LR(0)-item sets
+    init_kernel = frozenset({LR0Item(0, 0)})
+    kernels = [init_kernel]
+    states = {init_kernel: 0}  # kernel -> state
     transitions = {}
 
-    # Build item sets for all viable prefixes
-    while True:
-        changed = False
-        n_sets = len(item_sets)
+    # Build item sets for all viable prefixes - each state is expanded once (in order of creation),
+    # states reached are found by hashing their kernels
+    state = 0
+    while state < len(kernels):
+        for symbol, kernel in sorted(context.kernels(kernels[state]).items()):
+            next_state = states.get(kernel)
+            if next_state is None:
+                next_state = states[kernel] = len(kernels)
+                kernels.append(kernel)
+            transitions[(state, symbol)] = next_state
+        state += 1
 
-        for state in range(n_sets):
-            item_set = item_sets[state]
+    return LR0Collection([context.closure(kernel) for kernel in kernels], transitions)
 
-            for symbol in grammar.non_terminals | grammar.terminals:
-                goto_set = lr0_goto(item_set, symbol, grammar)
 
-                if not goto_set: 
-                    continue
+def lr0_closure(item_set, grammar, context=None):
+    return (context or LR0Context(grammar)).closure(item_set)
 
-                for j, i_set in enumerate(item_sets):
-                    if goto_set == i_set:
-                        transitions[(state, symbol)] = j
-                        break
-                else:
-                    transitions[(state, symbol)] = len(item_sets)
-                    item_sets.append(goto_set)
-                    changed = True
 
-        if not changed:
-            break
+def lr0_kernels(item_set, grammar, context=None):
+    """Kernels of item sets reached from given item set, map (symbol -> kernel)."""
+    return (context or LR0Context(grammar)).advance(item_set)
 
-    return LR0Collection(item_sets, transitions)
 
+def lr0_goto(item_set, symbol, grammar):
+    kernel = lr0_kernels(item_set, grammar).get(symbol)
+    return lr0_closure(kernel, grammar) if kernel else set()
 
-def lr0_closure(item_set, grammar):
-    closure = copy(item_set)
-  
-    while True:
-        new_items = set()
 
-        # TODO: no need to consider all items every time
-        for item in closure:
-            prod = grammar.productions[item.prod_no]
+# LR(1) items are kept as LR(0) items (cores) mapped to their lookahead sets. Lookahead sets are bitsets -
+# ints with bit i set for terminal number i (see LR1Collection.terminals), so merging them is a single `|`.
+@dataclass
+class LR1Collection:
+    item_sets: List[Dict[LR0Item, int]]
+    transitions: Dict[Tuple[int, str], int]
+    terminals: List[str]
 
-            if item.position < len(prod) - 1 and prod[item.position + 1] in grammar.non_terminals:
-                NT = prod[item.position + 1]
+    def __len__(self):
+        return len(self.item_sets)
 
-                # Find all productions with this NT on the left
-                rhss = [i for i, prod in enumerate(grammar.productions) if prod[0] == NT]
-                new_items.update([LR0Item(rhs, 0) for rhs in rhss])
+    def lookaheads(self, bits):
+        return {t for i, t in enumerate(self.terminals) if bits >> i & 1}
 
-        if new_items <= closure:
-            break
-        else:
-            closure.update(new_items)
 
-    return closure
+class LR1Context:
+    """Augmented grammar indexed for construction of LR(1)-item sets.
 
+    FIRST sets of suffixes of productions (following the symbol after the dot) are computed once
+    as bitsets, closures are memoized per kernel - both are shared by all states.
+    """
 
-def lr0_goto(item_set, symbol, grammar):
-    goto_set = set()
-    
-    for item in item_set:
-        prod = grammar.productions[item.prod_no]
-        if item.position < len(prod) - 1 and prod[item.position + 1] == symbol:
-            goto_set.add(LR0Item(item.prod_no, item.position + 1))
+    def __init__(self, grammar):
+        self.grammar = grammar
+        first_follow = FirstFollow(grammar)
+        self.terminals = first_follow.terminals
+        self.bits = first_follow.bits
+        self.by_lhs = productions_by_lhs(grammar)
+        self.rhss = [rhs(prod) for prod in grammar.productions]
+        self.closures = {}
+
+        # (prod_no, position) -> (FIRST bits of the suffix after the next symbol, whether it derives EPS)
+        self.suffix_first = {}
+        for prod_no, symbols in enumerate(self.rhss):
+            for position in range(len(symbols)):
+                self.suffix_first[(prod_no, position)] = first_follow.first_of_sequence(symbols[position + 1:])
+
+        # Non-terminal -> (non-terminal starting its production, FIRST bits of the rest, whether it derives EPS)
+        self.starts = {nt: [] for nt in grammar.non_terminals}
+        for prod_no, symbols in enumerate(self.rhss):
+            if symbols and symbols[0] in grammar.non_terminals:
+                self.starts[grammar.productions[prod_no][0]].append((symbols[0], *self.suffix_first[(prod_no, 0)]))
 
-    return lr0_closure(goto_set, grammar)
+    def next_symbol(self, item):
+        symbols = self.rhss[item.prod_no]
+        return symbols[item.position] if item.position < len(symbols) else None
 
 
 def lr1_items(grammar):
-    return {}
+    """Canonical collection of LR(1)-item sets of the augmented grammar."""
+    context = LR1Context(grammar)
+    init_kernel = {LR0Item(0, 0): context.bits[END]}
 
+    item_sets = [lr1_closure(init_kernel, context)]
+    states = {frozenset(init_kernel.items()): 0}  # kernel -> state
+    transitions = {}
+
+    # Each state is expanded once, its successors are found by hashing kernels
+    worklist = [0]
+    while worklist:
+        state = worklist.pop()
+        for symbol, kernel in lr1_kernels(item_sets[state], context).items():
+            key = frozenset(kernel.items())
+            if key not in states:
+                states[key] = len(item_sets)
+                item_sets.append(lr1_closure(kernel, context))
+                worklist.append(states[key])
+            transitions[(state, symbol)] = states[key]
+
+    return LR1Collection(item_sets, transitions, context.terminals)
+
+
+def lr1_closure(kernel, context):
+    key = frozenset(kernel.items())
+    closure = context.closures.get(key)
+    if closure is not None:
+        return closure
+
+    # Lookaheads of non-terminals after the dot in kernel items
+    nt_bits = {}
+    for item, bits in kernel.items():
+        NT = context.next_symbol(item)
+        if NT in context.grammar.non_terminals:
+            first_bits, nullable = context.suffix_first[(item.prod_no, item.position)]
+            nt_bits[NT] = nt_bits.get(NT, 0) | first_bits | (bits if nullable else 0)
+
+    # Propagate them to non-terminals starting their productions, until nothing changes (only non-terminals
+    # whose lookaheads grew are processed again)
+    worklist = list(nt_bits)
+    while worklist:
+        NT = worklist.pop()
+        for succ, first_bits, nullable in context.starts[NT]:
+            bits = first_bits | (nt_bits[NT] if nullable else 0)
+            cur_bits = nt_bits.get(succ)
+            if cur_bits is None or bits & ~cur_bits:
+                nt_bits[succ] = (cur_bits or 0) | bits
+                worklist.append(succ)
+
+    closure = dict(kernel)
+    for NT, bits in nt_bits.items():
+        for prod_no in context.by_lhs[NT]:
+            item = LR0Item(prod_no, 0)
+            closure[item] = closure.get(item, 0) | bits  # initial item of the augmented start is in the kernel
+
+    context.closures[key] = closure
+    return closure
 
-def lr1_closure(item):
-    pass
 
+def lr1_kernels(item_set, context):
+    """Kernels of states reached from given item set, map (symbol -> kernel)."""
+    kernels = defaultdict(dict)
+    for item, bits in item_set.items():
+        symbol = context.next_symbol(item)
+        if symbol is not None:
+            kernels[symbol][LR0Item(item.prod_no, item.position + 1)] = bits
+    return kernels
 
-def lr1_goto(item):
-    pass
 
+def lr1_goto(item_set, symbol, context):
+    kernel = lr1_kernels(item_set, context).get(symbol)
+    return lr1_closure(kernel, context) if kernel else {}
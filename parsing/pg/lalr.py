@@ -0,0 +1,72 @@
+from collections import defaultdict
+from pg.grammar import augmented, productions_by_lhs, rhs
+from pg.items import LR1Collection, lr0_collection
+from pg.lr import LRParser, fill_table
+from pg.util import END, FirstFollow, digraph
+
+
+# LALR(1) lookaheads by DeRemer and Pennello ("Efficient Computation of LALR(1) Look-Ahead Sets", 1982):
+# lookaheads are computed for non-terminal transitions (p, A) of the LR(0) automaton, by two passes of
+# the digraph algorithm over relations between them, instead of building LR(1)-item sets and merging them.
+def lalr1_items(grammar):
+    """LR(0)-item sets of the augmented grammar with LALR(1) lookaheads (bitsets) of complete items."""
+    collection = lr0_collection(grammar)
+    transitions = collection.transitions
+    non_terminals = grammar.non_terminals
+
+    first_follow = FirstFollow(grammar)
+    terminals, bits = first_follow.terminals, first_follow.bits
+    nullable = {nt for nt in non_terminals if first_follow.nullable[first_follow.index[nt]]}
+
+    successors = defaultdict(list)
+    for (state, symbol), next_state in transitions.items():
+        successors[state].append(symbol)
+    nt_transitions = [(p, A) for (p, A) in transitions if A in non_terminals]
+
+    # DR(p, A) - terminals read right after the transition, READS - transitions on nullable non-terminals after it
+    direct_reads, reads = {}, {}
+    for p, A in nt_transitions:
+        r = transitions[(p, A)]
+        direct_reads[(p, A)] = sum(bits[t] for t in successors[r] if t in grammar.terminals)
+        reads[(p, A)] = [(r, C) for C in successors[r] if C in nullable]
+    direct_reads[(0, grammar.productions[0][1])] |= bits[END]  # start symbol is followed by the end of input
+    read_sets = digraph(nt_transitions, reads, direct_reads)
+
+    # (p, A) INCLUDES (p', B) if B -> beta A gamma, gamma nullable and p' reaches p on beta,
+    # (q, B -> omega) LOOKBACK (p', B) if p' reaches q on omega
+    includes, lookback = defaultdict(list), defaultdict(list)
+    by_lhs = productions_by_lhs(grammar)
+    for p_, B in nt_transitions:
+        for prod_no in by_lhs[B]:
+            symbols = rhs(grammar.productions[prod_no])
+            q = p_
+            for i, symbol in enumerate(symbols):
+                if symbol in non_terminals and first_follow.first_of_sequence(symbols[i + 1:])[1]:
+                    includes[(q, symbol)].append((p_, B))
+                q = transitions[(q, symbol)]
+            lookback[(q, prod_no)].append((p_, B))
+    follow_sets = digraph(nt_transitions, includes, read_sets)
+
+    # LA(q, B -> omega) - union of FOLLOW sets of transitions it looks back to
+    item_sets = []
+    for state, item_set in enumerate(collection.item_sets):
+        lookaheads = {}
+        for item in item_set:
+            la = 0
+            if item.position == len(rhs(grammar.productions[item.prod_no])):
+                for transition in lookback[(state, item.prod_no)]:
+                    la |= follow_sets[transition]
+            lookaheads[item] = la
+        item_sets.append(lookaheads)
+
+    return LR1Collection(item_sets, transitions, terminals)
+
+
+def build_table(grammar):
+    aug_grammar = augmented(grammar)
+    return fill_table(grammar, aug_grammar, lalr1_items(aug_grammar))
+
+
+class LALRParser(LRParser):
+    def __init__(self, grammar):
+        super().__init__(grammar, *build_table(grammar))
@@ -1,6 +1,7 @@
 from collections import defaultdict
 from pg.error import ConflictError, InputError
-from pg.util import END, EPS, first, follow
+from pg.grammar import rhs
+from pg.util import END, EPS, FirstFollow
 
 
 def insert(table, non_terminal, terminal, num_prod):
@@ -12,27 +13,18 @@ def insert(table, non_terminal, terminal, num_prod):
     
 
 def build_table(grammar):
-    first_sets = first(grammar)
-    follow_sets = follow(grammar, first_sets)
+    first_follow = FirstFollow(grammar)
 
     parse_table = defaultdict(dict)
     for i, prod in enumerate(grammar.productions):
         nt = prod[0]
 
-        if len(prod) == 2 and prod[1] == EPS:
-            # Empty production
-            for t in follow_sets[nt]:
-                insert(parse_table, nt, t, i)
-        else:
-            for j, symbol in enumerate(prod[1:]):
-                for t in first_sets[symbol]:
-                    insert(parse_table, nt, t, i)
-                
-                if EPS not in first_sets[symbol]:
-                    break
-            else:
-                for t in follow_sets[nt]:
-                    insert(parse_table, nt, t, i)
+        # FIRST of the RHS, and FOLLOW of the non-terminal if the RHS derives EPS (e.g. empty production)
+        bits, nullable = first_follow.first_of_sequence(rhs(prod))
+        if nullable:
+            bits |= first_follow.follow(nt)
+        for t in first_follow.terminals_of(bits):
+            insert(parse_table, nt, t, i)
 
     return dict(parse_table)
 
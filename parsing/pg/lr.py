@@ -0,0 +1,99 @@
+from pg.error import InputError
+from pg.grammar import augmented, rhs
+from pg.items import lr1_items
+from pg.slr import ACCEPT, REDUCE, SHIFT, insert
+from pg.util import END
+
+
+def build_table(grammar):
+    aug_grammar = augmented(grammar)
+    return fill_table(grammar, aug_grammar, lr1_items(aug_grammar))
+
+
+# Tables of LR(1)-item sets (canonical LR(1) or LALR(1) ones)
+def fill_table(grammar, aug_grammar, collection):
+    action = [{} for _ in range(len(collection))]
+    goto = [{} for _ in range(len(collection))]
+
+    for state, item_set in enumerate(collection.item_sets):
+        # Action table
+        for item, bits in item_set.items():
+            prod = aug_grammar.productions[item.prod_no]
+            symbols = rhs(prod)
+
+            if item.position < len(symbols) and symbols[item.position] in grammar.terminals:
+                # Shift
+                t = symbols[item.position]
+                next_state = collection.transitions[(state, t)]
+                if action[state].get(t) != (SHIFT, next_state):  # shift for each item with t after the dot
+                    insert(action, state, t, (SHIFT, next_state))
+
+            elif item.position == len(symbols):
+                # Reduce on lookaheads only
+                if prod[0] == aug_grammar.start:
+                    insert(action, state, END, ACCEPT)
+                else:
+                    for symbol in collection.lookaheads(bits):
+                        insert(action, state, symbol, (REDUCE, item.prod_no - 1))  # prod_no for grammar without augmentation
+
+        # Goto table
+        for NT in grammar.non_terminals:
+            next_state = collection.transitions.get((state, NT), None)
+            if next_state is not None:
+                insert(goto, state, NT, next_state)
+
+    return action, goto
+
+
+class LRParser:
+    """Shift-reduce parser driven by action and goto tables (of LR(1) or LALR(1) parsers)."""
+
+    def __init__(self, grammar, action, goto):
+        self.grammar = grammar
+        self.action = action
+        self.goto = goto
+
+    def run(self, string):
+        string = string + [END]
+
+        stack = [0]
+        derivation = []
+
+        pos = 0
+        while True:
+            t, state = string[pos], stack[-1]
+
+            action = self.action[state].get(t, None)
+            if not action:
+                raise InputError(f'Error at pos {pos}: no action for {t} in state {state}')
+
+            if action == ACCEPT:
+                return derivation
+
+            if action[0] == SHIFT:
+                stack.append(action[1])
+                pos += 1
+            else:
+                prod_no = action[1]
+                derivation.append(prod_no)
+                self.reduce(stack, self.grammar.productions[prod_no], pos)
+
+    def reduce(self, stack, production, pos):
+        # Pop states of the production RHS (none for EPS productions)
+        rhs_len = len(rhs(production))
+        if rhs_len:
+            del stack[-rhs_len:]
+
+        # Go to next state
+        prev_state = stack[-1]
+        NT = production[0]
+
+        next_state = self.goto[prev_state].get(NT, None)
+        if next_state is None:
+            raise InputError(f'Error at pos {pos}: no next state for {NT} in state {prev_state} after reduction')
+        stack.append(next_state)
+
+
+class LR1Parser(LRParser):
+    def __init__(self, grammar):
+        super().__init__(grammar, *build_table(grammar))
@@ -2,7 +2,7 @@ from collections import defaultdict
 from pg.error import ConflictError, InputError
 from pg.grammar import augmented
 from pg.items import lr0_collection
-from pg.util import END, EPS, first, follow
+from pg.util import END, FirstFollow
 
 ACCEPT = 'ACCEPT'
 SHIFT = 'SHIFT'
@@ -19,8 +19,7 @@ def insert(table, state, symbol, action_state):
 
  
 def build_table(grammar):
-    first_sets = first(grammar)
-    follow_sets = follow(grammar, first_sets)
+    first_follow = FirstFollow(grammar)
 
     aug_grammar = augmented(grammar)
     collection = lr0_collection(aug_grammar)
@@ -37,7 +36,8 @@ def build_table(grammar):
                 # Shift
                 t = prod[item.position + 1]
                 next_state = collection.transitions[(state, t)]
-                insert(action, state, t, (SHIFT, next_state))
+                if action[state].get(t) != (SHIFT, next_state):  # shift for each item with t after the dot
+                    insert(action, state, t, (SHIFT, next_state))
             
             elif item.position == len(prod) - 1:
                 # Reduce
@@ -46,7 +46,7 @@ def build_table(grammar):
                 if NT == aug_grammar.start:
                     insert(action, state, END, ACCEPT)
                 else:          
-                    for symbol in follow_sets[NT]:
+                    for symbol in first_follow.terminals_of(first_follow.follow(NT)):
                         insert(action, state, symbol, (REDUCE, item.prod_no - 1))  # prod_no for grammar without augmentation
 
         # Goto table
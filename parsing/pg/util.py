@@ -1,3 +1,4 @@
+import math
 from collections import defaultdict 
 from graphviz import Digraph
 from uuid import uuid4
@@ -6,72 +7,191 @@ EPS = ''
 END = '$'
 
 
-def first(grammar):
-    first_sets = defaultdict(set)
-    
-    # Deal with terminals
-    for t in grammar.terminals:
-        first_sets[t].add(t)
-
-    # Iteratively extend FIRST(1) sets as long as possible
-    while True:
-        changed = False
-        for prod in grammar.productions:
-            nt = prod[0]
-            init_size = len(first_sets[nt])
-
-            # Check empty productions
-            if len(prod) == 2 and prod[1] == EPS:
-                first_sets[nt].add(EPS)
+class FirstFollow:
+    """FIRST(1) and FOLLOW(1) sets of grammar symbols as bitsets.
+
+    Symbols are numbered - terminals (END last) first, non-terminals after them - and bit i of a set stands for
+    terminal number i. Nullable non-terminals are found by counting non-nullable symbols of productions, FIRST
+    and FOLLOW sets of non-terminals by the digraph algorithm, each in time linear in the size of the grammar.
+
+    Attributes:
+        grammar (Grammar): grammar (possibly augmented)
+        terminals (list): terminals in the order of their bits, END last
+        symbols (list): all symbols, terminals first
+        index (dict): map (symbol -> its number)
+        bits (dict): map (terminal -> its bit)
+        nullable (list): whether symbol number i derives EPS
+        first_bits (list): FIRST set of symbol number i (EPS excluded, see nullable)
+        follow_bits (list): FOLLOW set of symbol number i (empty for terminals)
+        sequences (dict): cache of first_of_sequence, map (tuple of symbols -> (FIRST bits, whether nullable))
+    """
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.terminals = sorted(grammar.terminals) + [END]
+        self.symbols = self.terminals + sorted(grammar.non_terminals)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.bits = {t: 1 << i for i, t in enumerate(self.terminals)}
+        self.sequences = {}
+
+        # Productions as (number of the LHS, numbers of RHS symbols), EPS productions have empty RHS
+        productions = [(self.index[prod[0]], [self.index[symbol] for symbol in prod[1:] if symbol != EPS])
+                       for prod in grammar.productions]
+        self.nullable = self.find_nullable(productions)
+
+        n_terminals, n_symbols = len(self.terminals), len(self.symbols)
+        non_terminals = range(n_terminals, n_symbols)
+
+        # FIRST(A) = terminals starting productions of A | FIRST(B) for B after a nullable prefix of such production
+        initial = {x: 0 for x in non_terminals}
+        relation = defaultdict(list)
+        for lhs, symbols in productions:
+            for x in symbols:
+                if x < n_terminals:
+                    initial[lhs] |= 1 << x
+                else:
+                    relation[lhs].append(x)
+                if not self.nullable[x]:
+                    break
+        first_bits = digraph(non_terminals, relation, initial)
+        self.first_bits = [1 << i for i in range(n_terminals)] + [first_bits[x] for x in non_terminals]
+
+        # FOLLOW(B) = FIRST of what follows B in productions | FOLLOW(A) for A -> ... B <nullable suffix>
+        initial = {x: 0 for x in non_terminals}
+        initial[self.index[grammar.start]] = self.bits[END]
+        relation = defaultdict(list)
+        for lhs, symbols in productions:
+            bits, nullable = 0, True  # FIRST of the suffix after the symbol
+            for x in reversed(symbols):
+                if x >= n_terminals:
+                    initial[x] |= bits
+                    if nullable:
+                        relation[x].append(lhs)
+                bits = bits | self.first_bits[x] if self.nullable[x] else self.first_bits[x]
+                nullable = nullable and self.nullable[x]
+        follow_bits = digraph(non_terminals, relation, initial)
+        self.follow_bits = [0] * n_terminals + [follow_bits[x] for x in non_terminals]
+
+    def find_nullable(self, productions):
+        nullable = [False] * len(self.symbols)
+
+        # Number of symbols of each production not known to be nullable, production is nullable once it drops to 0
+        remaining = [len(symbols) for _, symbols in productions]
+        occurrences = defaultdict(list)
+        for prod_no, (_, symbols) in enumerate(productions):
+            for x in symbols:
+                occurrences[x].append(prod_no)
+
+        worklist = [lhs for lhs, symbols in productions if not symbols]
+        while worklist:
+            x = worklist.pop()
+            if nullable[x]:
                 continue
-
-            for symbol in prod[1:]:
+            nullable[x] = True
+            for prod_no in occurrences[x]:
+                remaining[prod_no] -= 1
+                if not remaining[prod_no]:
+                    worklist.append(productions[prod_no][0])
+
+        return nullable
+
+    def first_of_sequence(self, symbols):
+        """FIRST set of a string of symbols as (bits, whether it derives EPS), memoized."""
+        key = tuple(symbols)
+        result = self.sequences.get(key)
+        if result is None:
+            bits, nullable = 0, True
+            for symbol in key:
                 if symbol == EPS:
                     continue
-                first_sets[nt].update(first_sets[symbol] - {EPS})
-                if EPS not in first_sets[symbol]:
+                x = self.index[symbol]
+                bits |= self.first_bits[x]
+                if not self.nullable[x]:
+                    nullable = False
                     break
-            else:
-                first_sets[nt].add(EPS)
-        
-            changed = changed or init_size != len(first_sets[nt])
-        if not changed:
-            break
+            result = self.sequences[key] = bits, nullable
+        return result
 
-    return dict(first_sets)
+    def first(self, symbol):
+        return self.first_bits[self.index[symbol]]
 
+    def follow(self, symbol):
+        return self.follow_bits[self.index[symbol]]
 
-# NOTE: FOLLOW(1) for non-terminals only (for terminals - not necessary)
-def follow(grammar, first_sets):
-    follow_sets = defaultdict(set)
-    
-    # Initialize
-    follow_sets[grammar.start].add(END)
-
-    # Iteratively expand FOLLOW(1) sets as long as possible
-    while True:
-        changed = False
-        for prod in grammar.productions:
-            nt = prod[0]
-
-            for i, symbol in enumerate(prod[1:]):
-                if symbol == EPS or symbol in grammar.terminals:
-                    continue
+    def terminals_of(self, bits):
+        terminals = []
+        while bits:
+            lowest = bits & -bits
+            terminals.append(self.terminals[lowest.bit_length() - 1])
+            bits ^= lowest
+        return terminals
 
-                for succ in prod[i + 2:]:
-                    changed = changed or (first_sets[succ] - {EPS} - follow_sets[symbol])
-                    follow_sets[symbol].update(first_sets[succ] - {EPS})
-                   
-                    if EPS not in first_sets[succ]:
-                        break
-                else:
-                    changed = changed or (follow_sets[nt] - follow_sets[symbol])
-                    follow_sets[symbol].update(follow_sets[nt])
 
-        if not changed:
-            break
+def first(grammar):
+    """FIRST(1) sets of grammar symbols, map (symbol -> set of terminals, EPS included for nullable symbols)."""
+    first_follow = FirstFollow(grammar)
+    first_sets = {}
+    for symbol in grammar.terminals | grammar.non_terminals:
+        x = first_follow.index[symbol]
+        first_sets[symbol] = set(first_follow.terminals_of(first_follow.first_bits[x]))
+        if first_follow.nullable[x]:
+            first_sets[symbol].add(EPS)
+    return first_sets
+
 
-    return dict(follow_sets)
+# NOTE: FOLLOW(1) for non-terminals only (for terminals - not necessary)
+def follow(grammar, first_sets=None):
+    """FOLLOW(1) sets of non-terminals, map (non-terminal -> set of terminals).
+
+    Computed from bitsets of FirstFollow, first_sets (of first()) is not needed and only kept for compatibility.
+    """
+    first_follow = FirstFollow(grammar)
+    return {nt: set(first_follow.terminals_of(first_follow.follow(nt))) for nt in grammar.non_terminals}
+
+
+def digraph(nodes, relation, initial):
+    """Computes F(x) = initial[x] | F(y) for all y such that x relation y, for sets represented as bitsets.
+
+    DeRemer and Pennello's digraph algorithm - a single depth-first traversal, strongly connected
+    components of the relation get the same set. Iterative, so that long chains do not hit recursion limit.
+    """
+    depth = {x: 0 for x in nodes}
+    result = dict(initial)
+    stack = []
+
+    for x in nodes:
+        if depth[x]:
+            continue
+
+        stack.append(x)
+        depth[x] = len(stack)
+        calls = [(x, len(stack), iter(relation.get(x, ())))]
+        while calls:
+            v, d, successors = calls[-1]
+            for y in successors:
+                if not depth[y]:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    calls.append((y, len(stack), iter(relation.get(y, ()))))
+                    break
+                depth[v] = min(depth[v], depth[y])
+                result[v] |= result[y]
+            else:
+                calls.pop()
+                if depth[v] == d:
+                    # v is the root of a strongly connected component
+                    while True:
+                        top = stack.pop()
+                        depth[top] = math.inf
+                        result[top] = result[v]
+                        if top == v:
+                            break
+                if calls:
+                    u = calls[-1][0]
+                    depth[u] = min(depth[u], depth[v])
+                    result[u] |= result[v]
+
+    return result
 
 
 def parse_tree(derivation, grammar):
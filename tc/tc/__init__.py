@@ -1,5 +1,26 @@
-from .interpreter import Evaluator, Interpreter
-from .parser import Parser
-from .typecheck import TypeCheck
-from .common import PrettyPrinter
- 
+import importlib
+
+# Exported names are imported on first use, so that e.g. loading compiled programs (see tc.artifact) does not
+# import the front end (PLY parser, type checker, optimizers)
+exports = {
+    'Evaluator': '.evaluator',
+    'ExecutionLimitExceeded': '.evaluator',
+    'Interpreter': '.interpreter',
+    'Parser': '.parser',
+    'TypeCheck': '.typecheck',
+    'PrettyPrinter': '.common',
+    'BoundFunction': '.embedding',
+    'Module': '.embedding',
+    'BufferedOutput': '.output',
+    'CaptureOutput': '.output',
+    'FileOutput': '.output',
+    'StreamOutput': '.output',
+}
+
+__all__ = list(exports)
+
+
+def __getattr__(name):
+    if name not in exports:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(exports[name], __name__), name)
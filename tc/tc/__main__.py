@@ -1,10 +1,16 @@
+import argparse
 import logging
+import os
 import re
 import sys
-from tc import Interpreter
+from tc import Interpreter, artifact
+from tc.incremental import CompilationCache
+from tc.optimization import MAX_LEVEL
+from tc.optimization.pass_manager import format_stats
+from tc.output import FileOutput
 
 
-def repl():
+def repl(level=0):
     interpreter = Interpreter()
 
     try:
@@ -27,7 +33,7 @@ def repl():
                     if not re.match(r'\s', s[-1]):
                         break
 
-                interpreter.run(code)
+                interpreter.run(code, level=level)
             except Exception as e:
                 logging.error(e)
 
@@ -35,18 +41,81 @@ def repl():
         pass
 
 
-def interpret(input_str):
-    interpreter = Interpreter()
-    interpreter.run(input_str, opt=True)
+def interpret(input_str, level=MAX_LEVEL, pass_stats=False, cache_dir=None, output_path=None, max_steps=None,
+              timeout=None, profile=False, profile_path=None):
+    interpreter = Interpreter(cache=CompilationCache(cache_dir) if cache_dir else None,
+                              output=FileOutput(output_path) if output_path else None)
+    if profile or profile_path:
+        interpreter.start_profiling()
+    try:
+        interpreter.run(input_str, level=level, max_steps=max_steps, timeout=timeout)
+    finally:
+        interpreter.output.close()
+        if pass_stats:
+            print(format_stats(interpreter.pass_stats), file=sys.stderr)
+            print(f'Evaluated in {interpreter.steps} steps', file=sys.stderr)
+        profiler = interpreter.stop_profiling()
+        if profile:
+            print(profiler.report(), file=sys.stderr)
+        if profile_path:
+            with open(profile_path, 'w') as f:
+                f.write(profiler.collapsed())
+
+
+def run_compiled(path, output_path=None, max_steps=None, timeout=None):
+    output = FileOutput(output_path) if output_path else None
+    try:
+        artifact.run(path, output, max_steps, timeout)
+    finally:
+        if output is not None:
+            output.close()
+
+
+def compile_program(argv):
+    parser = argparse.ArgumentParser(prog='tisi compile', description='Compiles program ahead of time - resolved, type '
+                                     'checked and optimized AST is saved to be run without the front end.')
+    parser.add_argument('file', help='program to compile')
+    parser.add_argument('-o', dest='output', metavar='FILE', help='compiled program (default: FILE with .tcc suffix)')
+    parser.add_argument('-O', dest='level', type=int, choices=range(MAX_LEVEL + 1), default=MAX_LEVEL,
+                        help=f'optimization level (default: {MAX_LEVEL})')
+    args = parser.parse_args(argv)
+
+    with open(args.file, 'r') as input_f:
+        ast = Interpreter().compile(input_f.read(), level=args.level)
+    artifact.save(ast, args.output or os.path.splitext(args.file)[0] + '.tcc')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compile']:
+        compile_program(argv[1:])
+        return
 
+    parser = argparse.ArgumentParser(prog='tisi', description='Throwaway Calculator interpreter. '
+                                     '`tisi compile FILE -o OUTPUT` compiles program ahead of time.')
+    parser.add_argument('file', nargs='?', help='program to execute, source or compiled (REPL is started if not given)')
+    parser.add_argument('-O', dest='level', type=int, choices=range(MAX_LEVEL + 1),
+                        help=f'optimization level (default: {MAX_LEVEL} for files, 0 in REPL)')
+    parser.add_argument('--pass-stats', action='store_true', help='print statistics of optimization passes')
+    parser.add_argument('--cache', metavar='DIR', help='directory caching compiled functions between runs')
+    parser.add_argument('-o', '--output', metavar='FILE', help='file printed values are written to (default: stdout)')
+    parser.add_argument('--max-steps', type=int, help='number of steps (loop iterations and calls) evaluation '
+                                                      'is stopped after')
+    parser.add_argument('--timeout', type=float, help='number of seconds evaluation is stopped after')
+    parser.add_argument('--profile', action='store_true', help='print functions and statements evaluation spent '
+                                                               'most time in (sampled)')
+    parser.add_argument('--profile-output', metavar='FILE', help='file sampled call stacks are written to (collapsed '
+                                                                 'stacks format, e.g. for flame graphs)')
+    args = parser.parse_args(argv)
 
-def main():
-    if len(sys.argv) == 1:
-        repl()
+    if args.file is None:
+        repl(level=args.level or 0)
+    elif artifact.is_artifact(args.file):
+        run_compiled(args.file, args.output, args.max_steps, args.timeout)
     else:
-        file = sys.argv[1]
-        with open(file, 'r') as input_f:
-            interpret(input_f.read())
+        with open(args.file, 'r') as input_f:
+            interpret(input_f.read(), MAX_LEVEL if args.level is None else args.level, args.pass_stats, args.cache,
+                      args.output, args.max_steps, args.timeout, args.profile, args.profile_output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,112 @@
+import argparse
+import io
+import pickle
+import struct
+import sys
+import zlib
+from tc.evaluator import Evaluator
+from tc.output import BufferedOutput
+
+# Compiled program file: magic, format version, then zlib compressed pickle of the AST
+MAGIC = b'TCC\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sH')
+
+# Classes an artifact might refer to - nothing else is unpickled (AST nodes and types only)
+allowed_classes = {
+    'tc.nodes': {
+        'AssertStmt', 'Assignment', 'BinaryExpr', 'Block', 'Call', 'ForStmt', 'FunctionDef', 'IfStmt', 'Literal',
+        'Parameter', 'PrintStmt', 'ReturnStmt', 'UnaryExpr', 'Variable', 'VariableDeclaration', 'WhileStmt',
+    },
+    'tc.common': {'Type'},
+}
+
+# Annotations of nodes not needed by Evaluator - not stored
+dropped_annotations = {'def_node', 'inferred_return_type'}
+
+
+class ArtifactError(Exception):
+    """Raised when a file is not a compiled program of a supported format version."""
+
+
+class ArtifactUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name not in allowed_classes.get(module, ()):
+            raise ArtifactError(f'Compiled program refers to forbidden class {module}.{name}')
+        return super().find_class(module, name)
+
+
+def strip(node, visited):
+    if isinstance(node, (list, tuple)):
+        for n in node:
+            strip(n, visited)
+    elif type(node).__module__ == 'tc.nodes' and id(node) not in visited:
+        visited.add(id(node))
+        for attribute in dropped_annotations:
+            node.__dict__.pop(attribute, None)
+        for value in vars(node).values():
+            strip(value, visited)
+
+
+def dumps(statements):
+    """Serializes AST of a compiled program (see Interpreter.compile), returns the artifact."""
+    strip(statements, set())
+    payload = zlib.compress(pickle.dumps(statements, protocol=pickle.HIGHEST_PROTOCOL), level=9)
+    return HEADER.pack(MAGIC, FORMAT_VERSION) + payload
+
+
+def loads(data):
+    """Returns AST of the compiled program, ready for evaluation."""
+    if len(data) < HEADER.size:
+        raise ArtifactError('Not a compiled program')
+    magic, version = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ArtifactError('Not a compiled program')
+    if version != FORMAT_VERSION:
+        raise ArtifactError(f'Unsupported format version {version} of compiled program (expected {FORMAT_VERSION})')
+    return ArtifactUnpickler(io.BytesIO(zlib.decompress(data[HEADER.size:]))).load()
+
+
+def save(statements, path):
+    with open(path, 'wb') as f:
+        f.write(dumps(statements))
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def is_artifact(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def run(path, output=None, max_steps=None, timeout=None):
+    """Evaluates compiled program, returns the evaluator (e.g. with the number of `steps` of the run)."""
+    statements = load(path)
+    output = output or BufferedOutput()
+    evaluator = Evaluator(output)
+    evaluator.limit(max_steps, timeout)
+    try:
+        evaluator.run(statements)
+    finally:
+        output.flush()
+    return evaluator
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m tc.artifact', description='Runs compiled Throwaway Calculator '
+                                     'program (see `tisi compile`) without the front end.')
+    parser.add_argument('file', help='compiled program')
+    parser.add_argument('--max-steps', type=int, help='number of steps evaluation is stopped after')
+    parser.add_argument('--timeout', type=float, help='number of seconds evaluation is stopped after')
+    args = parser.parse_args()
+    try:
+        run(args.file, max_steps=args.max_steps, timeout=args.timeout)
+    except ArtifactError as e:
+        sys.exit(f'{args.file}: {e}')
+
+
+if __name__ == '__main__':
+    main()
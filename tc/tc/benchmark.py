@@ -0,0 +1,208 @@
+import argparse
+import contextlib
+import io
+import math
+import tracemalloc
+from time import perf_counter
+from tc.common import binary_operators
+from tc.generator import ProgramGenerator
+from tc.interpreter import Evaluator
+from tc.optimization import ExpressionDAGOptimizer, InOutBuilder, RedundancyOptimizer
+from tc.optimization.common import NodeCounter
+from tc.parser import Parser
+from tc.resolver import Resolver
+from tc.typecheck import TypeCheck
+
+SUPER_LINEAR_EXPONENT = 1.3  # growth exponents above this are reported
+
+
+class Phase:
+    """Measured phase of the interpreter.
+
+    Attributes:
+        name (str): name of the phase
+        prepare (callable): function of (parser, source) returning arguments of `run` (not measured)
+        run (callable): measured function
+    """
+
+    def __init__(self, name, prepare, run):
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+
+
+def parsed(parser, source):
+    ast = parser.run(source)
+    Resolver().run(ast)
+    return ast
+
+
+def with_in_sets(parser, source):
+    ast = parsed(parser, source)
+    return ast, InOutBuilder().run(ast)[0]
+
+
+def evaluate(ast, evaluator_class=Evaluator):
+    Resolver().run(ast, flat_closures=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        evaluator_class().run(ast)
+
+
+# Each phase runs on a freshly parsed program - phases do not depend on results of optimizations,
+# so a pass failing on some program does not affect measurements of the others
+phases = {
+    p.name: p for p in [
+        Phase('parse', lambda parser, source: (parser, source), lambda parser, source: parser.run(source)),
+        Phase('resolve', lambda parser, source: parser.run(source), lambda ast: Resolver().run(ast)),
+        Phase('typecheck', parsed, lambda ast: TypeCheck().run(ast)),
+        Phase('in_sets', parsed, lambda ast: InOutBuilder().run(ast)),
+        Phase('redundancy', with_in_sets, lambda ast, in_sets: RedundancyOptimizer(in_sets).run(ast)),
+        Phase('cse', with_in_sets, lambda ast, in_sets: ExpressionDAGOptimizer(in_sets).run(ast)),
+        Phase('evaluate', parsed, evaluate),
+    ]
+}
+
+
+class Measurement:
+    """Time and peak memory of a phase on a program of given size."""
+
+    def __init__(self, phase, nodes, time, memory, error=None):
+        self.phase = phase
+        self.nodes = nodes
+        self.time = time
+        self.memory = memory
+        self.error = error
+
+
+def args_tuple(args):
+    return args if isinstance(args, tuple) else (args,)
+
+
+def measure(phase, parser, source, nodes, repeat=3):
+    """Measures best time of `repeat` runs and peak memory of a separate (traced) run."""
+    try:
+        time = math.inf
+        for _ in range(repeat):
+            args = args_tuple(phase.prepare(parser, source))
+            start = perf_counter()
+            phase.run(*args)
+            time = min(time, perf_counter() - start)
+
+        args = args_tuple(phase.prepare(parser, source))
+        tracemalloc.start()
+        try:
+            phase.run(*args)
+            memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        return Measurement(phase.name, nodes, None, None, error=e)
+    return Measurement(phase.name, nodes, time, memory)
+
+
+def growth_exponent(measurements):
+    """Least squares fit of exponent k in time ~ nodes^k (None if there are not enough measurements)."""
+    points = [(math.log(m.nodes), math.log(m.time)) for m in measurements if m.time]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var_x:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def run_benchmark(sizes, phase_names=tuple(phases), repeat=3, seed=0, **shape):
+    """Measures given phases on generated programs of given sizes, returns map (phase -> [Measurement])."""
+    parser = Parser()
+    results = {name: [] for name in phase_names}
+    for size in sizes:
+        generator_shape = dict(shape)
+        if generator_shape.get('functions') is None:
+            generator_shape['functions'] = max(1, size // 25)
+        source = ProgramGenerator(size=size, seed=seed, **generator_shape).run()
+        nodes = NodeCounter().run(parser.run(source))
+
+        for name in phase_names:
+            results[name].append(measure(phases[name], parser, source, nodes, repeat))
+    return results
+
+
+concatenation_program = """
+    var s: string = '';
+    var i: int = 0;
+    while (i < {count}) {{
+        s = s + '{piece}';
+        i = i + 1
+    }}
+    assert s != ''
+"""
+
+
+class PlainStringEvaluator(Evaluator):
+    """Evaluator concatenating Python strings eagerly (baseline of ropes)."""
+    operators = binary_operators
+
+
+def concatenation_benchmark(size=1 << 20, piece_length=64, repeat=1):
+    """Measures building a string of `size` characters by `s = s + x` in a loop, with ropes and without.
+
+    Returns map (evaluator name -> Measurement).
+    """
+    source = concatenation_program.format(count=size // piece_length, piece='x' * piece_length)
+    results = {}
+    for evaluator_class in [Evaluator, PlainStringEvaluator]:
+        phase = Phase(evaluator_class.__name__, parsed, lambda ast: evaluate(ast, evaluator_class))
+        results[phase.name] = measure(phase, Parser(), source, size, repeat)
+    return results
+
+
+def format_results(results):
+    """Formats measurements as a table with growth exponents of each phase."""
+    lines = [f'{"phase":<12}{"nodes":>10}{"time [ms]":>12}{"peak [KiB]":>12}']
+    for name, measurements in results.items():
+        for m in measurements:
+            if m.error is not None:
+                lines.append(f'{name:<12}{m.nodes:>10}  failed: {type(m.error).__name__}: {m.error}')
+            else:
+                lines.append(f'{name:<12}{m.nodes:>10}{m.time * 1000:>12.3f}{m.memory / 1024:>12.1f}')
+
+        exponent = growth_exponent(measurements)
+        if exponent is not None:
+            warning = '  <- super-linear' if exponent > SUPER_LINEAR_EXPONENT else ''
+            lines.append(f'{name:<12}{"growth":>10}{f"n^{exponent:.2f}":>12}{warning}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m tc.benchmark',
+                                     description='Measures how phases of the interpreter scale with program size.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 800, 1600],
+                        help='numbers of statements of generated programs')
+    parser.add_argument('--phases', nargs='+', choices=list(phases), default=list(phases))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best time is taken)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--functions', type=int, help='number of functions (default: size / 25)')
+    parser.add_argument('--depth', type=int, default=3, help='maximal nesting of compound statements')
+    parser.add_argument('--loop-density', type=float, default=0.3,
+                        help='probability of a compound statement being a loop')
+    parser.add_argument('--expr-size', type=int, default=4, help='maximal number of operators in an expression')
+    parser.add_argument('--concatenation', type=int, metavar='SIZE',
+                        help='instead measure building a string of SIZE characters in a loop (e.g. 1048576)')
+    args = parser.parse_args()
+
+    if args.concatenation:
+        results = concatenation_benchmark(args.concatenation, repeat=args.repeat)
+        for name, m in results.items():
+            print(f'{name:<24}{m.time * 1000:>12.3f} ms{m.memory / 1024:>12.1f} KiB')
+        return
+
+    results = run_benchmark(args.sizes, args.phases, args.repeat, args.seed, functions=args.functions,
+                            depth=args.depth, loop_density=args.loop_density, expr_size=args.expr_size)
+    print(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
+import numpy as np
+import operator
 import re
+from collections import OrderedDict
+from copy import copy
 from enum import Enum
 from graphviz import Digraph
 from uuid import uuid4
@@ -31,6 +35,74 @@ class Type(Enum):
     FLOAT = 'float'
     STRING = 'string'
     UNIT = 'unit'
+    ARRAY_INT = 'array[int]'
+    ARRAY_FLOAT = 'array[float]'
+    ARRAY_BOOL = 'array[bool]'
+
+
+# Array types and types of their elements (arrays are immutable NumPy arrays)
+array_element_types = {
+    Type.ARRAY_INT: Type.INT,
+    Type.ARRAY_FLOAT: Type.FLOAT,
+    Type.ARRAY_BOOL: Type.BOOL,
+}
+
+
+INT64_LIMIT = 2.0 ** 63  # elements of array[int] are int64, in [-INT64_LIMIT, INT64_LIMIT)
+
+
+def check_int64(result, fun, *args):
+    """Raises OverflowError if an int64 result of fun applied to NumPy arrays wrapped around.
+
+    NumPy does not detect overflows of integer arrays - the result is computed again in floats and compared
+    with int64 limits (results within float rounding of the limits are reported as well).
+    """
+    if np.result_type(result).kind == 'i':
+        with np.errstate(over='ignore', invalid='ignore'):
+            approximation = fun(*(np.asarray(arg, dtype=np.float64) for arg in args))
+        if np.any(np.abs(approximation) >= INT64_LIMIT):
+            raise OverflowError('Result of array[int] arithmetic out of 64-bit integer range')
+    return result
+
+
+def array_checked(op):
+    """Arithmetic operator of numbers, checked for overflows if applied to arrays."""
+    def apply(left, right):
+        if type(left) is not np.ndarray and type(right) is not np.ndarray:
+            return op(left, right)
+        if op is operator.pow and np.result_type(left, right).kind == 'i' and np.any(np.asarray(right) < 0):
+            raise ArithmeticError('Negative exponent of array[int] elements (powers of ints are ints)')
+        return check_int64(op(left, right), op, left, right)
+    return apply
+
+
+def array_checked_unary(op):
+    def apply(value):
+        if type(value) is not np.ndarray:
+            return op(value)
+        return check_int64(op(value), op, value)
+    return apply
+
+
+# Implementations of operators (shared by Evaluator and constant folding)
+binary_operators = {
+    '+': array_checked(operator.add),
+    '-': array_checked(operator.sub),
+    '*': array_checked(operator.mul),
+    '/': operator.truediv,
+    '^': array_checked(operator.pow),
+    '%': operator.mod,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '<': operator.lt,
+    '[]': lambda array, index: array[index].item(),  # indexing of arrays, elements as Python scalars
+}
+unary_operators = {
+    '-': array_checked_unary(operator.neg),
+}
 
 
 class CallableSignature:
@@ -39,6 +111,8 @@ class CallableSignature:
         self.return_type = return_type
 
     def verify(self, arg_types):
+        if len(arg_types) != len(self.param_types):
+            raise TypeError(f'Wrong number of arguments in call: expected {len(self.param_types)}, given {len(arg_types)}')
         for p_t, a_t in zip(self.param_types, arg_types):
             if p_t != a_t:
                 raise TypeError(f'Type mismatch in call: expected {p_t}, given {a_t}')
@@ -61,6 +135,9 @@ class PolyCallableSignature(CallableSignature):
 
 
 class Callable:
+    pure = False  # whether calls are deterministic and free of side effects
+    native = False  # whether it is called with evaluated argument values (see tc.globals.NativeFunction)
+
     def call(self, evaluator, arguments):
         raise NotImplementedError
 
@@ -73,11 +150,20 @@ class Function(Callable):
 
     def call(self, evaluator, args):
         arguments = [evaluator.visit(a) for a in args]
+        return self.invoke(evaluator, arguments)
+
+    def rebind(self, closure):
+        """The same function with given closure environment."""
+        function = copy(self)
+        function.closure = closure
+        return function
+
+    def invoke(self, evaluator, arguments):
         prev_env = evaluator.env
         evaluator.env = Environment(enclosing=self.closure)
 
         for p, a in zip(self.params, arguments):
-            evaluator.env.declare_var(p.name, a)
+            evaluator.env.declare_var(p.name, Cell(a) if p.cell else a)
         try:
             evaluator.visit(self.body)
         except evaluator.ReturnValue as r:
@@ -86,6 +172,106 @@ class Function(Callable):
             evaluator.env = prev_env
 
 
+class MemoStats:
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f'MemoStats(name={self.name}, hits={self.hits}, misses={self.misses})'
+
+
+class MemoizedFunction(Function):
+    """Pure function with results cached in a size-bounded LRU cache keyed by argument values."""
+
+    def __init__(self, params, body, closure, max_size, stats):
+        super().__init__(params, body, closure)
+        self.cache = OrderedDict()
+        self.max_size = max_size
+        self.stats = stats
+
+    def rebind(self, closure):
+        function = super().rebind(closure)
+        function.cache = OrderedDict(self.cache)
+        return function
+
+    def invoke(self, evaluator, arguments):
+        # Equal floats might be different values (0.0 == -0.0, NaN != NaN) - keyed by their representation
+        key = tuple((type(a), repr(a)) if isinstance(a, float) else a for a in arguments)
+        if key in self.cache:
+            self.stats.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.stats.misses += 1
+        value = super().invoke(evaluator, arguments)
+        self.cache[key] = value
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+        return value
+
+
+class Cell:
+    """Value of a variable shared by its environment and closures of functions capturing it."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Rope:
+    """String built by concatenation, flattened lazily - when printed, compared, hashed or converted.
+
+    Pieces are kept in a list shared by ropes extending each other. Appending to the rope whose pieces
+    end the list just appends to it (amortized O(1)), so `s = s + x` in a loop takes time linear in length
+    of the result instead of quadratic. Appending to an older rope copies its pieces first.
+
+    Attributes:
+        pieces (list): strings, the first `count` of them make up the rope
+        count (int): number of pieces of the rope
+        flat (str): flattened string (None until needed)
+    """
+    __slots__ = ('pieces', 'count', 'flat')
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.count = len(pieces)
+        self.flat = None
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = ''.join(self.pieces[:self.count])
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        return str(self) == str(other) if isinstance(other, (str, Rope)) else NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __int__(self):
+        return int(str(self))
+
+    def __float__(self):
+        return float(str(self))
+
+
+def concat(left, right):
+    """Concatenation of strings (str or Rope), the result is a Rope."""
+    if isinstance(right, Rope):
+        right = str(right)
+    if not isinstance(left, Rope):
+        return Rope([left, right])
+
+    pieces = left.pieces if len(left.pieces) == left.count else left.pieces[:left.count]
+    pieces.append(right)
+    return Rope(pieces)
+
+
 class Environment:
     # Inspired by https://craftinginterpreters.com/contents.html
 
@@ -94,6 +280,13 @@ class Environment:
         self.variables = {}
         self.enclosing = enclosing
 
+    def copy(self):
+        """Shallow copy - names are bound to the same values in a new environment."""
+        env = Environment(self.enclosing)
+        env.functions = dict(self.functions)
+        env.variables = dict(self.variables)
+        return env
+
     def define_fun(self, name, obj):
         self.functions[name] = obj
 
@@ -120,13 +313,16 @@ class Environment:
         else:
             raise Exception(f'Failed to resolve variable {name}')
 
-    def define_var(self, name, obj):
+    def assign_var(self, name, obj, level):
         env = self
-        while env:
-            if name in env.variables:
-                env.variables[name] = obj
+        for _ in range(level):
             env = env.enclosing
 
+        if name in env.variables:
+            env.variables[name] = obj
+        else:
+            raise Exception(f'Failed to resolve variable {name}')
+
 
 class PrettyPrinter(BaseVisitor):
     def __init__(self):
@@ -168,13 +364,9 @@ class PrettyPrinter(BaseVisitor):
         return self.add_viz_node(node, 'for', ['initializer', 'condition', 'increment', 'body'])
 
     def visit_binary_expr(self, node):
-        if hasattr(node, 'common_node'):
-            node = node.common_node
         return self.add_viz_node(node, node.op, ['left', 'right'])
 
     def visit_unary_expr(self, node):
-        if hasattr(node, 'common_node'):
-            node = node.common_node
         return self.add_viz_node(node, node.op, ['expr'])
 
     def visit_assert_stmt(self, node):
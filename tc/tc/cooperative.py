@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+DEFAULT_STEPS_PER_YIELD = 1000
+
+
+class ExecutionCancelled(BaseException):
+    """Raised in an evaluated program when the task running it was cancelled."""
+
+
+class CooperativeExecution:
+    """Evaluates a program as a part of an asyncio task, yielding to the event loop every few steps.
+
+    Evaluator is a recursive visitor, so the program is evaluated on a worker thread serving as the stack
+    of the coroutine: control is handed over synchronously, i.e. either the event loop or the program runs,
+    never both. The program pauses every `steps_per_yield` steps (loop iterations and calls, see
+    Evaluator.tick) and the task awaits `asyncio.sleep(0)`, so other tasks (e.g. other programs) get their
+    turn - scheduling is round-robin, like the one of coroutines.
+
+    Attributes:
+        evaluator (Evaluator): evaluator of the program (not to be shared by programs running at once)
+        steps_per_yield (int): number of steps between yields
+        resumed (threading.Event): set when the program shall continue
+        paused (threading.Event): set when the program paused or finished
+        done (bool): whether the program finished
+        cancelled (bool): whether the task was cancelled
+        error (BaseException): exception the program failed with
+    """
+
+    def __init__(self, evaluator, steps_per_yield=DEFAULT_STEPS_PER_YIELD):
+        self.evaluator = evaluator
+        self.steps_per_yield = steps_per_yield
+        self.resumed = threading.Event()
+        self.paused = threading.Event()
+        self.done = False
+        self.cancelled = False
+        self.error = None
+
+    async def run(self, statements):
+        worker = threading.Thread(target=self.evaluate, args=(statements,), daemon=True)
+        worker.start()
+        try:
+            while True:
+                self.switch()
+                if self.done:
+                    break
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            self.switch()
+            raise
+        finally:
+            worker.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def switch(self):
+        """Runs the program until it pauses (or finishes)."""
+        self.resumed.set()
+        self.paused.wait()
+        self.paused.clear()
+
+    def evaluate(self, statements):
+        self.resumed.wait()
+        self.resumed.clear()
+
+        prev_pause, prev_pause_at = self.evaluator.pause, self.evaluator.pause_at
+        self.evaluator.pause = self.pause
+        self.evaluator.pause_at = self.evaluator.steps + self.steps_per_yield
+        self.evaluator.schedule_checkpoint()
+        try:
+            if not self.cancelled:
+                self.evaluator.run(statements)
+        except ExecutionCancelled:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.evaluator.pause, self.evaluator.pause_at = prev_pause, prev_pause_at
+            self.evaluator.schedule_checkpoint()
+            self.done = True
+            self.paused.set()
+
+    def pause(self):
+        """Called by the evaluator (on the worker thread) - hands control back to the event loop."""
+        self.evaluator.pause_at = self.evaluator.steps + self.steps_per_yield
+        self.paused.set()
+        self.resumed.wait()
+        self.resumed.clear()
+        if self.cancelled:
+            raise ExecutionCancelled()
@@ -0,0 +1,92 @@
+import numpy as np
+from tc.common import Rope, Type
+
+python_types = {
+    bool: Type.BOOL,
+    int: Type.INT,
+    float: Type.FLOAT,
+    str: Type.STRING,
+    Rope: Type.STRING,
+}
+
+array_types = {  # NumPy dtype kind -> array type
+    'i': Type.ARRAY_INT,
+    'f': Type.ARRAY_FLOAT,
+    'b': Type.ARRAY_BOOL,
+}
+
+
+def type_of(value):
+    """Type of a Python value passed to tc function."""
+    if isinstance(value, np.ndarray):
+        value_type = array_types.get(value.dtype.kind)
+    elif isinstance(value, np.generic):
+        value_type = python_types.get(type(value.item()))
+    else:
+        value_type = python_types.get(type(value))
+    if value_type is None:
+        raise TypeError(f'Value of type {type(value).__name__} can not be passed to tc function')
+    return value_type
+
+
+class BoundFunction:
+    """Top-level tc function called from Python with arguments of types checked when it was bound.
+
+    Attributes:
+        interpreter (Interpreter): interpreter the function was loaded by
+        name (str): name of the function
+        function (Callable): the function
+        param_types (tuple): types of arguments
+        return_type (Type): type of the result
+    """
+
+    def __init__(self, interpreter, name, function, param_types, return_type):
+        self.interpreter = interpreter
+        self.name = name
+        self.function = function
+        self.param_types = param_types
+        self.return_type = return_type
+
+    def __call__(self, *args):
+        with self.interpreter.limited(None, None):
+            value = self.interpreter.eval.invoke(self.name, self.function, list(args))
+        return str(value) if isinstance(value, Rope) else value
+
+    def __repr__(self):
+        params = ', '.join(t.value for t in self.param_types)
+        return f'BoundFunction({self.name}({params}): {self.return_type.value})'
+
+
+class Module:
+    """Program loaded by Interpreter.load, its top-level functions might be called from Python many times.
+
+    Programs are parsed, analysed and evaluated once, calls just evaluate bodies of the functions in the
+    global environment of the program. Types of arguments are checked against signatures of functions
+    when they are bound, `call` binds a function once per combination of argument types.
+
+    Attributes:
+        interpreter (Interpreter): interpreter which loaded the program (calls might change its globals)
+        functions (list): names of top-level functions of the program
+        bound (dict): map ((name, argument types) -> BoundFunction) of functions bound by `call`
+    """
+
+    def __init__(self, interpreter, functions):
+        self.interpreter = interpreter
+        self.functions = functions
+        self.bound = {}
+
+    def bind(self, name, *arg_types):
+        """Returns function `name` to be called with arguments of given types."""
+        if name not in self.functions:
+            raise Exception(f'Function {name} is not defined by the module')
+        function = self.interpreter.eval.globals.functions[name]
+        return_type = self.interpreter.typecheck.env.functions[name].signature.verify(list(arg_types))
+        return BoundFunction(self.interpreter, name, function, arg_types, return_type)
+
+    def call(self, name, *args):
+        """Calls function `name` with given argument values, returns the result."""
+        arg_types = tuple(type_of(a) for a in args)
+        bound = self.bound.get((name, arg_types))
+        if bound is None:
+            bound = self.bound[name, arg_types] = self.bind(name, *arg_types)
+        return bound(*args)
@@ -0,0 +1,279 @@
+import math
+from copy import copy
+from time import perf_counter
+from tc.common import (
+    BaseVisitor, Cell, Environment, Function, MemoizedFunction, MemoStats, Rope, binary_operators, concat,
+    unary_operators
+)
+from tc.globals import global_env
+from tc.output import StreamOutput
+
+DEADLINE_CHECK_STEPS = 64  # wall-clock deadline is checked every this many steps
+
+
+class ExecutionLimitExceeded(Exception):
+    """Raised when evaluation exceeds its step budget or wall-clock deadline.
+
+    Attributes:
+        steps (int): number of steps evaluated by the run
+        call_stack (list): names of functions being evaluated, outermost first
+    """
+
+    def __init__(self, message, steps, call_stack):
+        super().__init__(f'{message} after {steps} steps (call stack: {" > ".join(call_stack) or "top level"})')
+        self.steps = steps
+        self.call_stack = call_stack
+
+
+def add(left, right):
+    # Strings are concatenated into ropes
+    if isinstance(left, (str, Rope)):
+        return concat(left, right)
+    return binary_operators['+'](left, right)
+
+
+# AST evaluation
+class Evaluator(BaseVisitor):
+    """Visitor of abstract syntax tree nodes."""
+
+    operators = {**binary_operators, '+': add}
+    unary_operators = unary_operators
+
+    def __init__(self, output=None):
+        self.env = self.globals = global_env()
+        self.memo_stats = {}  # FunctionDef node -> MemoStats
+        self.closed_functions = {}  # FunctionDef node -> Function, for functions capturing nothing
+        self.output = output or StreamOutput()  # OutputSink of print statements
+        self.call_stack = []  # names of functions being evaluated
+        self.statement = None  # statement being evaluated (innermost one, see SamplingProfiler)
+        self.steps = 0  # loop iterations and calls evaluated
+        self.max_steps = math.inf  # step budget (number of steps the evaluation fails at)
+        self.deadline = None  # perf_counter() time the evaluation fails at
+        self.pause_at = math.inf  # number of steps `pause` is called at (see CooperativeExecution)
+        self.pause = None
+        self.checkpoint_at = math.inf  # number of steps limits and pause are checked at
+
+    def reset(self):
+        self.env = self.globals = global_env()
+        self.memo_stats = {}
+        self.closed_functions = {}
+        self.call_stack = []
+        self.statement = None
+        self.steps = 0
+        self.limit()
+
+    def fork(self, output=None):
+        """New evaluator starting with the global environment of this one.
+
+        Global variables and functions are copied into a new global environment (values are immutable),
+        function bodies are shared. Functions closed over the global environment are rebound to the new one,
+        so evaluations in either evaluator do not affect the other one.
+        """
+        evaluator = Evaluator(output or self.output)
+        evaluator.env = evaluator.globals = self.globals.copy()
+        evaluator.memo_stats = {node: copy(stats) for node, stats in self.memo_stats.items()}
+        memo_stats = {id(self.memo_stats[node]): stats for node, stats in evaluator.memo_stats.items()}
+
+        rebound = {}
+
+        def rebind(function):
+            if not isinstance(function, Function) or function.closure is not self.globals:
+                return function
+            if id(function) not in rebound:
+                rebound[id(function)] = function.rebind(evaluator.globals)
+                if isinstance(function, MemoizedFunction):
+                    rebound[id(function)].stats = memo_stats[id(function.stats)]
+            return rebound[id(function)]
+
+        env = evaluator.globals
+        env.functions = {name: rebind(f) for name, f in env.functions.items()}
+        env.variables = {name: Cell(v.value) if isinstance(v, Cell) else v for name, v in env.variables.items()}
+        evaluator.closed_functions = {node: rebind(f) for node, f in self.closed_functions.items()}
+        return evaluator
+
+    def limit(self, max_steps=None, timeout=None):
+        """Limits number of further steps and time (in seconds) of the evaluation (None - unlimited)."""
+        self.max_steps = self.steps + max_steps if max_steps is not None else math.inf
+        self.deadline = perf_counter() + timeout if timeout is not None else None
+        self.schedule_checkpoint()
+
+    def schedule_checkpoint(self):
+        deadline_check = self.steps + DEADLINE_CHECK_STEPS if self.deadline is not None else math.inf
+        self.checkpoint_at = min(self.max_steps, self.pause_at, deadline_check)
+
+    def tick(self):
+        # Step of the evaluation - at loop back edges and calls, kept cheap
+        self.steps += 1
+        if self.steps >= self.checkpoint_at:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.steps >= self.max_steps:
+            raise ExecutionLimitExceeded('Step budget exhausted', self.steps, list(self.call_stack))
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            raise ExecutionLimitExceeded('Deadline exceeded', self.steps, list(self.call_stack))
+        if self.steps >= self.pause_at:
+            self.pause()
+        self.schedule_checkpoint()
+
+    def run(self, statements):
+        try:
+            for stmt in statements:
+                self.statement = stmt
+                self.visit(stmt)
+        finally:
+            self.statement = None  # idle - not sampled by a profiler
+
+    def visit_block(self, node):
+        try:
+            self.env = Environment(enclosing=self.env)
+            for stmt in node.statements:
+                self.statement = stmt
+                self.visit(stmt)
+        finally:
+            self.env = self.env.enclosing
+
+    def visit_function_def(self, node):
+        defined = self.env.functions.get(node.name)
+        if defined is not None and not defined.native:  # builtins might be shadowed
+            raise Exception(f'Function {node.name} defined twice!')
+
+        if node.free_vars is None:
+            # Not laid out for flat closures - body environments are chained to the defining one
+            function = self.make_function(node, self.env)
+        elif node.free_vars or node.free_funs:
+            function = self.make_function(node, Environment(enclosing=self.globals))
+        elif node in self.closed_functions:
+            function = self.closed_functions[node]
+        else:
+            function = self.closed_functions[node] = self.make_function(node, self.globals)
+        self.env.define_fun(node.name, function)
+
+        if node.free_vars or node.free_funs:
+            # Captured after definition of the function, which might be recursive
+            for name, depth in node.free_vars:
+                function.closure.declare_var(name, self.env.resolve_var(name, level=depth))
+            for name, depth in node.free_funs:
+                function.closure.define_fun(name, self.env.resolve_fun(name, level=depth))
+
+    def make_function(self, node, closure):
+        memo_size = getattr(node, 'memo_size', None)
+        if memo_size:
+            stats = self.memo_stats.setdefault(node, MemoStats(node.name))
+            return MemoizedFunction(node.parameters, node.body, closure, memo_size, stats)
+        return Function(node.parameters, node.body, closure)
+
+    def visit_print_stmt(self, node):
+        self.output.write(f'{self.visit(node.expr)}\n')
+
+    def visit_variable_declaration(self, node):
+        try:
+            self.env.resolve_var(node.name, level=0)
+        except:
+            if node.value:
+                value = self.visit(node.value)
+            else:
+                value = None
+            self.env.declare_var(node.name, Cell(value) if node.cell else value)
+        else:
+            raise Exception(f'Variable {node.name} declared twice!')
+
+    def visit_assignment(self, node):
+        value = self.visit(node.value)
+        if node.cell:
+            self.env.resolve_var(node.name, level=node.scope_depth).value = value
+        else:
+            self.env.assign_var(node.name, value, level=node.scope_depth)
+ 
+    def visit_if_stmt(self, node):
+        if self.visit(node.condition):
+            self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        while self.visit(node.condition):
+            self.visit(node.body)
+            self.tick()
+    
+    def visit_for_stmt(self, node):
+        try:
+            self.env = Environment(enclosing=self.env)
+            self.visit(node.initializer)
+            while self.visit(node.condition):
+                self.visit(node.body)
+                self.visit(node.increment)
+                self.tick()
+        finally:
+            self.env = self.env.enclosing
+
+    def visit_binary_expr(self, node):
+        op = self.operators[node.op]
+        lval = self.visit(node.left)
+        rval = self.visit(node.right)
+        value = op(lval, rval)
+
+        if node.temp:
+            self.env.declare_var(node.temp, value)
+        return value
+
+    def visit_unary_expr(self, node):
+        op = self.unary_operators[node.op]
+        value = op(self.visit(node.expr))
+
+        if node.temp:
+            self.env.declare_var(node.temp, value)
+        return value
+
+    def visit_assert_stmt(self, node):
+        value = self.visit(node.expr)
+        assert value
+
+    class ReturnValue(Exception):
+        def __init__(self, val):
+            super()
+            self.val = val
+
+    def visit_return_stmt(self, node):
+        value = self.visit(node.expr)
+        raise Evaluator.ReturnValue(value)
+
+    def invoke(self, name, function, arguments):
+        """Calls function with argument values (e.g. from Python, see tc.embedding.Module).
+
+        The statement being evaluated is restored afterwards - None if the evaluator was idle.
+        """
+        self.tick()
+        self.call_stack.append(name)
+        statement = self.statement
+        try:
+            if function.native:
+                return function.fun(*arguments)
+            return function.invoke(self, arguments)
+        finally:
+            self.call_stack.pop()
+            self.statement = statement
+
+    def visit_call(self, node):
+        function = self.env.resolve_fun(node.name, level=node.scope_depth)
+        self.tick()
+        self.call_stack.append(node.name)
+        statement = self.statement
+        try:
+            if function.native:
+                value = function.fun(*[self.visit(a) for a in node.args])
+            else:
+                value = function.call(self, node.args)
+        finally:
+            self.call_stack.pop()
+            self.statement = statement
+
+        if node.temp:
+            self.env.declare_var(node.temp, value)
+        return value
+
+    def visit_variable(self, node):
+        value = self.env.resolve_var(node.name, level=node.scope_depth)
+        return value.value if node.cell else value
+
+    @staticmethod
+    def visit_literal(node):
+        return node.value
@@ -0,0 +1,254 @@
+import random
+from tc.common import Type
+
+# Operators generating values of given type from operands of the same type (division and modulo are
+# generated separately, with non-zero literal divisors)
+arithmetic_operators = {
+    Type.INT: ['+', '-', '*'],
+    Type.FLOAT: ['+', '-', '*'],
+    Type.STRING: ['+'],
+}
+comparison_operators = {
+    Type.INT: ['==', '!=', '<', '<=', '>', '>='],
+    Type.FLOAT: ['<', '<=', '>', '>='],
+    Type.BOOL: ['==', '!='],
+    Type.STRING: ['==', '!='],
+}
+value_types = [Type.INT, Type.FLOAT, Type.BOOL, Type.STRING]
+words = ['alpha', 'beta', 'gamma', 'delta', 'tc', '']
+INT_MODULUS = 10007  # stored integers are kept bounded
+
+
+class GeneratedFunction:
+    """Signature of a generated function, with estimated number of statements executed by its call."""
+
+    def __init__(self, name, param_types, return_type, cost):
+        self.name = name
+        self.param_types = param_types
+        self.return_type = return_type
+        self.cost = cost
+
+
+class ProgramGenerator:
+    """Generates random, valid and type-correct tc programs of controllable shape (for benchmarks).
+
+    Program consists of global variable declarations, function definitions and top-level code calling
+    them. Generated programs always terminate: loops have constant trip counts (their counters are never
+    assigned in the body), functions only call functions defined before them and calls are generated
+    only while estimated number of executed statements stays within `max_call_cost`. Values stay
+    bounded: stored integers are taken modulo INT_MODULUS, string concatenations append literals to at
+    most one variable and math functions only take integers (floats might overflow to infinity). Divisors
+    are non-zero literals, so evaluation never fails. Generator is deterministic for given seed.
+
+    Attributes:
+        size (int): approximate total number of statements
+        functions (int): number of top-level functions
+        depth (int): maximal nesting of compound statements (blocks, conditionals and loops)
+        loop_density (float): probability of a compound statement being a loop
+        expr_size (int): maximal number of operators in an expression
+        trip_count (int): number of iterations of each loop
+        max_call_cost (int): maximal estimated number of statements executed by a single call
+        rng (random.Random): source of randomness
+        scopes (list): stack of scopes, map (variable name -> (type, whether it might be assigned))
+        defined (list): GeneratedFunction of functions defined so far
+        cost (int): estimated number of statements executed in the function being generated
+        multiplier (int): number of times the statement being generated is executed (per call)
+        counter (int): counter of generated names
+    """
+
+    def __init__(self, size=200, functions=10, depth=3, loop_density=0.3, expr_size=4, trip_count=3,
+                 max_call_cost=2000, seed=0):
+        self.size = size
+        self.functions = functions
+        self.depth = depth
+        self.loop_density = loop_density
+        self.expr_size = expr_size
+        self.trip_count = trip_count
+        self.max_call_cost = max_call_cost
+        self.rng = random.Random(seed)
+        self.scopes = []
+        self.defined = []
+        self.cost = 0
+        self.multiplier = 1
+        self.counter = 0
+
+    def reset(self, seed=0):
+        self.rng = random.Random(seed)
+        self.scopes = []
+        self.defined = []
+        self.cost = 0
+        self.multiplier = 1
+        self.counter = 0
+
+    def run(self):
+        """Returns source code of a new program."""
+        self.scopes = [{}]
+        n_globals = max(1, self.size // 20)
+        per_function = max(1, (self.size - n_globals) // (self.functions + 1))
+
+        lines = [self.declaration(self.rng.choice(value_types), mutable=True) + ';' for _ in range(n_globals)]
+        for _ in range(self.functions):
+            lines.append(self.function(per_function))
+
+        self.cost, self.multiplier = 0, 1
+        lines.extend(self.statements(per_function, self.depth))
+        return '\n'.join(lines) + '\n'
+
+    def name(self, prefix):
+        self.counter += 1
+        return f'{prefix}{self.counter}'
+
+    def variables(self, type, mutable=False):
+        return [name for scope in self.scopes for name, (t, m) in scope.items() if t == type and (m or not mutable)]
+
+    def function(self, n_statements):
+        name = self.name('f')
+        param_types = [self.rng.choice([Type.INT, Type.FLOAT]) for _ in range(self.rng.randint(0, 3))]
+        return_type = self.rng.choice(value_types)
+
+        params = {self.name('p'): (t, True) for t in param_types}
+        self.scopes.append(params)
+        self.cost, self.multiplier = 0, 1
+        body = self.statements(n_statements - 1, self.depth - 1)
+        body.append(f'return {self.value(return_type)};')
+        self.scopes.pop()
+
+        self.defined.append(GeneratedFunction(name, param_types, return_type, self.cost + 1))
+        params_src = ', '.join(f'{p}: {t.value}' for p, (t, _) in params.items())
+        return self.block(f'def {name}({params_src}): {return_type.value}', body)
+
+    def block(self, header, statements):
+        body = '\n'.join('    ' + line for stmt in statements for line in stmt.split('\n'))
+        return f'{header} {{\n{body}\n}}'
+
+    def statements(self, n, depth):
+        self.scopes.append({})
+        result = []
+        while n > 0:
+            compound = depth > 0 and n > 2 and self.rng.random() < 0.3
+            if compound:
+                inner = self.rng.randint(1, min(n - 1, max(1, self.size // 10)))
+                result.append(self.compound(inner, depth))
+                n -= inner + 1
+            else:
+                result.append(self.simple())
+                n -= 1
+        self.scopes.pop()
+        return result
+
+    def compound(self, n, depth):
+        if self.rng.random() < self.loop_density:
+            outer_multiplier, self.multiplier = self.multiplier, self.multiplier * self.trip_count
+            try:
+                return self.loop(n, depth)
+            finally:
+                self.multiplier = outer_multiplier
+
+        if self.rng.random() < 0.5:
+            return self.block('', self.statements(n, depth - 1)).lstrip()
+        return self.block(f'if ({self.condition()})', self.statements(n, depth - 1))
+
+    def loop(self, n, depth):
+        counter = self.name('i')
+        if self.rng.random() < 0.5:
+            self.scopes.append({counter: (Type.INT, False)})
+            header = f'for (var {counter}: int = 0; {counter} < {self.trip_count}; {counter} = {counter} + 1)'
+            loop = self.block(header, self.statements(n, depth - 1))
+            self.scopes.pop()
+            return loop
+
+        self.scopes[-1][counter] = (Type.INT, False)
+        body = self.statements(n - 1, depth - 1)
+        body.append(f'{counter} = {counter} + 1;')
+        return f'var {counter}: int = 0;\n' + self.block(f'while ({counter} < {self.trip_count})', body)
+
+    def condition(self):
+        return self.expr(Type.BOOL, self.expr_size)
+
+    def simple(self):
+        self.cost += self.multiplier
+        kind = self.rng.random()
+        if kind < 0.35:
+            return self.declaration(self.rng.choice(value_types)) + ';'
+        if kind < 0.75:
+            assignable = [(n, t) for t in value_types for n in self.variables(t, mutable=True)]
+            if assignable:
+                name, type = self.rng.choice(assignable)
+                return f'{name} = {self.value(type)};'
+            return self.declaration(self.rng.choice(value_types)) + ';'
+        if kind < 0.85:
+            return f'print {self.expr(self.rng.choice(value_types), self.expr_size)};'
+        return f'{self.expr(self.rng.choice(value_types), self.expr_size)};'
+
+    def declaration(self, type, mutable=None):
+        name = self.name('v')
+        value = self.value(type)
+        self.scopes[-1][name] = (type, self.rng.random() < 0.7 if mutable is None else mutable)
+        return f'var {name}: {type.value} = {value}'
+
+    def value(self, type):
+        """Returns expression whose value is stored (in a variable or returned)."""
+        value = self.expr(type, self.expr_size)
+        return f'{value} % {INT_MODULUS}' if type == Type.INT else value
+
+    def expr(self, type, size):
+        if size <= 0 or self.rng.random() < 0.25:
+            return self.operand(type)
+
+        left_size = self.rng.randint(0, size - 1)
+        right_size = size - 1 - left_size
+        choice = self.rng.random()
+
+        if type == Type.BOOL:
+            operand_type = self.rng.choice(list(comparison_operators))
+            op = self.rng.choice(comparison_operators[operand_type])
+            return f'({self.expr(operand_type, left_size)} {op} {self.expr(operand_type, right_size)})'
+        if type == Type.INT and choice < 0.15:
+            return f'({self.expr(Type.INT, left_size)} % {self.rng.randint(1, 9)})'
+        if type == Type.FLOAT and choice < 0.15:
+            return f'({self.expr(Type.INT, left_size)} / {self.rng.randint(1, 9)})'
+        if type == Type.FLOAT and choice < 0.25:
+            return f'{self.rng.choice(["sin", "cos"])}({self.expr(Type.INT, size - 1)})'
+        if type == Type.STRING and choice < 0.2:
+            return f'tostring({self.expr(self.rng.choice([Type.INT, Type.FLOAT]), size - 1)})'
+        if choice < 0.35:
+            call = self.call(type, size)
+            if call is not None:
+                return call
+        if type == Type.STRING:
+            # Appending literals only, so strings grow linearly
+            return f'({self.expr(type, size - 1)} + {self.literal(type)})'
+
+        op = self.rng.choice(arithmetic_operators[type])
+        return f'({self.expr(type, left_size)} {op} {self.expr(type, right_size)})'
+
+    def call(self, type, size):
+        callees = [f for f in self.defined
+                   if f.return_type == type and self.cost + f.cost * self.multiplier <= self.max_call_cost]
+        if not callees:
+            return None
+
+        callee = self.rng.choice(callees)
+        self.cost += callee.cost * self.multiplier
+        args_size = (size - 1) // max(1, len(callee.param_types))
+        return f'{callee.name}({", ".join(self.expr(t, args_size) for t in callee.param_types)})'
+
+    def operand(self, type):
+        names = self.variables(type)
+        if names and self.rng.random() < 0.7:
+            return self.rng.choice(names)
+        return self.literal(type)
+
+    def literal(self, type):
+        if type == Type.INT:
+            return str(self.rng.randint(0, 100))
+        if type == Type.FLOAT:
+            return f'{self.rng.uniform(0, 10):.2f}'
+        if type == Type.BOOL:
+            return self.rng.choice(['true', 'false'])
+        return repr(self.rng.choice(words))
+
+
+def generate_program(seed=0, **shape):
+    """Generates a random tc program (see ProgramGenerator for parameters of its shape)."""
+    return ProgramGenerator(seed=seed, **shape).run()
@@ -1,92 +1,123 @@
 import math
-from tc.common import Callable, CallableSignature, Environment, PolyCallableSignature, Type
+import numpy as np
+from tc.common import (
+    Callable, CallableSignature, Environment, PolyCallableSignature, Type, array_element_types, binary_operators,
+    check_int64
+)
 
 
 def global_env():
     env = Environment(None)
-
-    # Define some builtin functions
-    env.define_fun('sin', Sin)
-    env.define_fun('cos', Cos)
-    env.define_fun('toint', ToInt())
-    env.define_fun('tofloat', ToFloat())
-    env.define_fun('tostring', ToString())
+    for name, builtin in builtins.items():
+        env.define_fun(name, builtin)
     return env
 
-   
-# Builtin functions 
-# TODO: boolean conversions?
-class MathFunction(Callable):
-    def __init__(self, fun):
+
+class NativeFunction(Callable):
+    """Builtin function implemented by a Python callable.
+
+    Evaluator calls it directly with already evaluated argument values (see Evaluator.visit_call), no
+    environment is created for the call.
+
+    Attributes:
+        fun (callable): implementation, function of argument values
+        signature (CallableSignature): types of arguments and of the result
+    """
+    native = True
+
+    def __init__(self, fun, signature, pure=True):
         self.fun = fun
-        self.signature = PolyCallableSignature([
-            CallableSignature([Type.INT], Type.FLOAT),
-            CallableSignature([Type.FLOAT], Type.FLOAT),
-        ])
+        self.signature = signature
+        self.pure = pure
 
     def call(self, evaluator, args):
-        assert len(args) == 1
-        arg = evaluator.visit(args[0])
-        evaluator.env = Environment(enclosing=evaluator.env)
-        try:
-            return self.fun(arg)
-        finally:
-            evaluator.env = evaluator.env.enclosing
+        return self.fun(*[evaluator.visit(a) for a in args])
 
 
-Sin = MathFunction(math.sin)
-Cos = MathFunction(math.cos)
+def overloads(*signatures):
+    """PolyCallableSignature of given pairs (parameter types, return type)."""
+    return PolyCallableSignature([CallableSignature(list(params), result) for params, result in signatures])
 
 
-class ToInt(Callable):
-    def __init__(self):
-        self.signature = PolyCallableSignature([
-            CallableSignature([Type.INT], Type.INT),
-            CallableSignature([Type.FLOAT], Type.INT),
-            CallableSignature([Type.STRING], Type.INT),
-        ])
+class ArraySignature(CallableSignature):
+    """Signature of array constructors - any number of arguments of the element type."""
 
-    def call(self, evaluator, args):
-        assert len(args) == 1
-        arg = evaluator.visit(args[0])
-        evaluator.env = Environment(enclosing=evaluator.env)
-        try:
-            return int(arg)
-        finally:
-            evaluator.env = evaluator.env.enclosing
-
-
-class ToFloat(Callable):
-    def __init__(self):
-        self.signature = PolyCallableSignature([
-            CallableSignature([Type.INT], Type.FLOAT),
-            CallableSignature([Type.FLOAT], Type.FLOAT),
-            CallableSignature([Type.STRING], Type.FLOAT),
-        ])
+    def __init__(self, array_type):
+        super().__init__([], array_type)
+        self.element_type = array_element_types[array_type]
 
-    def call(self, evaluator, args):
-        assert len(args) == 1
-        arg = evaluator.visit(args[0])
-        evaluator.env = Environment(enclosing=evaluator.env)
-        try:
-            return float(arg)
-        finally:
-            evaluator.env = evaluator.env.enclosing
-
-
-class ToString(Callable):
-    def __init__(self):
-        self.signature = PolyCallableSignature([
-            CallableSignature([Type.INT], Type.STRING),
-            CallableSignature([Type.FLOAT], Type.STRING),
-            CallableSignature([Type.STRING], Type.STRING),
-        ])
+    def verify(self, arg_types):
+        for a_t in arg_types:
+            if a_t != self.element_type:
+                raise TypeError(f'Type mismatch in {self.return_type.value} literal: expected {self.element_type}, '
+                                f'given {a_t}')
+        return self.return_type
 
-    def call(self, evaluator, args):
-        assert len(args) == 1
-        arg = evaluator.visit(args[0])
-        evaluator.env = Environment(enclosing=evaluator.env)
-        try:
-            return str(arg)
-        finally:
-            evaluator.env = evaluator.env.enclosing
+
+numpy_types = {
+    Type.ARRAY_INT: np.int64,
+    Type.ARRAY_FLOAT: np.float64,
+    Type.ARRAY_BOOL: np.bool_,
+}
+
+
+def array_constructor(array_type):
+    """Array literal, e.g. array[int](1, 2, 3) (arrays are immutable)."""
+    dtype = numpy_types[array_type]
+    return NativeFunction(lambda *elements: np.array(elements, dtype=dtype), ArraySignature(array_type))
+
+
+def scalar(value):
+    """Converts NumPy scalars (e.g. results of reductions) to Python ones."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def reduction(fun):
+    return lambda *arrays: scalar(check_int64(fun(*arrays), fun, *arrays))
+
+
+def extremum(fun, array_fun):
+    """Minimum or maximum of two numbers or of an array."""
+    return lambda *args: scalar(array_fun(args[0])) if len(args) == 1 else fun(args)
+
+
+# Signatures
+real_function = overloads(([Type.INT], Type.FLOAT), ([Type.FLOAT], Type.FLOAT))
+numeric_function = overloads(([Type.INT], Type.INT), ([Type.FLOAT], Type.FLOAT))
+numeric_operator = overloads(([Type.INT, Type.INT], Type.INT), ([Type.FLOAT, Type.FLOAT], Type.FLOAT))
+numeric_reduction = overloads(([Type.ARRAY_INT], Type.INT), ([Type.ARRAY_FLOAT], Type.FLOAT))
+numeric_extremum = PolyCallableSignature(numeric_operator.signatures + numeric_reduction.signatures)
+bool_reduction = overloads(([Type.ARRAY_BOOL], Type.BOOL))
+
+# Builtin functions
+# TODO: boolean conversions?
+builtins = {
+    # Math
+    'sin': NativeFunction(math.sin, real_function),
+    'cos': NativeFunction(math.cos, real_function),
+    'sqrt': NativeFunction(math.sqrt, real_function),
+    'exp': NativeFunction(math.exp, real_function),
+    'log': NativeFunction(math.log, real_function),
+    'abs': NativeFunction(abs, numeric_function),
+    'pow': NativeFunction(binary_operators['^'], numeric_operator),
+    'floor': NativeFunction(math.floor, overloads(([Type.INT], Type.INT), ([Type.FLOAT], Type.INT))),
+    'min': NativeFunction(extremum(min, np.min), numeric_extremum),
+    'max': NativeFunction(extremum(max, np.max), numeric_extremum),
+
+    # Conversions
+    'toint': NativeFunction(int, overloads(([Type.INT], Type.INT), ([Type.FLOAT], Type.INT),
+                                           ([Type.STRING], Type.INT))),
+    'tofloat': NativeFunction(float, overloads(([Type.INT], Type.FLOAT), ([Type.FLOAT], Type.FLOAT),
+                                               ([Type.STRING], Type.FLOAT))),
+    'tostring': NativeFunction(str, overloads(([Type.INT], Type.STRING), ([Type.FLOAT], Type.STRING),
+                                              ([Type.STRING], Type.STRING))),
+
+    # Arrays
+    **{array_type.value: array_constructor(array_type) for array_type in array_element_types},
+    'len': NativeFunction(len, overloads(*[([a], Type.INT) for a in array_element_types])),
+    'sum': NativeFunction(reduction(np.sum), numeric_reduction),
+    'dot': NativeFunction(reduction(np.dot), overloads(([Type.ARRAY_INT] * 2, Type.INT),
+                                                       ([Type.ARRAY_FLOAT] * 2, Type.FLOAT))),
+    'any': NativeFunction(reduction(np.any), bool_reduction),
+    'all': NativeFunction(reduction(np.all), bool_reduction),
+}
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import pickle
+from enum import Enum
+from tc.optimization.common import CallLocator, GenKillBuilder, VarDefLocator, VarUseLocator
+from tc.parser import FunctionDef
+
+CACHE_VERSION = 1
+
+# Attributes attached to nodes by analyses and optimizers - not a part of the source
+annotations = {'def_node', 'temp', 'memo_size', 'frozen', 'inferred_return_type', 'free_vars', 'free_funs', 'cell',
+               'version', 'phis'}
+
+
+def canonical(node):
+    """Returns canonical textual form of given AST subtree (including scope depths set by Resolver)."""
+    if isinstance(node, (list, tuple)):
+        return '[' + ','.join(canonical(n) for n in node) + ']'
+    if isinstance(node, Enum):
+        return str(node)
+    if hasattr(node, '__dict__'):
+        fields = ','.join(f'{k}={canonical(v)}' for k, v in sorted(vars(node).items()) if k not in annotations)
+        return f'{type(node).__name__}({fields})'
+    return repr(node)
+
+
+def strip_call_links(node):
+    # Links point to other functions' subtrees - not to be persisted with the body
+    for call in CallLocator().run([node]):
+        call.__dict__.pop('def_node', None)
+
+
+class CompilationCache:
+    """Persisted cache of type checked and optimized bodies of top-level functions.
+
+    Each top-level function definition is keyed by a content hash of its subtree, subtrees of functions
+    it (transitively) calls, all definitions of variables of the same names as the ones it (or its
+    callees) references outside of the function body and compilation options. Function with a known
+    key is restored from the cache: its body is replaced with the optimized one and marked `frozen`,
+    so TypeCheck takes its return type from the cache and optimizers leave it as is. Only the changed
+    functions and top-level code are checked and optimized again.
+
+    Entries are stored as separate files in given directory.
+
+    Attributes:
+        path (str): cache directory
+        hits (list): names of functions restored from the cache in the last run
+        misses (list): names of functions compiled in the last run
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = []
+        self.misses = []
+        os.makedirs(path, exist_ok=True)
+
+    def reset(self):
+        self.hits = []
+        self.misses = []
+
+    def entry_path(self, key):
+        return os.path.join(self.path, f'{key}.pickle')
+
+    def keys(self, statements, options):
+        """Computes keys of top-level functions (given resolved AST), returns map (FunctionDef -> key)."""
+        GenKillBuilder().run(statements)  # links calls to function definitions
+
+        keys = {}
+        for fun_def in statements:
+            if not isinstance(fun_def, FunctionDef):
+                continue
+
+            callees = self.callees(fun_def)
+            names = VarUseLocator().run([fun_def, *callees])
+            # Other top-level statements defining variables of the same names (in program order)
+            context = [canonical(s) for s in statements
+                       if s is not fun_def and {d.name for d in VarDefLocator().run([s])} & names]
+
+            parts = [str(CACHE_VERSION), repr(sorted(options.items())), canonical(fun_def),
+                     *sorted(canonical(c) for c in callees), *context]
+            keys[fun_def] = hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+        return keys
+
+    @staticmethod
+    def callees(fun_def):
+        """Returns user defined functions (transitively) called from given function."""
+        callees, frontier = set(), [fun_def]
+        while frontier:
+            found = []
+            for call in CallLocator().run(frontier):
+                def_node = getattr(call, 'def_node', None)
+                if def_node is not None and def_node is not fun_def and def_node not in callees:
+                    callees.add(def_node)
+                    found.append(def_node)
+            frontier = found
+        return callees
+
+    def restore(self, statements, **options):
+        """Restores cached functions, returns keys of the ones to be stored after compilation."""
+        self.reset()
+        missing = {}
+        for fun_def, key in self.keys(statements, options).items():
+            try:
+                with open(self.entry_path(key), 'rb') as f:
+                    entry = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                missing[fun_def] = key
+                self.misses.append(fun_def.name)
+                continue
+
+            fun_def.body = entry['body']
+            fun_def.inferred_return_type = entry['return_type']
+            fun_def.frozen = True
+            self.hits.append(fun_def.name)
+        return missing
+
+    def store(self, statements, missing):
+        """Stores compiled functions (the ones still present in the optimized AST)."""
+        for fun_def in statements:
+            if not isinstance(fun_def, FunctionDef) or fun_def not in missing:
+                continue
+
+            strip_call_links(fun_def.body)
+            entry = {'body': fun_def.body, 'return_type': fun_def.inferred_return_type}
+            tmp_path = self.entry_path(missing[fun_def]) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, self.entry_path(missing[fun_def]))
@@ -1,8 +1,11 @@
-import operator
-from tc.common import BaseVisitor, Environment, Function
-from tc.globals import global_env
-from tc.optimization import AlgebraicOptimizer, ExpressionDAGOptimizer, InOutBuilder, RedundancyOptimizer
-from tc.parser import Parser
+from contextlib import contextmanager
+from tc.cooperative import DEFAULT_STEPS_PER_YIELD, CooperativeExecution
+from tc.embedding import Module
+from tc.evaluator import Evaluator, ExecutionLimitExceeded
+from tc.optimization import MAX_LEVEL, PassManager
+from tc.output import BufferedOutput
+from tc.parser import FunctionDef, Parser
+from tc.profiler import DEFAULT_INTERVAL, SamplingProfiler
 from tc.resolver import Resolver
 from tc.typecheck import TypeCheck
 
@@ -11,165 +14,117 @@ from tc.typecheck import TypeCheck
 #  - skip redundant instructions (e.g. ones that do not influence function return value etc.)
 #  - implement loop code shift optimization
 
-# AST evaluation
-class Evaluator(BaseVisitor):
-    """Visitor of abstract syntax tree nodes."""
-
-    operators = {
-        '+': operator.add,
-        '-': operator.sub,
-        '*': operator.mul,
-        '/': operator.truediv,
-        '^': operator.pow,
-        '%': operator.mod,
-        '==': operator.eq,
-        '!=': operator.ne,
-        '>': operator.gt,
-        '>=': operator.ge,
-        '<=': operator.le,
-        '<': operator.lt,
-    }
-    unary_operators = {
-        '-': operator.neg,
-    }
-
-    def __init__(self):
-        self.env = global_env()
-
-    def reset(self):
-        self.env = global_env()
-
-    def run(self, statements):
-        for stmt in statements:
-            self.visit(stmt)
-
-    def visit_block(self, node):
-        try:
-            self.env = Environment(enclosing=self.env)
-            for stmt in node.statements:
-                self.visit(stmt)
-        finally:
-            self.env = self.env.enclosing
-
-    def visit_function_def(self, node):
-        try:
-            self.env.resolve_fun(node.name, level=0)
-        except:
-            self.env.define_fun(node.name, Function(node.parameters, node.body, self.env))
-        else:
-            raise Exception(f'Function {node.name} defined twice!')
-
-    def visit_print_stmt(self, node):
-        print(self.visit(node.expr))
-
-    def visit_variable_declaration(self, node):
-        try:
-            self.env.resolve_var(node.name, level=0)
-        except:
-            if node.value:
-                value = self.visit(node.value)
-            else:
-                value = None
-            self.env.declare_var(node.name, value)
-        else:
-            raise Exception(f'Variable {node.name} declared twice!')
-
-    def visit_assignment(self, node):
-        self.env.resolve_var(node.name, level=node.scope_depth)
-        value = self.visit(node.value)
-        self.env.define_var(node.name, value)
- 
-    def visit_if_stmt(self, node):
-        if self.visit(node.condition):
-            self.visit(node.body)
-
-    def visit_while_stmt(self, node):
-        while self.visit(node.condition):
-            self.visit(node.body)
-    
-    def visit_for_stmt(self, node):
-        self.env = Environment(enclosing=self.env)
-
-        self.visit(node.initializer)
-        while self.visit(node.condition):
-            self.visit(node.body)
-            self.visit(node.increment)
-
-        self.env = self.env.enclosing
-
-    def visit_binary_expr(self, node):
-        if hasattr(node, 'common_node'):
-            return node.common_node.cache
-
-        op = self.operators[node.op]
-        lval = self.visit(node.left)
-        rval = self.visit(node.right)
-        value = op(lval, rval)
-
-        if hasattr(node, 'cache'):
-            node.cache = value
-        return value
-
-    def visit_unary_expr(self, node):
-        if hasattr(node, 'common_node'):
-            return node.common_node.cache
-
-        op = self.unary_operators[node.op]
-        value = op(self.visit(node.expr))
-
-        if hasattr(node, 'cache'):
-            node.cache = value
-        return value
-
-    def visit_assert_stmt(self, node):
-        value = self.visit(node.expr)
-        assert value
-
-    class ReturnValue(Exception):
-        def __init__(self, val):
-            super()
-            self.val = val
-
-    def visit_return_stmt(self, node):
-        value = self.visit(node.expr)
-        raise Evaluator.ReturnValue(value)
-
-    def visit_call(self, node):
-        function = self.env.resolve_fun(node.name, level=node.scope_depth)
-        return function.call(self, node.args)
-
-    def visit_variable(self, node):
-        return self.env.resolve_var(node.name, level=node.scope_depth)
-
-    @staticmethod
-    def visit_literal(node):
-        return node.value
-
 
 class Interpreter:
-    def __init__(self):
+    def __init__(self, cache=None, output=None):
         self.parser = Parser()
         self.resolver = Resolver()
-        self.eval = Evaluator()
+        self.output = output or BufferedOutput()  # OutputSink of print statements, flushed after each run
+        self.eval = Evaluator(self.output)
         self.typecheck = TypeCheck()
+        self.cache = cache  # CompilationCache for incremental compilation of functions
+        self.pass_stats = {}
+        self.steps = 0  # number of steps evaluated by the last run
+        self.profiler = None  # SamplingProfiler of evaluation, if started
 
     def reset(self):
         self.eval.reset()
         self.typecheck.reset()
         self.resolver.reset()
 
-    def run(self, program, opt=False, red_opt=True):
+    def start_profiling(self, interval=DEFAULT_INTERVAL):
+        """Starts sampling call stacks of evaluation (might be called while a program runs), returns the profiler."""
+        if self.profiler is None or self.profiler.evaluator is not self.eval:
+            self.profiler = SamplingProfiler(self.eval, interval)
+        self.profiler.interval = interval
+        return self.profiler.start()
+
+    def stop_profiling(self):
+        """Stops sampling, returns the profiler with samples collected so far (None if it was not started)."""
+        return self.profiler and self.profiler.stop()
+
+    def fork(self, output=None):
+        """New interpreter starting in the state of this one, e.g. after loading a prelude.
+
+        Global scopes of the evaluator, the resolver and the type checker are copied (so programs run by
+        either interpreter do not affect the other one), ASTs of functions defined so far, their type and
+        optimization annotations are shared - the prelude is never parsed or analysed again (optimizers of
+        programs run by the fork treat calls of its functions conservatively). An interpreter forked from
+        is a snapshot, it might be forked any number of times (from any thread, as long as it does not run
+        programs itself).
+        """
+        interpreter = Interpreter(cache=self.cache, output=output or BufferedOutput())
+        interpreter.eval = self.eval.fork(interpreter.output)
+        interpreter.resolver = self.resolver.fork()
+        interpreter.typecheck = self.typecheck.fork()
+        return interpreter
+
+    def run(self, program, opt=False, red_opt=True, memo_exclude=(), level=None, max_steps=None, timeout=None):
+        """Runs the program, optimized on given level (see PassManager) - by default highest one if `opt` is set.
+
+        Evaluation fails with ExecutionLimitExceeded after `max_steps` steps (loop iterations and calls) or
+        `timeout` seconds, number of steps of the run is kept in `steps`.
+        """
+        ast = self.compile(program, opt, red_opt, memo_exclude, level)
+        with self.limited(max_steps, timeout):
+            self.eval.run(ast)
+
+    async def run_async(self, program, opt=False, red_opt=True, memo_exclude=(), level=None,
+                        steps_per_yield=DEFAULT_STEPS_PER_YIELD, max_steps=None, timeout=None):
+        """Runs the program in an asyncio task, yielding to the event loop every `steps_per_yield` steps.
+
+        Programs run by different interpreters are scheduled fairly (see CooperativeExecution). Limits are
+        the ones of `run`, time spent by other tasks counts towards `timeout`.
+        """
+        ast = self.compile(program, opt, red_opt, memo_exclude, level)
+        with self.limited(max_steps, timeout):
+            await CooperativeExecution(self.eval, steps_per_yield).run(ast)
+
+    def load(self, program, opt=False, red_opt=True, memo_exclude=(), level=None, max_steps=None, timeout=None):
+        """Runs the program (see `run`), returns Module whose top-level functions might be called from Python.
+
+        Top-level functions are kept by optimizations even if the program itself never calls them.
+        """
+        ast = self.compile(program, opt, red_opt, memo_exclude, level, keep_functions=True)
+        with self.limited(max_steps, timeout):
+            self.eval.run(ast)
+        return Module(self, [stmt.name for stmt in ast if isinstance(stmt, FunctionDef)])
+
+    @contextmanager
+    def limited(self, max_steps, timeout):
+        """Limits evaluation within the block, records its number of steps and flushes output after it."""
+        start = self.eval.steps
+        self.eval.limit(max_steps, timeout)
+        try:
+            yield
+        finally:
+            self.eval.limit()
+            self.steps = self.eval.steps - start
+            self.output.flush()
+
+    def compile(self, program, opt=False, red_opt=True, memo_exclude=(), level=None, keep_functions=False):
+        """Parses, type checks and optimizes the program, returns AST ready for evaluation.
+
+        With `keep_functions` set, top-level functions are not removed (nor pruned) as redundant.
+        """
+        if level is None:
+            level = MAX_LEVEL if opt else 0
+
+        disabled = () if red_opt else ('redundancy',)
+
         ast = self.parser.run(program)
         self.resolver.run(ast)
+        if self.cache is not None:
+            compiled = self.cache.restore(ast, level=level, disabled=disabled, memo_exclude=sorted(memo_exclude),
+                                          keep_functions=keep_functions)
         self.typecheck.run(ast)
-        if opt:
-            in_sets, out_sets = InOutBuilder().run(ast)
-            redundancy_optimizer = RedundancyOptimizer(in_sets)
-            alg_optimizer = AlgebraicOptimizer()
-            cs_optimizer = ExpressionDAGOptimizer(in_sets)
-
-            if red_opt:
-                ast = redundancy_optimizer.run(ast)
-            ast = alg_optimizer.run(ast)
-            ast = cs_optimizer.run(ast)
-        self.eval.run(ast)
+
+        pass_manager = PassManager(level, disabled=disabled, memo_exclude=memo_exclude, keep_functions=keep_functions)
+        ast = pass_manager.run(ast)
+        self.pass_stats = pass_manager.stats
+        if self.cache is not None:
+            self.cache.store(ast, compiled)
+
+        # Optimizers keep lexical scope depths, functions are laid out for flat closures only now
+        self.resolver.run(ast, flat_closures=True)
+        return ast
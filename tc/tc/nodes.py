@@ -0,0 +1,151 @@
+import typing
+from dataclasses import dataclass
+
+
+# All possible nodes of the abstract syntax tree.
+@dataclass(unsafe_hash=True)
+class AssertStmt:
+    expr: typing.Any
+
+
+@dataclass(unsafe_hash=True)
+class Assignment:
+    name: str
+    value: typing.Any
+    cell = False  # whether the variable lives in a shared cell (see Resolver)
+    version = None  # SSA version defined (see SSABuilder)
+
+
+@dataclass(unsafe_hash=True)
+class BinaryExpr:
+    left: typing.Any
+    op: str
+    right: typing.Any
+    temp = None  # name of the temporary the value is stored in (see ExpressionDAGOptimizer)
+
+    def __eq__(self, other):
+        if isinstance(other, BinaryExpr):
+            return self.left == other.left and self.op == other.op and self.right == other.right
+        return False
+
+
+class Block:
+    def __init__(self, statements):
+        self.statements = statements
+
+
+@dataclass
+class Call:
+    name: str
+    args: typing.List
+    scope_depth: int = None
+    temp = None
+
+    def __hash__(self):
+        return id(self)
+
+
+class ForStmt:
+    phis = ()  # SSA phis (see SSABuilder)
+
+    def __init__(self, initializer, condition, increment, body):
+        self.initializer = initializer
+        self.condition = condition
+        self.increment = increment
+        self.body = body
+
+
+class FunctionDef:
+    frozen = False  # body restored already optimized from CompilationCache - left as is by optimizers
+    free_vars = None  # (name, depth) of captured variables, None unless laid out for flat closures (see Resolver)
+    free_funs = ()  # (name, depth) of captured functions
+
+    def __init__(self, name, parameters, return_type, body):
+        self.name = name
+        self.parameters = parameters
+        self.return_type = return_type
+        self.body = body
+
+
+class IfStmt:
+    phis = ()  # SSA phis (see SSABuilder)
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+
+@dataclass(frozen=True)
+class Literal:
+    value: typing.Union[str, int, float, bool]
+    type: typing.Any = None
+
+    def __hash__(self):
+        return id(self)
+
+    def __repr__(self):
+        return f'Literal(value={self.value}, type={self.type})'
+
+
+class Parameter:
+    cell = False
+    version = None
+
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+
+
+class PrintStmt:
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class ReturnStmt:
+    def __init__(self, expr):
+        self.expr = expr
+
+
+class UnaryExpr:
+    temp = None
+
+    def __init__(self, operator, expr):
+        self.op = operator
+        self.expr = expr
+
+
+@dataclass
+class Variable:
+    name: str
+    scope_depth: int = None
+    cell = False
+    version = None  # SSA version read (see SSABuilder)
+
+    def __hash__(self):
+        return id(self)
+
+    def __repr__(self):
+        return f'Variable(name={self.name})'
+
+
+@dataclass
+class VariableDeclaration:
+    name: str
+    type: typing.Any
+    value: typing.Any
+    cell = False
+    version = None
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return f'VariableDeclaration(name={self.name}, value={self.value})'
+
+
+class WhileStmt:
+    phis = ()  # SSA phis (see SSABuilder)
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
@@ -1,4 +1,12 @@
 from tc.optimization.algebraic import AlgebraicOptimizer
-from tc.optimization.common import InOutBuilder
+from tc.optimization.common import GenKillBuilder, InOutBuilder
+from tc.optimization.constant_propagation import SparseConstantPropagation
 from tc.optimization.common_subexpressions import ExpressionDAGOptimizer
+from tc.optimization.inlining import CallGraphBuilder, FunctionInliner
+from tc.optimization.liveness import DeadStoreOptimizer, LivenessAnalysis
+from tc.optimization.memoization import Memoizer, PurityAnalysis
+from tc.optimization.pass_manager import MAX_LEVEL, PassManager
 from tc.optimization.redundancy import RedundancyOptimizer
+from tc.optimization.ssa import SSABuilder, SSADestructor
+from tc.optimization.strength_reduction import StrengthReductionOptimizer
+from tc.optimization.value_numbering import GlobalValueNumberingOptimizer
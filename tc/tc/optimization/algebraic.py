@@ -1,4 +1,4 @@
-from tc.common import BaseVisitor
+from tc.common import BaseVisitor, Type
 from tc.parser import Literal
 
 
@@ -12,6 +12,7 @@ class AlgebraicOptimizer(BaseVisitor):
         '/': 1,
         '^': 1,
     }
+    commutative = {'+', '*'}  # neutral on both sides, others only on the right
 
     def run(self, statements):
         for i, stmt in enumerate(statements):
@@ -24,7 +25,8 @@ class AlgebraicOptimizer(BaseVisitor):
         return node
 
     def visit_function_def(self, node):
-        node.body = self.visit(node.body)
+        if not node.frozen:
+            node.body = self.visit(node.body)
         return node
 
     def visit_print_stmt(self, node):
@@ -63,10 +65,12 @@ class AlgebraicOptimizer(BaseVisitor):
 
         ne = self.neutral_elements.get(node.op, None)
         if ne is not None:
-            if isinstance(node.left, Literal) and node.left.value == ne:
+            if node.op in self.commutative and isinstance(node.left, Literal) and node.left.value == ne:
                 return node.right
             elif isinstance(node.right, Literal) and node.right.value == ne:
-                return node.left
+                # Integer division yields a float
+                if node.op != '/' or node.right.type == Type.FLOAT:
+                    return node.left
 
         return node
 
@@ -1,5 +1,6 @@
 from collections import defaultdict
 from contextlib import contextmanager
+from itertools import count
 from tc.common import BaseVisitor
 from tc.globals import global_env
 from tc.parser import Assignment
@@ -8,6 +9,13 @@ global_functions = global_env().functions.keys()
 
 TOP = 'PROGRAM'
 
+_fresh_names = count()
+
+
+def fresh_name(prefix):
+    """Generates a unique name for compiler-introduced variables (`$` can't appear in identifiers)."""
+    return f'{prefix}${next(_fresh_names)}'
+
 
 class VarDefLocator(BaseVisitor):
     """Finds all variable declarations/assignments in the program."""
@@ -53,6 +61,253 @@ class VarDefLocator(BaseVisitor):
         pass
 
 
+class VarUseLocator(BaseVisitor):
+    """Finds names of all variables read or assigned in the program (including function bodies)."""
+
+    def __init__(self):
+        self.names = set()
+
+    def reset(self):
+        self.names = set()
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return self.names
+
+    def visit_block(self, node):
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.visit(node.body)
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.names.add(node.name)
+        self.visit(node.value)
+
+    def visit_if_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.increment)
+        self.visit(node.body)
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        for a in node.args:
+            self.visit(a)
+
+    def visit_variable(self, node):
+        self.names.add(node.name)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class CallLocator(BaseVisitor):
+    """Finds all function calls in the program (without entering called functions)."""
+
+    def __init__(self):
+        self.calls = []
+
+    def reset(self):
+        self.calls = []
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return self.calls
+
+    def visit_block(self, node):
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.visit(node.body)
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.visit(node.value)
+
+    def visit_if_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.increment)
+        self.visit(node.body)
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        self.calls.append(node)
+        for a in node.args:
+            self.visit(a)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class NodeCounter(BaseVisitor):
+    """Counts nodes of the AST."""
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return self.count
+
+    def add(self, node):
+        self.count += 1
+
+    def visit_block(self, node):
+        self.add(node)
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.add(node)
+        for p in node.parameters:
+            self.add(p)
+        self.visit(node.body)
+
+    def visit_print_stmt(self, node):
+        self.add(node)
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        self.add(node)
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.add(node)
+        self.visit(node.value)
+
+    def visit_if_stmt(self, node):
+        self.add(node)
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.add(node)
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.add(node)
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.increment)
+        self.visit(node.body)
+
+    def visit_binary_expr(self, node):
+        self.add(node)
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.add(node)
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.add(node)
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.add(node)
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        self.add(node)
+        for a in node.args:
+            self.visit(a)
+
+    def visit_variable(self, node):
+        self.add(node)
+
+    def visit_literal(self, node):
+        self.add(node)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class NodeCollector(NodeCounter):
+    """Collects all nodes of the AST (map id -> node, nodes are kept alive so ids are not reused)."""
+
+    def __init__(self):
+        super().__init__()
+        self.nodes = {}
+
+    def reset(self):
+        super().reset()
+        self.nodes = {}
+
+    def run(self, statements):
+        super().run(statements)
+        return self.nodes
+
+    def add(self, node):
+        super().add(node)
+        self.nodes[id(node)] = node
+
+
 class GenKillBuilder(BaseVisitor):
     """Statically determines GEN and KILL sets of variable definition nodes for each node of the AST.
 
@@ -102,7 +357,9 @@ class GenKillBuilder(BaseVisitor):
         for scope in reversed(self.scopes):
             if name in scope:
                 return scope[name]
-        raise Exception(f'Failed to resolve function {name}')
+        # Defined by a previous program (e.g. prelude of a forked interpreter) - no definition node, calls of
+        # unknown functions are handled conservatively by optimizers
+        return set(), set(), None
 
     def run(self, statements):
         self.gather_defs(statements)
@@ -372,8 +629,11 @@ class InOutBuilder(BaseVisitor):
                 if kills & def_in:
                     in_update.add(assignment_node)
 
-            def_in.update(in_update)
-            self.visit(node.def_node)
+            # Revisit only if something new reaches the body - otherwise results would not change
+            # (and recursive functions would be revisited infinitely)
+            if not in_update <= def_in:
+                def_in.update(in_update)
+                self.visit(node.def_node)
 
     def visit_variable(self, node):
         self.transfer(node)
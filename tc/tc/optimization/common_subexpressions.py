@@ -1,95 +1,150 @@
+from contextlib import contextmanager
 from tc.common import BaseVisitor
+from tc.globals import global_env
+from tc.optimization.common import fresh_name
+from tc.parser import Variable
+
+global_functions = global_env().functions
 
 
 class ExpressionDAGOptimizer(BaseVisitor):
-    """Converts AST to DAG by reusing common subexpression nodes."""
+    """Reuses values of common subexpressions.
+
+    The first evaluation of a common subexpression stores its value in a temporary (node attribute
+    `temp` holds its name, see Evaluator), which is a variable of the environment the expression is
+    evaluated in. Subsequent occurrences are replaced with references to this variable. Thanks to that
+    the optimized AST holds no runtime state and can be evaluated recursively or concurrently.
+
+    Expressions are identified by operators, literal values and (unique) reaching definitions of
+    variables. Calls of pure builtin functions (e.g. sin, tostring) are handled as well, calls of user
+    defined functions are not.
+
+    Available expressions are scoped just like the environments: an occurrence may only be reused
+    within the scope it was evaluated in and after it was evaluated (on every path). Function bodies
+    start with no available expressions.
+
+    Attributes:
+        scopes (list): stack of maps (expression key -> (first occurrence node, its scope depth))
+    """
 
     def __init__(self, in_sets):
         self.in_sets = in_sets
-        self.subexpr = {}
-
-    def define_sub(self, key, node):
-        self.subexpr[key] = node
+        self.scopes = [{}]
+
+    def reset(self):
+        self.scopes = [{}]
+
+    @contextmanager
+    def in_scope(self):
+        try:
+            self.scopes.append({})
+            yield
+        finally:
+            self.scopes.pop()
+
+    def lookup(self, key):
+        for scope in reversed(self.scopes):
+            if key in scope:
+                return scope[key]
+        return None
 
     def run(self, statements):
         for stmt in statements:
             self.visit(stmt)
         return statements
 
+    def rewrite(self, node):
+        return self.visit(node)[1]
+
+    def common(self, key, node):
+        """Returns reference to the temporary if expression of given key is available, registers it otherwise."""
+        available = self.lookup(key)
+        if available is None:
+            self.scopes[-1][key] = (node, len(self.scopes))
+            return key, node
+
+        first, depth = available
+        if first.temp is None:
+            first.temp = fresh_name('cse')
+        var = Variable(name=first.temp, scope_depth=len(self.scopes) - depth)
+        self.in_sets[var] = set()
+        return key, var
+
     def visit_block(self, node):
-        for stmt in node.statements:
-            self.visit(stmt)
+        with self.in_scope():
+            for stmt in node.statements:
+                self.visit(stmt)
 
     def visit_function_def(self, node):
-        self.visit(node.body)
+        if node.frozen:
+            return
+
+        outer_scopes = self.scopes
+        self.scopes = [{}]  # parameters
+        try:
+            self.visit(node.body)
+        finally:
+            self.scopes = outer_scopes
 
     def visit_print_stmt(self, node):
-        self.visit(node.expr)
+        node.expr = self.rewrite(node.expr)
 
     def visit_variable_declaration(self, node):
         if node.value:
-            self.visit(node.value)
+            node.value = self.rewrite(node.value)
 
     def visit_assignment(self, node):
-        self.visit(node.value)
+        node.value = self.rewrite(node.value)
 
     def visit_if_stmt(self, node):
-        self.visit(node.condition)
+        node.condition = self.rewrite(node.condition)
         self.visit(node.body)
 
     def visit_while_stmt(self, node):
-        self.visit(node.condition)
+        node.condition = self.rewrite(node.condition)
         self.visit(node.body)
 
     def visit_for_stmt(self, node):
-        self.visit(node.initializer)
-        self.visit(node.condition)
-        self.visit(node.increment)
-        self.visit(node.body)
+        # Visit in order of evaluation
+        with self.in_scope():
+            self.visit(node.initializer)
+            node.condition = self.rewrite(node.condition)
+            self.visit(node.body)
+            self.visit(node.increment)
 
     def visit_binary_expr(self, node):
-        l_key = self.visit(node.left)
-        r_key = self.visit(node.right)
+        l_key, node.left = self.visit(node.left)
+        r_key, node.right = self.visit(node.right)
         if l_key is None or r_key is None:
-            return None
-
-        cur_key = (l_key, r_key, node.op)
+            return None, node
 
-        if cur_key in self.subexpr:
-            common_node = self.subexpr[cur_key]
-            node.common_node = common_node
-            node.left = node.right = None  # prune
-        else:
-            self.subexpr[cur_key] = node
-            # Mark node that shall compute the cache value - for evaluation
-            node.cache = None
-        return cur_key
+        return self.common((l_key, r_key, node.op), node)
 
     def visit_unary_expr(self, node):
-        key = self.visit(node.expr)
+        key, node.expr = self.visit(node.expr)
         if key is None:
-            return None
+            return None, node
 
-        cur_key = (key, node.op)
-        if cur_key in self.subexpr:
-            common_node = self.subexpr[cur_key]
-            node.common_node = common_node
-            node.expr = None  # prune
-        else:
-            self.subexpr[cur_key] = node
-            # Mark node that shall compute the cache value - for evaluation
-            node.cache = None
-        return cur_key
+        return self.common((key, node.op), node)
 
     def visit_assert_stmt(self, node):
-        self.visit(node.expr)
+        node.expr = self.rewrite(node.expr)
 
     def visit_return_stmt(self, node):
-        self.visit(node.expr)
+        node.expr = self.rewrite(node.expr)
 
     def visit_call(self, node):
-        # Unknown side-effects - prevent optimization
-        return None
+        arg_keys = []
+        for i, a in enumerate(node.args):
+            key, node.args[i] = self.visit(a)
+            arg_keys.append(key)
+
+        # Unknown side-effects of user defined functions - prevent optimization
+        builtin = getattr(node, 'def_node', None) is None and node.name in global_functions
+        if not builtin or not global_functions[node.name].pure or None in arg_keys:
+            return None, node
+
+        return self.common((node.name, tuple(arg_keys)), node)
 
     def visit_variable(self, node):
         in_set = self.in_sets[node]
@@ -97,15 +152,15 @@ class ExpressionDAGOptimizer(BaseVisitor):
 
         if len(reach_defs) == 1:
             reach_def = next(iter(reach_defs))
-            return id(reach_def)  # dumb hashing
+            return id(reach_def), node  # dumb hashing
         else:
             # More reaching definitions - can't reliably share variables in expressions
             # e.g. loops etc.
-            return None
+            return None, node
 
     @staticmethod
     def visit_literal(node):
-        return node.value
+        return (node.value, node.type), node
 
     def visit_unknown(self, m_name):
-        pass
+        return None, None
@@ -0,0 +1,222 @@
+from tc.common import BaseVisitor, binary_operators, unary_operators
+from tc.optimization.ssa import Phi, SSABuilder, SSADestructor
+from tc.parser import BinaryExpr, Literal, Parameter, UnaryExpr, Variable, VariableDeclaration
+from tc.typecheck import binary_signatures, unary_signatures
+
+# Lattice of values of versions: UNDEFINED (no value seen yet) > constants (value, Type) > VARYING
+UNDEFINED = 'undefined'
+VARYING = 'varying'
+
+MAX_FOLDED_EXPONENT = 64  # larger powers are left to runtime
+
+
+def same(a, b):
+    # Tells apart e.g. 0.0 and -0.0 and finds NaN equal to itself
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return a[1] == b[1] and repr(a[0]) == repr(b[0])
+    return a == b
+
+
+def meet(a, b):
+    if a == UNDEFINED:
+        return b
+    if b == UNDEFINED or same(a, b):
+        return a
+    return VARYING
+
+
+def fold_binary(op, left, right):
+    """Computes value of constant binary expression (VARYING if it can't be computed at compile time)."""
+    (l_value, l_type), (r_value, r_type) = left, right
+    result_type = binary_signatures.get((l_type, r_type), {}).get(op)
+    if result_type is None or (op == '^' and abs(r_value) > MAX_FOLDED_EXPONENT):
+        return VARYING
+    try:
+        return binary_operators[op](l_value, r_value), result_type
+    except (ArithmeticError, ValueError):
+        return VARYING
+
+
+def fold_unary(op, operand):
+    value, type = operand
+    result_type = unary_signatures.get(type, {}).get(op)
+    if result_type is None or op not in unary_operators:
+        return VARYING
+    return unary_operators[op](value), result_type
+
+
+class SparseConstantPropagation(BaseVisitor):
+    """Replaces reads of variables holding constants with literals and folds constant expressions.
+
+    Sparse propagation over SSA def-use chains (see SSABuilder): each version holds a value of the
+    lattice UNDEFINED > constant > VARYING. Versions are evaluated from a worklist, whenever value of
+    a version is lowered, only versions whose definitions read it are evaluated again. Each version is
+    lowered at most twice, so the propagation is linear in the size of the SSA form (unlike propagation
+    of reaching definition sets through every node of the AST).
+
+    Phis meet values of their arguments, optimistically ignoring undefined ones (back edges), so e.g.
+    a variable assigned the same constant in a loop stays constant. Parameters and values of calls are
+    varying. Programs stay in conventional SSA form (only reads are replaced), so translation out of SSA
+    just drops the versions (see SSADestructor).
+
+    Attributes:
+        ssa (SSAForm): SSA form of the optimized program
+        values (dict): map (version -> value in the lattice)
+        replaced (int): number of reads replaced with literals
+        folded (int): number of folded expressions
+    """
+
+    def __init__(self):
+        self.ssa = None
+        self.values = {}
+        self.replaced = 0
+        self.folded = 0
+
+    def reset(self):
+        self.ssa = None
+        self.values = {}
+        self.replaced = 0
+        self.folded = 0
+
+    def run(self, statements):
+        self.ssa = SSABuilder().run(statements)
+        self.propagate()
+
+        for i, stmt in enumerate(statements):
+            statements[i] = self.visit(stmt)
+        return SSADestructor().run(statements)
+
+    def propagate(self):
+        self.values = {v: UNDEFINED for v in self.ssa.definitions}
+        worklist = list(self.ssa.definitions)
+        while worklist:
+            version = worklist.pop()
+            value = self.evaluate(self.ssa.definitions[version])
+            if not same(value, self.values[version]):
+                self.values[version] = value
+                worklist.extend(self.ssa.dependents[version])
+
+    def evaluate(self, definition):
+        if isinstance(definition, Phi):
+            value = UNDEFINED
+            for a in definition.args:
+                value = meet(value, self.values[a])
+            return value
+        if isinstance(definition, Parameter):
+            return VARYING
+        if isinstance(definition, VariableDeclaration) and definition.value is None:
+            return VARYING
+        return self.value_of(definition.value)
+
+    def value_of(self, expr):
+        if isinstance(expr, Literal):
+            return expr.value, expr.type
+        if isinstance(expr, Variable):
+            return self.values[expr.version] if expr.version is not None else VARYING
+
+        if isinstance(expr, BinaryExpr):
+            operands = [self.value_of(expr.left), self.value_of(expr.right)]
+            fold = lambda: fold_binary(expr.op, *operands)
+        elif isinstance(expr, UnaryExpr):
+            operands = [self.value_of(expr.expr)]
+            fold = lambda: fold_unary(expr.op, *operands)
+        else:
+            return VARYING  # calls
+
+        if VARYING in operands:
+            return VARYING
+        if UNDEFINED in operands:
+            return UNDEFINED
+        return fold()
+
+    def constant(self, node):
+        """Returns literal replacing given expression, or the expression itself if it is not constant."""
+        value = self.value_of(node)
+        if value in (UNDEFINED, VARYING) or isinstance(node, Literal):
+            return node
+        return Literal(value=value[0], type=value[1])
+
+    def visit_block(self, node):
+        for i, stmt in enumerate(node.statements):
+            node.statements[i] = self.visit(stmt)
+        return node
+
+    def visit_function_def(self, node):
+        if not node.frozen:
+            node.body = self.visit(node.body)
+        return node
+
+    def visit_print_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            node.value = self.visit(node.value)
+        return node
+
+    def visit_assignment(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_if_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_while_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_for_stmt(self, node):
+        node.initializer = self.visit(node.initializer)
+        node.condition = self.visit(node.condition)
+        node.increment = self.visit(node.increment)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_binary_expr(self, node):
+        new_node = self.constant(node)
+        if new_node is not node:
+            self.folded += 1
+            return new_node
+
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_unary_expr(self, node):
+        new_node = self.constant(node)
+        if new_node is not node:
+            self.folded += 1
+            return new_node
+
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_assert_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_return_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_call(self, node):
+        for i, a in enumerate(node.args):
+            node.args[i] = self.visit(a)
+        return node
+
+    def visit_variable(self, node):
+        new_node = self.constant(node)
+        if new_node is not node:
+            self.replaced += 1
+        return new_node
+
+    @staticmethod
+    def visit_literal(node):
+        return node
+
+    def visit_unknown(self, m_name):
+        pass
@@ -0,0 +1,491 @@
+from tc.common import BaseVisitor
+from tc.globals import global_env
+from tc.optimization.common import TOP, CallLocator, NodeCounter, fresh_name
+from tc.parser import (
+    AssertStmt, Assignment, BinaryExpr, Block, Call, ForStmt, FunctionDef, IfStmt, Literal, PrintStmt, ReturnStmt,
+    UnaryExpr, Variable, VariableDeclaration, WhileStmt
+)
+
+global_functions = global_env().functions.keys()
+
+DEFAULT_BUDGET = 24
+
+
+class CallGraphBuilder(BaseVisitor):
+    """Builds graph of calls between user defined functions.
+
+    Relies on `def_node` links attached to Call nodes by GenKillBuilder (calls of builtin functions
+    have no definition node and are skipped).
+
+    Attributes:
+        graph (dict): map (FunctionDef node or TOP -> set of FunctionDef nodes called directly from it)
+    """
+
+    def __init__(self):
+        self.graph = {TOP: set()}
+        self.fun_defs = [TOP]
+
+    def reset(self):
+        self.graph = {TOP: set()}
+        self.fun_defs = [TOP]
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return self.graph
+
+    def visit_block(self, node):
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.graph.setdefault(node, set())
+        self.fun_defs.append(node)
+        self.visit(node.body)
+        self.fun_defs.pop()
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.visit(node.value)
+
+    def visit_if_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.increment)
+        self.visit(node.body)
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        def_node = getattr(node, 'def_node', None)
+        if def_node is not None:
+            self.graph[self.fun_defs[-1]].add(def_node)
+        for a in node.args:
+            self.visit(a)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+def recursive_functions(graph):
+    """Finds all functions that lie on a cycle of the call graph (Tarjan's SCC algorithm)."""
+    index, low_link = {}, {}
+    stack, on_stack = [], set()
+    recursive = set()
+
+    def strong_connect(v):
+        index[v] = low_link[v] = len(index)
+        stack.append(v)
+        on_stack.add(v)
+
+        for w in graph.get(v, ()):
+            if w not in index:
+                strong_connect(w)
+                low_link[v] = min(low_link[v], low_link[w])
+            elif w in on_stack:
+                low_link[v] = min(low_link[v], index[w])
+
+        if low_link[v] == index[v]:
+            component = []
+            while True:
+                w = stack.pop()
+                on_stack.remove(w)
+                component.append(w)
+                if w == v:
+                    break
+            if len(component) > 1 or v in graph.get(v, ()):
+                recursive.update(component)
+
+    for v in graph:
+        if v not in index:
+            strong_connect(v)
+
+    return recursive
+
+
+class BodyCopier(BaseVisitor):
+    """Copies (part of) function body to be placed at a call site, fixing scope depths of name references.
+
+    Parameters and variables declared within the body are renamed to fresh names (or, for parameters,
+    substituted with argument expressions), so they can't clash with names visible at the call site.
+    References to names from the function closure get their scope depth shifted, so that they point to
+    the same scope from the call site.
+
+    Attributes:
+        scopes (list): stack of maps (name -> new name or substituted expression factory), one per
+            function scope enclosing currently copied node, the first one for parameters
+        call_depth (int): scope depth of the function definition as seen from the call site
+        nesting (int): number of scopes between the call site and the copy
+        free_refs (list): (name, 'variable'/'function', depth) for all references to names from the
+            closure, depth relative to the call site
+        returns (bool): whether the copied code contains return statements
+    """
+
+    def __init__(self, scopes, call_depth, nesting):
+        self.scopes = scopes
+        self.call_depth = call_depth
+        self.nesting = nesting - len(scopes)  # scopes entered during copying are added on the fly
+        self.free_refs = []
+        self.returns = False
+
+    def run(self, node):
+        return self.visit(node)
+
+    def reference(self, name, depth, kind):
+        """Returns new name (or substituted expression factory) and new scope depth of a name reference."""
+        target = len(self.scopes) - 1 - depth
+        if target >= 0:
+            return self.scopes[target].get(name, name), depth
+
+        site_depth = depth - len(self.scopes) + self.call_depth
+        self.free_refs.append((name, kind, site_depth))
+        return name, site_depth + self.nesting + len(self.scopes)
+
+    def visit_block(self, node):
+        self.scopes.append({})
+        statements = [self.visit(stmt) for stmt in node.statements]
+        self.scopes.pop()
+        return Block(statements)
+
+    def visit_print_stmt(self, node):
+        return PrintStmt(self.visit(node.expr))
+
+    def visit_variable_declaration(self, node):
+        value = self.visit(node.value) if node.value else None
+        name = self.scopes[-1][node.name] = fresh_name(node.name)
+        return VariableDeclaration(name=name, type=node.type, value=value)
+
+    def visit_assignment(self, node):
+        value = self.visit(node.value)
+        name, depth = self.reference(node.name, node.scope_depth, 'variable')
+        copy = Assignment(name=name, value=value)
+        copy.scope_depth = depth
+        return copy
+
+    def visit_if_stmt(self, node):
+        return IfStmt(condition=self.visit(node.condition), body=self.visit(node.body))
+
+    def visit_while_stmt(self, node):
+        return WhileStmt(condition=self.visit(node.condition), body=self.visit(node.body))
+
+    def visit_for_stmt(self, node):
+        self.scopes.append({})
+        initializer = self.visit(node.initializer)
+        condition = self.visit(node.condition)
+        body = self.visit(node.body)
+        increment = self.visit(node.increment)
+        self.scopes.pop()
+        return ForStmt(initializer, condition, increment, body)
+
+    def visit_binary_expr(self, node):
+        return BinaryExpr(left=self.visit(node.left), op=node.op, right=self.visit(node.right))
+
+    def visit_unary_expr(self, node):
+        return UnaryExpr(node.op, self.visit(node.expr))
+
+    def visit_assert_stmt(self, node):
+        return AssertStmt(self.visit(node.expr))
+
+    def visit_return_stmt(self, node):
+        self.returns = True
+        return ReturnStmt(self.visit(node.expr))
+
+    def visit_call(self, node):
+        args = [self.visit(a) for a in node.args]
+        name, depth = self.reference(node.name, node.scope_depth, 'function')
+        copy = Call(name=name, args=args, scope_depth=depth)
+        copy.def_node = getattr(node, 'def_node', None)
+        return copy
+
+    def visit_variable(self, node):
+        name, depth = self.reference(node.name, node.scope_depth, 'variable')
+        if callable(name):
+            return name()  # substituted parameter
+        return Variable(name=name, scope_depth=depth)
+
+    @staticmethod
+    def visit_literal(node):
+        return Literal(value=node.value, type=node.type)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+def copy_expression(node, nesting=0):
+    """Copies expression evaluated at the call site, to be placed `nesting` scopes deeper."""
+    return BodyCopier([], 0, nesting).run(node)
+
+
+class FunctionInliner(BaseVisitor):
+    """Substitutes calls of small, non-recursive user defined functions with their bodies.
+
+    Two forms of inlining are supported:
+     * functions whose body is a single return statement, e.g. `def sq(x: int): int { return x * x }`,
+       are inlined at any call as the returned expression with parameters substituted by arguments
+       (arguments other than variables and literals must be used at most once and contain no calls,
+       so that no evaluation is duplicated or reordered, e.g. `sq(a + 1)` is left as is; if the expression
+       calls user defined functions, which might assign variables the arguments read, only literals are
+       substituted),
+     * functions without return statements called as statements are inlined as a block declaring
+       parameters (as fresh variables initialized with arguments) followed by the function body.
+
+    Function size is measured in AST nodes of its body (see `budget`), functions defining inner
+    functions are never inlined. Like Resolver, inliner keeps track of names visible at each point
+    of the program to make sure that no name used by the inlined body is shadowed at the call site.
+
+    Attributes:
+        budget (int): maximal number of AST nodes in body of an inlined function
+        recursive (set): FunctionDef nodes on cycles of the call graph
+        inlined (int): number of inlined calls
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.recursive = set()
+        self.scopes = [{'variable': set(), 'function': set(global_functions)}]
+        self.inlined = 0
+
+    def reset(self):
+        self.recursive = set()
+        self.scopes = [{'variable': set(), 'function': set(global_functions)}]
+        self.inlined = 0
+
+    def push_scope(self):
+        self.scopes.append({'variable': set(), 'function': set()})
+
+    def pop_scope(self):
+        self.scopes.pop()
+
+    def define(self, name, what):
+        self.scopes[-1][what].add(name)
+
+    def resolve(self, name, what):
+        for i in range(len(self.scopes)):
+            if name in self.scopes[-(i + 1)][what]:
+                return i
+        return None
+
+    def run(self, statements):
+        graph = CallGraphBuilder().run(statements)
+        self.recursive = recursive_functions(graph)
+        return self.visit_statements(statements)
+
+    def visit_statements(self, statements):
+        new_statements = []
+        for stmt in statements:
+            if isinstance(stmt, Call):
+                for i, a in enumerate(stmt.args):
+                    stmt.args[i] = self.visit(a)
+                new_statements.append(self.inline_statement(stmt) or self.inline_expression(stmt) or stmt)
+            else:
+                new_statements.append(self.visit(stmt))
+        return new_statements
+
+    def visit_block(self, node):
+        self.push_scope()
+        node.statements = self.visit_statements(node.statements)
+        self.pop_scope()
+        return node
+
+    def visit_function_def(self, node):
+        self.define(node.name, 'function')
+        if node.frozen:
+            return node
+
+        self.push_scope()
+        for p in node.parameters:
+            self.define(p.name, 'variable')
+        node.body = self.visit(node.body)
+        self.pop_scope()
+        return node
+
+    def visit_print_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            node.value = self.visit(node.value)
+        self.define(node.name, 'variable')
+        return node
+
+    def visit_assignment(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_if_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_while_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_for_stmt(self, node):
+        self.push_scope()
+        node.initializer = self.visit(node.initializer)
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        node.increment = self.visit(node.increment)
+        self.pop_scope()
+        return node
+
+    def visit_binary_expr(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_unary_expr(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_assert_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_return_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_call(self, node):
+        for i, a in enumerate(node.args):
+            node.args[i] = self.visit(a)
+        return self.inline_expression(node) or node
+
+    @staticmethod
+    def visit_variable(node):
+        return node
+
+    @staticmethod
+    def visit_literal(node):
+        return node
+
+    def visit_unknown(self, m_name):
+        pass
+
+    def inlinable(self, node):
+        def_node = getattr(node, 'def_node', None)
+        if def_node is None or def_node in self.recursive or def_node.frozen:
+            return None
+        if any(isinstance(s, FunctionDef) for s in def_node.body.statements):
+            return None
+        if NodeCounter().run([def_node.body]) > self.budget:
+            return None
+        return def_node
+
+    def visible(self, free_refs):
+        """Checks if names from the function closure are not shadowed at the call site."""
+        return all(self.resolve(name, kind) == depth for name, kind, depth in free_refs)
+
+    def inline_expression(self, node):
+        def_node = self.inlinable(node)
+        if def_node is None:
+            return None
+
+        statements = def_node.body.statements
+        if len(statements) != 1 or not isinstance(statements[0], ReturnStmt):
+            return None
+
+        # Arguments are evaluated before the body - substituted ones must not be affected by calls in the body
+        calls_user = any(
+            getattr(c, 'def_node', None) is not None or c.name not in global_functions
+            for c in CallLocator().run([statements[0].expr])
+        )
+        params = {}
+        for p, arg in zip(def_node.parameters, node.args):
+            if isinstance(arg, Literal):
+                params[p.name] = lambda arg=arg: copy_expression(arg)
+            elif calls_user:
+                return None
+            elif isinstance(arg, Variable):
+                params[p.name] = lambda arg=arg: copy_expression(arg)
+            elif ParameterUses(p.name).run(statements[0].expr) <= 1 and not CallLocator().run([arg]):
+                params[p.name] = lambda arg=arg: arg
+            else:
+                return None
+
+        # The returned expression is placed in the body block, within the parameters scope
+        copier = BodyCopier([params, {}], node.scope_depth, nesting=0)
+        expr = copier.run(statements[0].expr)
+        if not self.visible(copier.free_refs):
+            return None
+
+        self.inlined += 1
+        return expr
+
+    def inline_statement(self, node):
+        def_node = self.inlinable(node)
+        if def_node is None:
+            return None
+
+        params = {p.name: fresh_name(p.name) for p in def_node.parameters}
+        copier = BodyCopier([params], node.scope_depth, nesting=1)
+        body = copier.run(def_node.body)
+        if copier.returns or not self.visible(copier.free_refs):
+            return None
+
+        # Parameters are declared in a block wrapping the body, arguments are evaluated inside of it
+        declarations = [
+            VariableDeclaration(name=params[p.name], type=p.type, value=copy_expression(a, nesting=1))
+            for p, a in zip(def_node.parameters, node.args)
+        ]
+        self.inlined += 1
+        return Block(declarations + [body])
+
+
+class ParameterUses(BaseVisitor):
+    """Counts references to given parameter in an expression returned directly from function body."""
+
+    def __init__(self, name):
+        self.name = name
+        self.uses = 0
+
+    def run(self, node):
+        self.visit(node)
+        return self.uses
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        for a in node.args:
+            self.visit(a)
+
+    def visit_variable(self, node):
+        # Return statement is placed directly in the body block, parameters are one scope above
+        if node.name == self.name and node.scope_depth == 1:
+            self.uses += 1
+
+    def visit_unknown(self, m_name):
+        pass
@@ -0,0 +1,275 @@
+from tc.common import BaseVisitor
+from tc.globals import global_env
+from tc.optimization.common import CallLocator, VarUseLocator
+from tc.parser import (
+    Assignment, BinaryExpr, Block, Call, ForStmt, FunctionDef, IfStmt, UnaryExpr, VariableDeclaration, WhileStmt
+)
+
+global_functions = global_env().functions
+
+
+def has_side_effects(call):
+    """Checks if evaluation of a call might have side effects (calls of user defined functions might)."""
+    return any(getattr(c, 'def_node', None) is not None or c.name not in global_functions
+               for c in CallLocator().run([call]))
+
+
+def effective_calls(expr):
+    """Returns outermost calls with side effects in given expression, in order of evaluation."""
+    if isinstance(expr, Call):
+        return [expr] if has_side_effects(expr) else []
+    if isinstance(expr, BinaryExpr):
+        return effective_calls(expr.left) + effective_calls(expr.right)
+    if isinstance(expr, UnaryExpr):
+        return effective_calls(expr.expr)
+    return []
+
+
+class LivenessAnalysis(BaseVisitor):
+    """Backward analysis of live local variables of a function.
+
+    Local variable (parameter or variable declared in the function body) is live at some point if its
+    current value might be read afterwards. Variables are identified by the environment they live in
+    (scope of the declaration) and name, so shadowing variables are told apart. Variables of enclosing
+    environments are not tracked. Loops are iterated to a fixed point.
+
+    Visit methods take the set of variables live after the node and return the set live before it.
+
+    Attributes:
+        scopes (list): stack of scope identifiers (one per environment, starting with parameters)
+        live_out (dict): map (id of assignment/declaration -> set of variables live right after it)
+        keys (dict): map (id of assignment/declaration -> variable it defines, None if not local)
+        used_later (dict): map (id of declaration -> whether the variable is referenced after it)
+        captured (set): names of variables referenced in nested functions - never considered dead
+    """
+
+    def __init__(self):
+        self.scopes = []
+        self.live_out = {}
+        self.keys = {}
+        self.used_later = {}
+        self.mentioned = set()
+        self.captured = set()
+
+    def reset(self):
+        self.scopes = []
+        self.live_out = {}
+        self.keys = {}
+        self.used_later = {}
+        self.mentioned = set()
+        self.captured = set()
+
+    def run(self, fun_def):
+        self.captured = VarUseLocator().run(NestedFunctionLocator().run(fun_def.body))
+        self.scopes = [id(fun_def)]
+        self.visit(fun_def.body, frozenset())
+        return self.live_out
+
+    def key(self, name, depth):
+        index = len(self.scopes) - 1 - depth
+        if index < 0:
+            return None  # variable from the closure
+        return self.scopes[index], name
+
+    def visit_block(self, node, live):
+        outer_mentioned, self.mentioned = self.mentioned, set()
+        self.scopes.append(id(node))
+        for stmt in reversed(node.statements):
+            live = self.visit(stmt, live)
+        self.scopes.pop()
+        self.mentioned = outer_mentioned | self.mentioned
+        return live
+
+    @staticmethod
+    def visit_function_def(node, live):
+        # Analyzed separately, variables it references are captured
+        return live
+
+    def visit_print_stmt(self, node, live):
+        return self.visit(node.expr, live)
+
+    def visit_variable_declaration(self, node, live):
+        key = (self.scopes[-1], node.name)
+        self.keys[id(node)] = key
+        self.live_out[id(node)] = live
+        self.used_later[id(node)] = key in self.mentioned
+
+        live = live - {key}
+        if node.value:
+            live = self.visit(node.value, live)
+        return live
+
+    def visit_assignment(self, node, live):
+        key = self.key(node.name, node.scope_depth)
+        self.keys[id(node)] = key
+        self.live_out[id(node)] = live
+        self.mentioned.add(key)
+        return self.visit(node.value, live - {key})
+
+    def visit_if_stmt(self, node, live):
+        # Body might not be executed at all
+        return self.visit(node.condition, live | self.visit(node.body, live))
+
+    def visit_while_stmt(self, node, live):
+        header = self.visit(node.condition, live)
+        while True:
+            new_header = self.visit(node.condition, live | self.visit(node.body, header))
+            if new_header == header:
+                return header
+            header = new_header
+
+    def visit_for_stmt(self, node, live):
+        self.scopes.append(id(node))
+        header = self.visit(node.condition, live)
+        while True:
+            body_in = self.visit(node.body, self.visit(node.increment, header))
+            new_header = self.visit(node.condition, live | body_in)
+            if new_header == header:
+                break
+            header = new_header
+        live = self.visit(node.initializer, header)
+        self.scopes.pop()
+        return live
+
+    def visit_binary_expr(self, node, live):
+        return self.visit(node.left, self.visit(node.right, live))
+
+    def visit_unary_expr(self, node, live):
+        return self.visit(node.expr, live)
+
+    def visit_assert_stmt(self, node, live):
+        return self.visit(node.expr, live)
+
+    def visit_return_stmt(self, node, live):
+        # Locals are gone after return
+        return self.visit(node.expr, frozenset())
+
+    def visit_call(self, node, live):
+        for a in reversed(node.args):
+            live = self.visit(a, live)
+        return live
+
+    def visit_variable(self, node, live):
+        key = self.key(node.name, node.scope_depth)
+        if key is None:
+            return live
+        self.mentioned.add(key)
+        return live | {key}
+
+    @staticmethod
+    def visit_literal(node, live):
+        return live
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class NestedFunctionLocator(BaseVisitor):
+    """Finds function definitions nested in given statement (not entering found ones)."""
+
+    def __init__(self):
+        self.fun_defs = []
+
+    def reset(self):
+        self.fun_defs = []
+
+    def run(self, node):
+        self.visit(node)
+        return self.fun_defs
+
+    def visit_block(self, node):
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.fun_defs.append(node)
+
+    def visit_if_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class DeadStoreOptimizer(BaseVisitor):
+    """Removes stores to local variables of functions whose values are never read (see LivenessAnalysis).
+
+    Dead assignments and values of dead declarations are removed, declarations of variables not
+    referenced at all afterwards are removed entirely. Calls with side effects in removed right-hand
+    sides are kept as separate statements. Top-level code is left to RedundancyOptimizer.
+
+    Attributes:
+        liveness (LivenessAnalysis): results for the function being optimized
+        removed (int): number of removed stores
+    """
+
+    def __init__(self):
+        self.liveness = None
+        self.removed = 0
+
+    def reset(self):
+        self.liveness = None
+        self.removed = 0
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return statements
+
+    def visit_block(self, node):
+        if self.liveness is not None:
+            node.statements = self.visit_statements(node.statements)
+        else:
+            for stmt in node.statements:
+                self.visit(stmt)
+
+    def visit_function_def(self, node):
+        if node.frozen:
+            return
+
+        outer = self.liveness
+        self.liveness = LivenessAnalysis()
+        self.liveness.run(node)
+        try:
+            self.visit(node.body)
+        finally:
+            self.liveness = outer
+
+    def visit_if_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.visit(node.body)
+
+    def visit_unknown(self, m_name):
+        pass
+
+    def visit_statements(self, statements):
+        new_statements = []
+        for stmt in statements:
+            if isinstance(stmt, (Assignment, VariableDeclaration)) and self.is_dead(stmt):
+                self.removed += 1
+                new_statements.extend(effective_calls(stmt.value) if stmt.value else [])
+                if isinstance(stmt, VariableDeclaration) and self.liveness.used_later[id(stmt)]:
+                    new_statements.append(VariableDeclaration(name=stmt.name, type=stmt.type, value=None))
+            else:
+                if isinstance(stmt, (Block, FunctionDef, IfStmt, WhileStmt, ForStmt)):
+                    self.visit(stmt)
+                new_statements.append(stmt)
+        return new_statements
+
+    def is_dead(self, stmt):
+        key = self.liveness.keys.get(id(stmt))
+        if key is None or stmt.name in self.liveness.captured or key in self.liveness.live_out[id(stmt)]:
+            return False
+        # Declaration without a value is dead only if not referenced at all
+        return stmt.value is not None or not self.liveness.used_later[id(stmt)]
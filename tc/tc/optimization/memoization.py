@@ -0,0 +1,173 @@
+from collections import defaultdict
+from tc.common import BaseVisitor, Type
+from tc.globals import global_env
+from tc.optimization.common import VarDefLocator
+from tc.optimization.redundancy import FindEffectiveStatements
+from tc.parser import Assignment, FunctionDef
+
+global_functions = global_env().functions
+
+DEFAULT_MEMO_SIZE = 4096
+
+hashable_types = {Type.BOOL, Type.INT, Type.FLOAT, Type.STRING}
+
+
+class PurityAnalysis(BaseVisitor):
+    """Finds user defined functions which are pure, i.e. their result depends only on argument values.
+
+    A function is impure if it is effective (see FindEffectiveStatements), assigns to a variable from its
+    closure, reads a closure variable that is assigned anywhere in the program (so it might change
+    between calls) or calls an impure function (builtin or user defined). Calls are followed to a fixed
+    point, so (mutually) recursive functions can be pure as well.
+
+    Relies on `def_node` links attached to Call nodes by GenKillBuilder.
+
+    Attributes:
+        frames (list): stack of [FunctionDef node, scope depth of its parameters] for enclosing functions
+        depth (int): current scope depth
+        impure (set): FunctionDef nodes known to be impure
+        calls (dict): map (FunctionDef node -> set of FunctionDef nodes it calls)
+        assigned (set): names of all variables assigned somewhere in the program
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.depth = 0
+        self.fun_defs = []
+        self.impure = set()
+        self.calls = defaultdict(set)
+        self.assigned = set()
+
+    def reset(self):
+        self.frames = []
+        self.depth = 0
+        self.fun_defs = []
+        self.impure = set()
+        self.calls = defaultdict(set)
+        self.assigned = set()
+
+    def run(self, statements):
+        _, call_fun_info = FindEffectiveStatements().run(statements)
+        for info in call_fun_info.values():
+            if info['is_effective']:
+                self.impure.update(n for n in info['follow_nodes'] if isinstance(n, FunctionDef))
+
+        self.assigned = {d.name for d in VarDefLocator().run(statements) if isinstance(d, Assignment)}
+
+        for stmt in statements:
+            self.visit(stmt)
+
+        # Propagate impurity from callees to callers
+        changed = True
+        while changed:
+            changed = False
+            for fun_def, callees in self.calls.items():
+                if fun_def not in self.impure and callees & self.impure:
+                    self.impure.add(fun_def)
+                    changed = True
+
+        return {f for f in self.fun_defs if f not in self.impure}
+
+    def outside(self, depth):
+        """Yields enclosing functions for which a name reference of given scope depth is non-local."""
+        for fun_def, params_depth in self.frames:
+            if depth > self.depth - params_depth:
+                yield fun_def
+
+    def visit_block(self, node):
+        self.depth += 1
+        for stmt in node.statements:
+            self.visit(stmt)
+        self.depth -= 1
+
+    def visit_function_def(self, node):
+        self.fun_defs.append(node)
+        self.depth += 1
+        self.frames.append((node, self.depth))
+        self.visit(node.body)
+        self.frames.pop()
+        self.depth -= 1
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.visit(node.value)
+        self.impure.update(self.outside(node.scope_depth))
+
+    def visit_if_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.depth += 1
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.body)
+        self.visit(node.increment)
+        self.depth -= 1
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        for a in node.args:
+            self.visit(a)
+
+        if not self.frames:
+            return
+
+        fun_def = self.frames[-1][0]
+        def_node = getattr(node, 'def_node', None)
+        if def_node is not None:
+            self.calls[fun_def].add(def_node)
+        elif node.name not in global_functions or not global_functions[node.name].pure:
+            self.impure.add(fun_def)
+
+    def visit_variable(self, node):
+        if node.name in self.assigned:
+            self.impure.update(self.outside(node.scope_depth))
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class Memoizer:
+    """Marks pure functions for memoization of their results (see MemoizedFunction).
+
+    Only functions returning a value and taking arguments of hashable types are memoized.
+
+    Attributes:
+        exclude (set): names of functions that shall never be memoized
+        max_size (int): maximal number of results cached per function
+    """
+
+    def __init__(self, exclude=(), max_size=DEFAULT_MEMO_SIZE):
+        self.exclude = set(exclude)
+        self.max_size = max_size
+
+    def run(self, statements):
+        for fun_def in PurityAnalysis().run(statements):
+            if fun_def.name in self.exclude or fun_def.return_type == Type.UNIT:
+                continue
+            if all(p.type in hashable_types for p in fun_def.parameters):
+                fun_def.memo_size = self.max_size
+        return statements
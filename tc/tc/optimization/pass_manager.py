@@ -0,0 +1,197 @@
+from time import perf_counter
+from tc.optimization.algebraic import AlgebraicOptimizer
+from tc.optimization.common import GenKillBuilder, InOutBuilder, NodeCollector
+from tc.optimization.common_subexpressions import ExpressionDAGOptimizer
+from tc.optimization.constant_propagation import SparseConstantPropagation
+from tc.optimization.inlining import FunctionInliner
+from tc.optimization.liveness import DeadStoreOptimizer
+from tc.optimization.memoization import Memoizer
+from tc.optimization.redundancy import RedundancyOptimizer
+from tc.optimization.strength_reduction import StrengthReductionOptimizer
+from tc.optimization.value_numbering import GlobalValueNumberingOptimizer
+
+MAX_ITERATIONS = 4
+
+
+class Analysis:
+    """Analysis of the AST whose results are shared by optimization passes.
+
+    Attributes:
+        name (str): name passes refer to the analysis by
+        compute (callable): function of AST returning results of the analysis
+        implies (tuple): names of analyses made valid by computing this one
+    """
+
+    def __init__(self, name, compute, implies=()):
+        self.name = name
+        self.compute = compute
+        self.implies = implies
+
+
+class OptimizationPass:
+    """Optimization pass run by PassManager.
+
+    Attributes:
+        name (str): name of the pass
+        factory (callable): function of (analysis results, options) creating the optimizer, i.e. an object
+            with method run(statements) returning optimized statements
+        requires (tuple): names of analyses the pass depends on (computed before running it if not valid)
+        preserves (tuple): names of analyses remaining valid even if the pass changes the AST
+    """
+
+    def __init__(self, name, factory, requires=(), preserves=()):
+        self.name = name
+        self.factory = factory
+        self.requires = requires
+        self.preserves = preserves
+
+
+class PassStats:
+    """Statistics of a pass (or an analysis) collected by PassManager."""
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.time = 0.0
+        self.nodes_changed = 0
+
+    def __repr__(self):
+        return f'PassStats({self.name}, runs={self.runs}, time={self.time:.6f}, nodes_changed={self.nodes_changed})'
+
+
+analyses = {
+    a.name: a for a in [
+        # Links from Call nodes to definitions of called functions (def_node)
+        Analysis('call_links', lambda ast: GenKillBuilder().run(ast)),
+        # Reaching definitions (IN sets), computing them links calls as well
+        Analysis('in_sets', lambda ast: InOutBuilder().run(ast)[0], implies=('call_links',)),
+    ]
+}
+
+passes = {
+    p.name: p for p in [
+        OptimizationPass('inline', lambda a, o: FunctionInliner(), requires=('call_links',)),
+        OptimizationPass('redundancy', lambda a, o: RedundancyOptimizer(a['in_sets'], o.get('keep_functions', False)),
+                         requires=('in_sets',), preserves=('call_links',)),
+        OptimizationPass('dead_stores', lambda a, o: DeadStoreOptimizer(), requires=('call_links',),
+                         preserves=('call_links',)),
+        OptimizationPass('algebraic', lambda a, o: AlgebraicOptimizer(), preserves=('call_links',)),
+        OptimizationPass('constant_propagation', lambda a, o: SparseConstantPropagation(), preserves=('call_links',)),
+        OptimizationPass('strength_reduction', lambda a, o: StrengthReductionOptimizer(a['in_sets']),
+                         requires=('in_sets',), preserves=('call_links',)),
+        OptimizationPass('common_subexpressions', lambda a, o: ExpressionDAGOptimizer(a['in_sets']),
+                         requires=('in_sets',), preserves=('call_links',)),
+        OptimizationPass('value_numbering', lambda a, o: GlobalValueNumberingOptimizer(a['in_sets']),
+                         requires=('in_sets',), preserves=('call_links',)),
+        OptimizationPass('memoization', lambda a, o: Memoizer(exclude=o.get('memo_exclude', ())),
+                         requires=('call_links',), preserves=('call_links', 'in_sets')),
+    ]
+}
+
+# Pipelines of optimization levels, tuples are groups of passes iterated until they stop changing the AST.
+# Common subexpressions and value numbering introduce temporaries other passes are not aware of - they have to
+# run after them. Value numbering (across blocks and loops) subsumes the local common subexpressions of level 1.
+levels = {
+    0: [],
+    1: ['redundancy', 'dead_stores', 'algebraic', 'common_subexpressions'],
+    2: ['inline', 'constant_propagation', 'redundancy', 'dead_stores', 'algebraic', 'strength_reduction',
+        'value_numbering'],
+    3: ['inline', ('constant_propagation', 'redundancy', 'dead_stores', 'algebraic'), 'strength_reduction',
+        'value_numbering', 'memoization'],
+}
+
+MAX_LEVEL = max(levels)
+
+
+def format_stats(stats):
+    """Formats statistics (map name -> PassStats) as a table."""
+    lines = [f'{"pass":<20}{"runs":>6}{"time [ms]":>12}{"nodes changed":>16}']
+    for s in stats.values():
+        lines.append(f'{s.name:<20}{s.runs:>6}{s.time * 1000:>12.3f}{s.nodes_changed:>16}')
+    return '\n'.join(lines)
+
+
+class PassManager:
+    """Runs optimization passes of given level, maintaining analyses they depend on.
+
+    Analysis results are computed lazily, when a pass requires them, and reused until a pass changes
+    the AST (then all analyses it does not preserve are invalidated). Number of changed nodes is
+    the number of nodes added to or removed from the AST by a pass.
+
+    Attributes:
+        level (int): optimization level (0 - no optimizations, see `levels`)
+        disabled (set): names of passes to skip
+        options (dict): options passed to pass factories (e.g. memo_exclude, keep_functions)
+        results (dict): map (name -> results) of valid analyses
+        stats (dict): map (pass or analysis name -> PassStats), in order of first run
+    """
+
+    def __init__(self, level=MAX_LEVEL, disabled=(), **options):
+        if level not in levels:
+            raise ValueError(f'Unknown optimization level: {level}')
+
+        self.level = level
+        self.disabled = set(disabled)
+        self.options = options
+        self.results = {}
+        self.stats = {}
+
+    def reset(self):
+        self.results = {}
+        self.stats = {}
+
+    def run(self, ast):
+        for item in levels[self.level]:
+            if isinstance(item, tuple):
+                for _ in range(MAX_ITERATIONS):
+                    changed = 0
+                    for name in item:
+                        ast, n_changed = self.run_pass(name, ast)
+                        changed += n_changed
+                    if not changed:
+                        break
+            else:
+                ast, _ = self.run_pass(item, ast)
+        return ast
+
+    def get_stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = PassStats(name)
+        return self.stats[name]
+
+    def analysis(self, name, ast):
+        if name not in self.results:
+            analysis = analyses[name]
+            stats = self.get_stats(name)
+
+            start = perf_counter()
+            self.results[name] = analysis.compute(ast)
+            stats.time += perf_counter() - start
+            stats.runs += 1
+
+            for implied in analysis.implies:
+                self.results[implied] = None
+        return self.results[name]
+
+    def run_pass(self, name, ast):
+        """Runs pass of given name (unless disabled), returns optimized AST and number of changed nodes."""
+        if name in self.disabled:
+            return ast, 0
+
+        opt_pass = passes[name]
+        results = {a: self.analysis(a, ast) for a in opt_pass.requires}
+        stats = self.get_stats(name)
+        before = NodeCollector().run(ast)
+
+        start = perf_counter()
+        ast = opt_pass.factory(results, self.options).run(ast)
+        stats.time += perf_counter() - start
+        stats.runs += 1
+
+        after = NodeCollector().run(ast)
+        changed = len(before.keys() ^ after.keys())
+        stats.nodes_changed += changed
+
+        if changed:
+            self.results = {a: r for a, r in self.results.items() if a in opt_pass.preserves}
+        return ast, changed
@@ -1,6 +1,6 @@
 from contextlib import contextmanager
 from tc.common import BaseVisitor
-from tc.parser import VariableDeclaration
+from tc.parser import FunctionDef, VariableDeclaration
 from tc.globals import global_env
 
 global_functions = global_env().functions.keys()
@@ -46,10 +46,13 @@ class FindEffectiveStatements(BaseVisitor):
         for i in range(len(self.scopes)):
             if name in self.scopes[-(i + 1)]:
                 return i
-        raise Exception(f'Failed to resolve function {name}')
+        return None
 
     def get_fun_info(self, name):
         depth = self.resolve_fun(name)
+        if depth is None:
+            # Defined by a previous program - might have side effects and read any variable
+            return {'follow_nodes': set(), 'is_effective': True, 'unknown': True}
         return self.scopes[-(depth + 1)][name]
 
     def run(self, statements):
@@ -168,6 +171,12 @@ class FollowUseDef(BaseVisitor):
 
         return self.effective_nodes
 
+    def follow_function(self, node):
+        """Marks the function and all definitions its body depends on as effective (e.g. for external calls)."""
+        self.effective_nodes.add(node)
+        with self.following():
+            self.visit(node.body)
+
     def visit_block(self, node):
         for stmt in node.statements:
             self.visit(stmt)
@@ -247,8 +256,12 @@ class FollowUseDef(BaseVisitor):
             info = self.call_fun_info[node]
 
             with self.following():
-                for node in info['follow_nodes']:
-                    self.visit(node)
+                for n in info['follow_nodes']:
+                    self.visit(n)
+                if info.get('unknown'):
+                    # Body is not known - all definitions reaching the call are necessary
+                    for n in self.in_sets[node]:
+                        self.visit(n)
 
     def visit_variable(self, node):
         if self.follows:
@@ -461,19 +474,31 @@ class FollowConditions(BaseVisitor):
 
 
 class RedundancyOptimizer(BaseVisitor):
-    """Removes all subtrees of input AST that do not contain effective nodes."""
+    """Removes all subtrees of input AST that do not contain effective nodes.
 
-    def __init__(self, in_sets):
+    With `keep_functions` set, top-level functions are kept whole (they might be called from Python after
+    the program runs, see Interpreter.load) along with definitions their bodies depend on.
+    """
+
+    def __init__(self, in_sets, keep_functions=False):
         self.in_sets = in_sets
+        self.keep_functions = keep_functions
         self.effective_nodes = None
+        self.kept = set()  # top-level functions kept whole
 
     def reset(self):
         self.effective_nodes = None
+        self.kept = set()
 
     def run(self, statements):
         # Find all effective nodes of the AST
         effective_top_level, call_fun_info = FindEffectiveStatements().run(statements)
-        self.effective_nodes = FollowUseDef(self.in_sets, effective_top_level, call_fun_info).run(statements)
+        follower = FollowUseDef(self.in_sets, effective_top_level, call_fun_info)
+        if self.keep_functions:
+            self.kept = {stmt for stmt in statements if isinstance(stmt, FunctionDef)}
+            for fun_def in self.kept:
+                follower.follow_function(fun_def)
+        self.effective_nodes = follower.run(statements)
         ExtendEffective(self.effective_nodes).run(statements)
         FollowConditions(self.in_sets, self.effective_nodes, call_fun_info).run(statements)
 
@@ -493,7 +518,8 @@ class RedundancyOptimizer(BaseVisitor):
         node.statements = self.visit_statements(node.statements)
 
     def visit_function_def(self, node):
-        self.visit(node.body)
+        if not node.frozen and node not in self.kept:
+            self.visit(node.body)
 
     def visit_if_stmt(self, node):
         self.visit(node.body)
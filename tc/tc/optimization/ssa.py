@@ -0,0 +1,376 @@
+from contextlib import contextmanager
+from itertools import count
+from tc.common import BaseVisitor
+from tc.optimization.common import VarDefLocator
+from tc.optimization.liveness import NestedFunctionLocator
+from tc.parser import Assignment
+
+
+class Phi:
+    """Definition of a variable version at a join, choosing one of versions flowing into it.
+
+    Attributes:
+        name (str): name of the variable
+        version (int): version defined by the phi
+        args (list): versions flowing in - for `if` statements [before, end of the body], for loops
+            [entry, end of the body (back edge)]
+    """
+
+    def __init__(self, name, version, args):
+        self.name = name
+        self.version = version
+        self.args = args
+
+    def __repr__(self):
+        return f'Phi({self.name}.{self.version} = phi({", ".join(f"{self.name}.{a}" for a in self.args)}))'
+
+
+class SSAForm:
+    """Static single assignment form of a program, kept as annotations of its AST.
+
+    Every definition of a tracked variable (VariableDeclaration, Assignment, Parameter or Phi) defines
+    a new version (its `version` attribute), every read (Variable node) refers to exactly one version.
+    Phis of `IfStmt` (`phis` attribute) are placed at the join after the statement, the ones of loops
+    at their headers (before the condition is evaluated). Def-use chains make sparse analyses possible:
+    information is propagated along them only, instead of through every node of the AST.
+
+    Attributes:
+        definitions (dict): map (version -> defining node)
+        uses (dict): map (version -> list of Variable nodes and Phis reading it)
+        dependents (dict): map (version -> versions whose definitions read it)
+    """
+
+    def __init__(self):
+        self.definitions = {}
+        self.uses = {}
+        self.dependents = {}
+
+    def define(self, version, node):
+        self.definitions[version] = node
+        self.uses[version] = []
+        self.dependents[version] = []
+
+    def use(self, version, node):
+        self.uses[version].append(node)
+
+    def replace_version(self, old, new):
+        """Redirects all uses of version `old` to version `new` (e.g. for trivial phis)."""
+        for node in self.uses.pop(old):
+            if isinstance(node, Phi):
+                node.args = [new if a == old else a for a in node.args]
+            else:
+                node.version = new
+            self.uses[new].append(node)
+        self.dependents[new].extend(self.dependents.pop(old))
+        del self.definitions[old]
+
+    def remove_trivial_phi(self, phi, replacement):
+        for a in phi.args:
+            self.uses[a].remove(phi)
+            self.dependents[a].remove(phi.version)
+        self.replace_version(phi.version, replacement)
+
+
+class SSABuilder(BaseVisitor):
+    """Builds SSA form of a program - renames variables to versions and places phis at joins.
+
+    Top-level code and each function body are separate regions. Tracked are variables defined in
+    the region, except the ones of names assigned in functions nested in it (their values might be
+    changed by any call). Others (e.g. globals read in a function body) get no version.
+
+    Phis at loop headers are placed for visible variables of names assigned in the loop, phis after
+    `if` statements for variables whose version changed in the body. Phis found trivial (choosing
+    the version they define or a single other version) are removed.
+
+    Attributes:
+        ssa (SSAForm): the result
+        versions (count): generator of versions
+        scopes (list): stack of maps (variable name -> current version), one per environment (the bottom
+            one stands for the closure in function bodies)
+        region_start (int): index of the first scope of the current region
+        clobbered (set): names of variables assigned in functions nested in the current region
+        reads (list): versions read by the definition being visited (None outside of definitions)
+    """
+
+    def __init__(self):
+        self.ssa = SSAForm()
+        self.versions = count()
+        self.scopes = [{}]
+        self.region_start = 0
+        self.clobbered = set()
+        self.reads = None
+
+    def reset(self):
+        self.ssa = SSAForm()
+        self.scopes = [{}]
+        self.region_start = 0
+        self.clobbered = set()
+        self.reads = None
+
+    def run(self, statements):
+        self.clobbered = self.assigned_in_functions(statements)
+        for stmt in statements:
+            self.visit(stmt)
+        return self.ssa
+
+    @staticmethod
+    def assigned_in_functions(statements):
+        fun_defs = [f for stmt in statements for f in NestedFunctionLocator().run(stmt)]
+        return {d.name for d in VarDefLocator().run(fun_defs) if isinstance(d, Assignment)}
+
+    def new_version(self, node):
+        version = next(self.versions)
+        self.ssa.define(version, node)
+        for read in self.reads or ():
+            self.ssa.dependents[read].append(version)
+        return version
+
+    @contextmanager
+    def defining(self):
+        outer, self.reads = self.reads, []
+        try:
+            yield
+        finally:
+            self.reads = outer
+
+    @contextmanager
+    def in_scope(self):
+        try:
+            self.scopes.append({})
+            yield
+        finally:
+            self.scopes.pop()
+
+    def scope_of(self, depth):
+        index = len(self.scopes) - 1 - depth
+        return self.scopes[index] if index >= self.region_start else None
+
+    def declare(self, node):
+        if node.name in self.clobbered:
+            return
+        node.version = self.new_version(node)
+        self.scopes[-1][node.name] = node.version
+
+    def visit_block(self, node):
+        with self.in_scope():
+            for stmt in node.statements:
+                self.visit(stmt)
+
+    def visit_function_def(self, node):
+        if node.frozen:
+            return
+
+        outer = self.scopes, self.region_start, self.clobbered, self.reads
+        self.scopes, self.region_start, self.reads = [{}, {}], 1, None  # closure, parameters
+        self.clobbered = self.assigned_in_functions(node.body.statements)
+        try:
+            for p in node.parameters:
+                self.declare(p)
+            self.visit(node.body)
+        finally:
+            self.scopes, self.region_start, self.clobbered, self.reads = outer
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        with self.defining():
+            if node.value:
+                self.visit(node.value)
+            self.declare(node)
+
+    def visit_assignment(self, node):
+        with self.defining():
+            self.visit(node.value)
+            scope = self.scope_of(node.scope_depth)
+            if scope is not None and node.name in scope:
+                node.version = scope[node.name] = self.new_version(node)
+
+    def visit_if_stmt(self, node):
+        self.visit(node.condition)
+
+        before = [dict(scope) for scope in self.scopes]
+        self.visit(node.body)
+
+        # Join - variables assigned in the body might hold either version
+        node.phis = []
+        for scope, old in zip(self.scopes, before):
+            for name, version in scope.items():
+                if old[name] != version:
+                    node.phis.append(self.phi(name, [old[name], version]))
+                    scope[name] = node.phis[-1].version
+
+    def visit_while_stmt(self, node):
+        header = self.loop_header(node, [node.condition, node.body])
+        self.visit(node.condition)
+        self.visit(node.body)
+        self.loop_exit(node, header)
+
+    def visit_for_stmt(self, node):
+        with self.in_scope():
+            self.visit(node.initializer)
+            header = self.loop_header(node, [node.condition, node.body, node.increment])
+            self.visit(node.condition)
+            self.visit(node.body)
+            self.visit(node.increment)
+            self.loop_exit(node, header)
+
+    def phi(self, name, args):
+        phi = Phi(name, None, args)
+        with self.defining():
+            self.reads = list(args)
+            phi.version = self.new_version(phi)
+        for a in args:
+            self.ssa.use(a, phi)
+        return phi
+
+    def loop_header(self, node, statements):
+        assigned = {d.name for d in VarDefLocator().run(statements) if isinstance(d, Assignment)}
+        node.phis = []
+        for scope in self.scopes[self.region_start:]:
+            for name in assigned & scope.keys():
+                # Back edge argument is known at the end of the body
+                phi = Phi(name, None, [scope[name], None])
+                phi.version = self.new_version(phi)
+                self.ssa.use(scope[name], phi)
+                self.ssa.dependents[scope[name]].append(phi.version)
+                scope[name] = phi.version
+                node.phis.append(phi)
+        return [dict(scope) for scope in self.scopes]
+
+    def loop_exit(self, node, header):
+        phis = {phi.version: phi for phi in node.phis}
+        for scope, versions in zip(self.scopes, header):
+            for name, version in versions.items():
+                if version in phis:
+                    phi = phis[version]
+                    phi.args[1] = scope[name]
+                    self.ssa.use(scope[name], phi)
+                    self.ssa.dependents[scope[name]].append(phi.version)
+
+        # Loop is left right after evaluating the condition, i.e. with versions from its header
+        for scope, versions in zip(self.scopes, header):
+            scope.clear()
+            scope.update(versions)
+
+        # Variable not assigned after all (e.g. only its shadowing namesake was) - phi is trivial
+        for phi in list(node.phis):
+            entry, back = phi.args
+            if back == phi.version or back == entry:
+                node.phis.remove(phi)
+                self.ssa.remove_trivial_phi(phi, entry)
+                for scope in self.scopes:
+                    for name, version in scope.items():
+                        if version == phi.version:
+                            scope[name] = entry
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        for a in node.args:
+            self.visit(a)
+
+    def visit_variable(self, node):
+        scope = self.scope_of(node.scope_depth)
+        version = scope.get(node.name) if scope is not None else None
+        if version is not None:
+            node.version = version
+            self.ssa.use(version, node)
+            if self.reads is not None:
+                self.reads.append(version)
+
+    def visit_unknown(self, m_name):
+        pass
+
+
+class SSADestructor(BaseVisitor):
+    """Translates program out of SSA form.
+
+    Versions of a variable are coalesced back into the variable, which is correct as long as the SSA
+    form is conventional - i.e. live ranges of versions of the same variable do not overlap. Renaming
+    itself keeps the form conventional, so do optimizations only replacing reads with constants or
+    removing definitions which are not read (see SparseConstantPropagation). Phis are then just dropped.
+    """
+
+    annotated = ('version', 'phis')
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return statements
+
+    def strip(self, node):
+        for attribute in self.annotated:
+            node.__dict__.pop(attribute, None)
+
+    def visit_block(self, node):
+        for stmt in node.statements:
+            self.visit(stmt)
+
+    def visit_function_def(self, node):
+        for p in node.parameters:
+            self.strip(p)
+        self.visit(node.body)
+
+    def visit_print_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_variable_declaration(self, node):
+        self.strip(node)
+        if node.value:
+            self.visit(node.value)
+
+    def visit_assignment(self, node):
+        self.strip(node)
+        self.visit(node.value)
+
+    def visit_if_stmt(self, node):
+        self.strip(node)
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_while_stmt(self, node):
+        self.strip(node)
+        self.visit(node.condition)
+        self.visit(node.body)
+
+    def visit_for_stmt(self, node):
+        self.strip(node)
+        self.visit(node.initializer)
+        self.visit(node.condition)
+        self.visit(node.body)
+        self.visit(node.increment)
+
+    def visit_binary_expr(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_unary_expr(self, node):
+        self.visit(node.expr)
+
+    def visit_assert_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_return_stmt(self, node):
+        self.visit(node.expr)
+
+    def visit_call(self, node):
+        for a in node.args:
+            self.visit(a)
+
+    def visit_variable(self, node):
+        self.strip(node)
+
+    def visit_unknown(self, m_name):
+        pass
@@ -0,0 +1,360 @@
+from tc.common import BaseVisitor, Type
+from tc.optimization.common import CallLocator, VarDefLocator, fresh_name
+from tc.parser import Assignment, BinaryExpr, ForStmt, Literal, UnaryExpr, Variable, VariableDeclaration
+
+
+def is_int_literal(node):
+    return isinstance(node, Literal) and node.type == Type.INT
+
+
+class InductionVariable:
+    """Basic induction variable of a for loop, i.e. `i` in: for (var i: int = 0; ...; i = i + 2)."""
+
+    def __init__(self, name, init_value, step, defs):
+        self.name = name
+        self.init_value = init_value
+        self.step = step
+        self.defs = defs  # the initializer and the increment - the only definitions allowed to reach uses
+
+
+class DerivedExpressionReducer(BaseVisitor):
+    """Replaces expressions affine in a basic induction variable with incrementally updated temporaries.
+
+    E.g. in loop `for (var i: int = 0; i < n; i = i + 1) { print 4 * i + 1 }` expression `4 * i + 1`
+    is replaced by variable `t` declared as `var t: int = 1` before the loop and updated with `t = t + 4`
+    at the end of the loop body, so each iteration costs one addition instead of a multiplication and an
+    addition.
+
+    Attributes:
+        temps (dict): map ((coefficient, constant) -> temporary variable name)
+        depth (int): number of environments between currently visited node and the one enclosing
+            the loop (i.e. the one where temporaries are declared)
+    """
+
+    def __init__(self, iv, in_sets):
+        self.iv = iv
+        self.in_sets = in_sets
+        self.temps = {}
+        self.depth = 0
+
+    def run(self, node):
+        # For loop scope
+        self.depth = 1
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return self.temps
+
+    def visit_block(self, node):
+        self.depth += 1
+        for i, stmt in enumerate(node.statements):
+            node.statements[i] = self.visit(stmt)
+        self.depth -= 1
+        return node
+
+    @staticmethod
+    def visit_function_def(node):
+        # Function bodies might be executed outside of the loop - leave them be
+        return node
+
+    def visit_print_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            node.value = self.visit(node.value)
+        return node
+
+    def visit_assignment(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_if_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_while_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_for_stmt(self, node):
+        self.depth += 1
+        node.initializer = self.visit(node.initializer)
+        node.condition = self.visit(node.condition)
+        node.increment = self.visit(node.increment)
+        node.body = self.visit(node.body)
+        self.depth -= 1
+        return node
+
+    def visit_binary_expr(self, node):
+        form = self.affine(node)
+        if form and form[0] not in (0, 1):
+            return self.temp_variable(form, node)
+
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_unary_expr(self, node):
+        form = self.affine(node)
+        if form and form[0] not in (0, 1):
+            return self.temp_variable(form, node)
+
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_assert_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_return_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_call(self, node):
+        for i, a in enumerate(node.args):
+            node.args[i] = self.visit(a)
+        return node
+
+    @staticmethod
+    def visit_variable(node):
+        return node
+
+    @staticmethod
+    def visit_literal(node):
+        return node
+
+    def visit_unknown(self, m_name):
+        pass
+
+    def affine(self, node):
+        """Returns (c, k) if node computes c * i + k for integer constants c, k, None otherwise."""
+        if isinstance(node, Variable):
+            if node.name != self.iv.name or node not in self.in_sets:
+                return None
+            reach_defs = {d for d in self.in_sets[node] if d.name == node.name}
+            if reach_defs and all(d in self.iv.defs for d in reach_defs):
+                return 1, 0
+            return None
+
+        if is_int_literal(node):
+            return 0, node.value
+
+        if isinstance(node, BinaryExpr) and node.op in ('+', '-', '*'):
+            left, right = self.affine(node.left), self.affine(node.right)
+            if left is None or right is None:
+                return None
+
+            if node.op == '+':
+                return left[0] + right[0], left[1] + right[1]
+            elif node.op == '-':
+                return left[0] - right[0], left[1] - right[1]
+            elif left[0] == 0:
+                return left[1] * right[0], left[1] * right[1]
+            elif right[0] == 0:
+                return right[1] * left[0], right[1] * left[1]
+
+        if isinstance(node, UnaryExpr) and node.op == '-':
+            form = self.affine(node.expr)
+            if form:
+                return -form[0], -form[1]
+
+        return None
+
+    def temp_variable(self, form, node):
+        if form not in self.temps:
+            self.temps[form] = fresh_name('iv')
+
+        var = Variable(name=self.temps[form], scope_depth=self.depth)
+        self.in_sets[var] = self.in_sets.get(node, set())
+        return var
+
+
+class StrengthReductionOptimizer(BaseVisitor):
+    """Replaces costly operations with cheaper ones.
+
+    Expressions affine in an induction variable of a for loop are replaced with temporaries updated
+    by addition in each iteration (see DerivedExpressionReducer) and squares (x ^ 2) are replaced by
+    multiplication (x * x).
+
+    Basic induction variable is recognized for loops of form
+        for (var i: int = <int literal>; <condition>; i = i + <int literal>) { ... }
+    (also with assignment as initializer and subtraction in increment). Additionally, the only
+    definitions of `i` reaching its uses in derived expressions must be the initializer and the
+    increment, and neither the loop body nor functions called in the loop can assign to `i`.
+    """
+
+    def __init__(self, in_sets):
+        self.in_sets = in_sets
+
+    def run(self, statements):
+        return self.visit_statements(statements)
+
+    def visit_statements(self, statements):
+        new_statements = []
+        for stmt in statements:
+            stmt = self.visit(stmt)
+            if isinstance(stmt, ForStmt):
+                new_statements.extend(self.reduce_loop(stmt))
+            new_statements.append(stmt)
+        return new_statements
+
+    def visit_block(self, node):
+        node.statements = self.visit_statements(node.statements)
+        return node
+
+    def visit_function_def(self, node):
+        if not node.frozen:
+            node.body = self.visit(node.body)
+        return node
+
+    def visit_print_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            node.value = self.visit(node.value)
+        return node
+
+    def visit_assignment(self, node):
+        node.value = self.visit(node.value)
+        return node
+
+    def visit_if_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_while_stmt(self, node):
+        node.condition = self.visit(node.condition)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_for_stmt(self, node):
+        node.initializer = self.visit(node.initializer)
+        node.condition = self.visit(node.condition)
+        node.increment = self.visit(node.increment)
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_binary_expr(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+
+        # x ^ 2 => x * x
+        if node.op == '^' and isinstance(node.right, Literal) and node.right.value == 2 \
+                and node.right.type in (Type.INT, Type.FLOAT) and isinstance(node.left, (Variable, Literal)):
+            return BinaryExpr(left=node.left, op='*', right=self.copy(node.left))
+
+        return node
+
+    def visit_unary_expr(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_assert_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_return_stmt(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_call(self, node):
+        for i, a in enumerate(node.args):
+            node.args[i] = self.visit(a)
+        return node
+
+    @staticmethod
+    def visit_variable(node):
+        return node
+
+    @staticmethod
+    def visit_literal(node):
+        return node
+
+    def visit_unknown(self, m_name):
+        pass
+
+    def copy(self, node):
+        if isinstance(node, Literal):
+            return Literal(value=node.value, type=node.type)
+
+        var = Variable(name=node.name, scope_depth=node.scope_depth)
+        if node in self.in_sets:
+            self.in_sets[var] = self.in_sets[node]
+        return var
+
+    def reduce_loop(self, node):
+        """Reduces derived induction expressions in given loop, returns declarations of temporaries."""
+        iv = self.induction_variable(node)
+        if iv is None:
+            return []
+
+        temps = DerivedExpressionReducer(iv, self.in_sets).run(node)
+
+        declarations = []
+        for (coef, const), name in temps.items():
+            value = Literal(value=coef * iv.init_value + const, type=Type.INT)
+            declaration = VariableDeclaration(name=name, type=Type.INT, value=value)
+
+            # Updated at the end of the body - right before the increment of induction variable
+            var = Variable(name=name, scope_depth=2)
+            update = Assignment(name=name, value=BinaryExpr(var, '+', Literal(coef * iv.step, Type.INT)))
+            update.scope_depth = 2
+            node.body.statements.append(update)
+
+            reach_defs = {declaration, update}
+            self.in_sets[var] = self.in_sets[declaration] = self.in_sets[update] = reach_defs
+            declarations.append(declaration)
+
+        return declarations
+
+    def induction_variable(self, node):
+        init, inc = node.initializer, node.increment
+        if not isinstance(init, (Assignment, VariableDeclaration)) or not is_int_literal(init.value):
+            return None
+        if not isinstance(inc, Assignment) or inc.name != init.name:
+            return None
+
+        step = self.step(inc)
+        if step is None or self.assigned_in_loop(node, init.name):
+            return None
+
+        return InductionVariable(init.name, init.value.value, step, (init, inc))
+
+    @staticmethod
+    def step(node):
+        value = node.value
+        if not isinstance(value, BinaryExpr) or value.op not in ('+', '-'):
+            return None
+
+        left, right = value.left, value.right
+        if isinstance(left, Variable) and left.name == node.name and is_int_literal(right):
+            return right.value if value.op == '+' else -right.value
+        if value.op == '+' and isinstance(right, Variable) and right.name == node.name and is_int_literal(left):
+            return left.value
+        return None
+
+    @staticmethod
+    def assigned_in_loop(node, name):
+        """Checks if variable of given name is (re)defined in loop body, condition or called functions."""
+        statements = [node.condition, node.body]
+        visited = set()
+
+        while statements:
+            if any(d.name == name for d in VarDefLocator().run(statements)):
+                return True
+
+            def_nodes = []
+            for call in CallLocator().run(statements):
+                def_node = getattr(call, 'def_node', None)
+                if def_node is not None and def_node not in visited:
+                    visited.add(def_node)
+                    def_nodes.append(def_node)
+            statements = def_nodes
+
+        return False
@@ -0,0 +1,268 @@
+from contextlib import contextmanager
+from itertools import count
+from tc.common import BaseVisitor, Type
+from tc.globals import global_env
+from tc.optimization.common import CallLocator, VarDefLocator, fresh_name
+from tc.parser import Assignment, Variable
+from tc.typecheck import binary_signatures, unary_signatures
+
+global_functions = global_env().functions
+
+# Operators commutative for every pair of operand types accepted by TypeCheck ('+' is not - strings)
+commutative_operators = {'*', '==', '!='}
+swapped_operators = {'>': '<', '>=': '<='}
+
+
+class GlobalValueNumberingOptimizer(BaseVisitor):
+    """Eliminates redundant computations using dominator-based global value numbering.
+
+    Each expression gets a value number: equal numbers guarantee equal values at runtime. Numbers of
+    operators and pure builtin calls are hashed from the operator and numbers of operands (in canonical
+    order for commutative operators, `a > b` is treated as `b < a`), variables take numbers of values
+    assigned to them, so e.g. after `y = x` expressions `y + 1` and `x + 1` are numbered alike.
+
+    In structured tc programs dominator tree follows the scopes: statement dominates the ones following
+    it in the same block and everything nested in them. Computation of a value (its leader) can then be
+    reused where the leader dominates, i.e. while its scope is open. The leader stores its value in a
+    temporary (see Evaluator) and redundant computations are replaced with reads of that temporary.
+    Function bodies are numbered separately (they are executed in their own frames).
+
+    At join points (after if statements, at loop headers) variables assigned in between get fresh
+    numbers, calls of user defined functions do the same for all variables assigned by any function.
+
+    Attributes:
+        variables (list): stack of maps (variable name -> value number), one per environment
+        leaders (list): stack of maps (value number -> (computing node, its scope depth))
+        clobbered (set): names of variables assigned in function bodies
+        eliminated (int): number of eliminated evaluations of expressions
+    """
+
+    def __init__(self, in_sets):
+        self.in_sets = in_sets
+        self.numbers = count()
+        self.expressions = {}  # expression key -> value number
+        self.types = {}  # value number -> Type (if known)
+        self.variables = [{}]
+        self.leaders = [{}]
+        self.clobbered = set()
+        self.eliminated = 0
+
+    def reset(self):
+        self.expressions = {}
+        self.types = {}
+        self.variables = [{}]
+        self.leaders = [{}]
+        self.clobbered = set()
+        self.eliminated = 0
+
+    def run(self, statements):
+        for stmt in statements:
+            self.visit(stmt)
+        return statements
+
+    def fresh(self, type=None):
+        number = next(self.numbers)
+        if type is not None:
+            self.types[number] = type
+        return number
+
+    def number(self, key, type=None):
+        if key not in self.expressions:
+            self.expressions[key] = self.fresh(type)
+        return self.expressions[key]
+
+    @contextmanager
+    def in_scope(self):
+        try:
+            self.variables.append({})
+            self.leaders.append({})
+            yield
+        finally:
+            self.variables.pop()
+            self.leaders.pop()
+
+    def scope_of(self, depth):
+        # Outer environments of a function body all map to the bottom of its stack (the closure)
+        return self.variables[max(len(self.variables) - 1 - depth, 0)]
+
+    def invalidate(self, names=None):
+        """Gives fresh numbers to visible variables of given names (all if names are not given)."""
+        for scope in self.variables:
+            for name in scope:
+                if names is None or name in names:
+                    scope[name] = self.fresh(self.types.get(scope[name]))
+
+    def assigned_in(self, statements):
+        names = {d.name for d in VarDefLocator().run(statements) if isinstance(d, Assignment)}
+        for call in CallLocator().run(statements):
+            if self.is_user_call(call):
+                names |= self.clobbered
+                if getattr(call, 'def_node', None) is None:
+                    return None  # unknown function
+        return names
+
+    @staticmethod
+    def is_user_call(node):
+        return getattr(node, 'def_node', None) is not None or node.name not in global_functions
+
+    def leader(self, number, node):
+        """Returns node computing value of given number here - read of the leader's temporary if available."""
+        for depth, leaders in enumerate(reversed(self.leaders)):
+            if number in leaders:
+                break
+        else:
+            self.leaders[-1][number] = (node, len(self.leaders))
+            return node
+
+        first, first_depth = self.leaders[-1 - depth][number]
+        if first.temp is None:
+            first.temp = fresh_name('vn')
+        var = Variable(name=first.temp, scope_depth=len(self.leaders) - first_depth)
+        self.in_sets[var] = set()
+        return var
+
+    def visit_block(self, node):
+        with self.in_scope():
+            for stmt in node.statements:
+                self.visit(stmt)
+
+    def visit_function_def(self, node):
+        self.clobbered |= {d.name for d in VarDefLocator().run([node.body]) if isinstance(d, Assignment)}
+        if node.frozen:
+            return
+
+        outer = self.variables, self.leaders
+        params = {p.name: self.fresh(p.type) for p in node.parameters}
+        self.variables, self.leaders = [{}, params], [{}, {}]  # closure, parameters
+        try:
+            self.visit(node.body)
+        finally:
+            self.variables, self.leaders = outer
+
+    def visit_print_stmt(self, node):
+        node.expr = self.visit(node.expr)[1]
+
+    def visit_variable_declaration(self, node):
+        if node.value:
+            number, node.value = self.visit(node.value)
+            self.types.setdefault(number, node.type)
+        else:
+            number = self.fresh(node.type)
+        self.variables[-1][node.name] = number
+
+    def visit_assignment(self, node):
+        number, node.value = self.visit(node.value)
+        self.scope_of(node.scope_depth)[node.name] = number
+
+    def visit_if_stmt(self, node):
+        node.condition = self.visit(node.condition)[1]
+
+        before = [dict(scope) for scope in self.variables]
+        self.visit(node.body)
+
+        # Join - variables assigned in the body might hold either value
+        for scope, old in zip(self.variables, before):
+            for name, number in scope.items():
+                if old.get(name) != number:
+                    scope[name] = self.fresh(self.types.get(number))
+
+    def visit_while_stmt(self, node):
+        header = self.loop_header([node.condition, node.body])
+        node.condition = self.visit(node.condition)[1]
+        self.visit(node.body)
+        self.loop_exit(header)
+
+    def visit_for_stmt(self, node):
+        with self.in_scope():
+            self.visit(node.initializer)
+            header = self.loop_header([node.condition, node.body, node.increment])
+            node.condition = self.visit(node.condition)[1]
+            self.visit(node.body)
+            self.visit(node.increment)
+            self.loop_exit(header)
+
+    def loop_header(self, statements):
+        # Values of variables assigned in the loop differ between iterations
+        self.invalidate(self.assigned_in(statements))
+        return [dict(scope) for scope in self.variables]
+
+    def loop_exit(self, header):
+        # Loop is left right after evaluating the condition, i.e. with values from its header
+        for scope, numbers in zip(self.variables, header):
+            scope.clear()
+            scope.update(numbers)
+
+    def visit_binary_expr(self, node):
+        eliminated = self.eliminated
+        l_number, node.left = self.visit(node.left)
+        r_number, node.right = self.visit(node.right)
+
+        op = node.op
+        if op in swapped_operators:
+            op = swapped_operators[op]
+            l_number, r_number = r_number, l_number
+
+        operand_type = self.types.get(l_number, self.types.get(r_number))
+        if op in commutative_operators or (op == '+' and operand_type in (Type.INT, Type.FLOAT)):
+            l_number, r_number = sorted((l_number, r_number))
+
+        result_type = binary_signatures.get((operand_type, operand_type), {}).get(op)
+        number = self.number((op, l_number, r_number), result_type)
+        return self.reuse(number, node, eliminated)
+
+    def visit_unary_expr(self, node):
+        eliminated = self.eliminated
+        number, node.expr = self.visit(node.expr)
+
+        result_type = unary_signatures.get(self.types.get(number), {}).get(node.op)
+        number = self.number((node.op, number), result_type)
+        return self.reuse(number, node, eliminated)
+
+    def reuse(self, number, node, eliminated):
+        new_node = self.leader(number, node)
+        if new_node is not node:
+            # Only the outermost redundant expression counts, the ones nested in it are gone as well
+            self.eliminated = eliminated + 1
+        return number, new_node
+
+    def visit_assert_stmt(self, node):
+        node.expr = self.visit(node.expr)[1]
+
+    def visit_return_stmt(self, node):
+        node.expr = self.visit(node.expr)[1]
+
+    def visit_call(self, node):
+        eliminated = self.eliminated
+        arg_numbers = []
+        for i, a in enumerate(node.args):
+            number, node.args[i] = self.visit(a)
+            arg_numbers.append(number)
+
+        if self.is_user_call(node):
+            def_node = getattr(node, 'def_node', None)
+            self.invalidate(self.clobbered if def_node is not None else None)
+            return self.fresh(def_node.return_type if def_node else None), node
+
+        function = global_functions[node.name]
+        try:
+            result_type = function.signature.verify([self.types.get(n) for n in arg_numbers])
+        except TypeError:
+            result_type = None
+
+        if not function.pure:
+            return self.fresh(result_type), node
+
+        number = self.number((node.name, tuple(arg_numbers)), result_type)
+        return self.reuse(number, node, eliminated)
+
+    def visit_variable(self, node):
+        scope = self.scope_of(node.scope_depth)
+        if node.name not in scope:
+            scope[node.name] = self.fresh()  # defined outside of the analyzed code
+        return scope[node.name], node
+
+    def visit_literal(self, node):
+        return self.number(('literal', node.value, node.type), node.type), node
+
+    def visit_unknown(self, m_name):
+        pass
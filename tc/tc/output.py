@@ -0,0 +1,92 @@
+import sys
+
+DEFAULT_BUFFER_SIZE = 1 << 16  # characters
+
+
+class OutputSink:
+    """Destination of values printed by `print` statements (see Evaluator.visit_print_stmt)."""
+
+    def write(self, text):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class StreamOutput(OutputSink):
+    """Writes each printed line right away to a stream (by default the current `sys.stdout`)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, text):
+        (self.stream or sys.stdout).write(text)
+
+
+class BufferedOutput(OutputSink):
+    """Collects printed text and writes it to a stream in large chunks.
+
+    Interpreter flushes the buffer at the end of each run (even a failed one).
+
+    Attributes:
+        stream (file): stream written to, by default `sys.stdout` at the time of flushing
+        buffer_size (int): number of characters collected before the buffer is flushed
+        line_buffered (bool): whether to flush after each line (e.g. for interactive use)
+        chunks (list): buffered text
+        size (int): number of buffered characters
+    """
+
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER_SIZE, line_buffered=False):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.line_buffered = line_buffered
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.line_buffered or self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(self.chunks))
+            stream.flush()
+            self.chunks = []
+            self.size = 0
+
+
+class FileOutput(BufferedOutput):
+    """Writes printed text to a file (buffered)."""
+
+    def __init__(self, path, mode='w', buffer_size=DEFAULT_BUFFER_SIZE):
+        super().__init__(open(path, mode), buffer_size)
+        self.path = path
+
+    def close(self):
+        super().close()
+        self.stream.close()
+
+
+class CaptureOutput(OutputSink):
+    """Keeps printed text in memory (e.g. for embedding the interpreter)."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+    def lines(self):
+        return self.getvalue().splitlines()
+
+    def clear(self):
+        self.chunks = []
@@ -1,138 +1,11 @@
 import logging
 import ply.lex as lex
 import ply.yacc as yacc
-import typing
-from dataclasses import dataclass
 from tc.common import Type
-
-
-# All possible nodes of the abstract syntax tree.
-@dataclass(unsafe_hash=True)
-class AssertStmt:
-    expr: typing.Any
-
-
-@dataclass(unsafe_hash=True)
-class Assignment:
-    name: str
-    value: typing.Any
-
-
-@dataclass(unsafe_hash=True)
-class BinaryExpr:
-    left: typing.Any
-    op: str
-    right: typing.Any
-
-    def __eq__(self, other):
-        if isinstance(other, BinaryExpr):
-            return self.left == other.left and self.op == other.op and self.right == other.right
-        return False
-
-
-class Block:
-    def __init__(self, statements):
-        self.statements = statements
-
-
-@dataclass
-class Call:
-    name: str
-    args: typing.List
-    scope_depth: int = None
-
-    def __hash__(self):
-        return id(self)
-
-
-class ForStmt:
-    def __init__(self, initializer, condition, increment, body):
-        self.initializer = initializer
-        self.condition = condition
-        self.increment = increment
-        self.body = body
-
-
-class FunctionDef:
-    def __init__(self, name, parameters, return_type, body):
-        self.name = name
-        self.parameters = parameters
-        self.return_type = return_type
-        self.body = body
-
-
-class IfStmt:
-    def __init__(self, condition, body):
-        self.condition = condition
-        self.body = body
-
-
-@dataclass(frozen=True)
-class Literal:
-    value: typing.Union[str, int, float, bool]
-    type: typing.Any = None
-
-    def __hash__(self):
-        return id(self)
-
-    def __repr__(self):
-        return f'Literal(value={self.value}, type={self.type})'
-
-
-class Parameter:
-    def __init__(self, name, type):
-        self.name = name
-        self.type = type
-
-
-class PrintStmt:
-    def __init__(self, expr):
-        self.expr = expr
-
-
-class ReturnStmt:
-    def __init__(self, expr):
-        self.expr = expr
-
-
-class UnaryExpr:
-    def __init__(self, operator, expr):
-        self.op = operator
-        self.expr = expr
-
-
-@dataclass
-class Variable:
-    name: str
-    scope_depth: int = None
-
-    def __hash__(self):
-        return id(self)
-
-    def __repr__(self):
-        return f'Variable(name={self.name})'
-
-
-@dataclass
-class VariableDeclaration:
-    name: str
-    type: typing.Any
-    value: typing.Any
-
-    def __hash__(self):
-        return hash(self.name)
-
-    def __repr__(self):
-        return f'VariableDeclaration(name={self.name}, value={self.value})'
-
-
-class WhileStmt:
-    def __init__(self, condition, body):
-        self.condition = condition
-        self.body = body
-
-
-###
+from tc.nodes import (
+    AssertStmt, Assignment, BinaryExpr, Block, Call, ForStmt, FunctionDef, IfStmt, Literal, Parameter,
+    PrintStmt, ReturnStmt, UnaryExpr, Variable, VariableDeclaration, WhileStmt
+)
 
 
 class Parser:
@@ -144,7 +17,10 @@ class Parser:
         self.yacc_parser = yacc.yacc(module=self, debug=self.debug)
 
     def run(self, input):
-        return self.yacc_parser.parse(input, debug=self.debug)
+        self.lexer.parentheses = []  # whether each open parenthesis starts arguments of a call
+        self.lexer.closed_call = False  # whether the last ')' ended arguments of a call
+        self.lexer.brackets = []  # whether each open bracket starts an index
+        return self.yacc_parser.parse(input, lexer=self.lexer, debug=self.debug)
 
     ###
     # LEXING
@@ -153,7 +29,7 @@ class Parser:
     tokens = [
         'INT', 'FLOAT', 'BOOL', 'STRING',
         'POW', 'EQ', 'NEQ', 'LE', 'LEQ', 'GE', 'GEQ',
-        'IDENT',
+        'IDENT', 'INDEX',
     ]
 
     reserved = {
@@ -207,8 +83,64 @@ class Parser:
         t.value = t.value.strip('\'\"')
         return t
 
+    def t_LBRACKET(self, t):
+        r"""\["""
+        # '[' right after a name or a call (without whitespace) indexes, unless the brackets hold a reverse polish
+        # expression (ending with an operator) - `y [3]`, `y[3 4 +]` and `(y)[3]` stay implicit multiplications,
+        # `y[3]` (a multiplication before arrays were added) indexes
+        data, pos = t.lexer.lexdata, t.lexpos
+        indexes = self.follows_name(data, pos) or (pos and data[pos - 1] == ')' and t.lexer.closed_call)
+        t.type = 'INDEX' if indexes and not self.holds_reverse_polish(data, pos) else '['
+        t.lexer.brackets.append(t.type == 'INDEX')
+        return t
+
+    @staticmethod
+    def t_RBRACKET(t):
+        r"""\]"""
+        t.type = ')' if t.lexer.brackets and t.lexer.brackets.pop() else ']'
+        return t
+
+    def t_LPAREN(self, t):
+        r"""\("""
+        start = t.lexpos
+        while start and t.lexer.lexdata[start - 1] in self.t_ignore:
+            start -= 1
+        t.lexer.parentheses.append(self.follows_name(t.lexer.lexdata, start))
+        t.type = '('
+        return t
+
+    @staticmethod
+    def t_RPAREN(t):
+        r"""\)"""
+        t.lexer.closed_call = t.lexer.parentheses.pop() if t.lexer.parentheses else False
+        t.type = ')'
+        return t
+
+    @staticmethod
+    def holds_reverse_polish(data, pos):
+        """Whether the brackets opened at pos hold an expression ending with an operator (infix ones do not)."""
+        depth = 0
+        for end in range(pos, len(data)):
+            if data[end] == '[':
+                depth += 1
+            elif data[end] == ']':
+                depth -= 1
+                if not depth:
+                    return data[pos + 1:end].rstrip()[-1:] in ('+', '-', '*', '/', '%', '=', '<', '>')
+        return False
+
+    def follows_name(self, data, pos):
+        """Whether the input before pos ends with a name (of a variable or a function, not a keyword)."""
+        start = pos
+        while start and (data[start - 1].isalnum() or data[start - 1] == '_'):
+            start -= 1
+        word = data[start:pos]
+        return bool(word) and not word[0].isdigit() and word not in self.reserved and word not in ('true', 'false')
+
     def t_IDENT(self, t):
-        r"""[a-zA-Z_][a-zA-Z_0-9]*"""
+        r"""array\[[a-zA-Z_][a-zA-Z_0-9]*\]|[a-zA-Z_][a-zA-Z_0-9]*"""
+        # Names of array types (e.g. array[int]) are single identifiers - types in declarations, constructors
+        # of array literals in calls (see tc.globals)
         t.type = self.reserved.get(t.value, 'IDENT')
         return t
 
@@ -396,14 +328,28 @@ class Parser:
 
     @staticmethod
     def p_expr_function_call_noarg(p):
-        """expr : IDENT '(' ')'"""
+        """call : IDENT '(' ')'"""
         p[0] = Call(name=p[1], args=[])
 
     @staticmethod
     def p_expr_function_call(p):
-        """expr : IDENT '(' arguments ')'"""
+        """call : IDENT '(' arguments ')'"""
         p[0] = Call(name=p[1], args=p[3])
 
+    @staticmethod
+    def p_expr_call(p):
+        """expr : call"""
+        p[0] = p[1]
+
+    # Only variables and results of calls are indexed (INDEX is lexed right after them), its closing bracket
+    # is lexed as ')' - indexing adds no conflicts with implicit multiplications
+    @staticmethod
+    def p_expr_index(p):
+        """expr : variable INDEX expr ')'
+                | call INDEX expr ')'
+        """
+        p[0] = BinaryExpr(left=p[1], op='[]', right=p[3])
+
     @staticmethod
     def p_expr_function_call_no_par(p):
         """expr : call_no_par """
@@ -0,0 +1,97 @@
+import threading
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.01  # seconds between samples
+TOP_LEVEL = '<top>'  # name of the frame of top-level code
+
+
+class SamplingProfiler:
+    """Periodically records the tc call stack of a running evaluator from a background thread.
+
+    The evaluator only keeps names of functions being called (Evaluator.call_stack) and the statement
+    being evaluated (Evaluator.statement), the sampling thread reads them every `interval` seconds - nodes
+    are not instrumented, so profiling adds little to the cost of evaluation. Profiling might be started and
+    stopped at any time, also while a program is being evaluated (e.g. from another thread). Python threads
+    take turns holding the GIL, so samples are taken at most every `sys.getswitchinterval()` seconds.
+
+    Attributes:
+        evaluator (Evaluator): evaluator sampled
+        interval (float): number of seconds between samples
+        samples (Counter): map (stack -> number of samples), stack is a tuple of function names (outermost
+            first) followed by the kind of the statement being evaluated, e.g. ('<top>', 'fib', 'WhileStmt')
+        thread (threading.Thread): sampling thread, None unless the profiler runs
+        stopped (threading.Event): set when the profiler shall stop
+    """
+
+    def __init__(self, evaluator, interval=DEFAULT_INTERVAL):
+        self.evaluator = evaluator
+        self.interval = interval
+        self.samples = Counter()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.sample_periodically, name='tc-profiler', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def sample_periodically(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        statement = self.evaluator.statement
+        if statement is None:
+            return  # nothing evaluated (yet)
+        stack = (TOP_LEVEL, *self.evaluator.call_stack, type(statement).__name__)
+        self.samples[stack] += 1
+
+    def collapsed(self):
+        """Samples in collapsed stacks format (one 'frame;frame;... count' line per stack, for flame graphs)."""
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in sorted(self.samples.items()))
+
+    def functions(self):
+        """Returns map (function name -> (self samples, total samples)), statement kinds are ignored."""
+        own, total = Counter(), Counter()
+        for stack, count in self.samples.items():
+            frames = stack[:-1]
+            own[frames[-1]] += count
+            for name in set(frames):  # recursive calls are counted once
+                total[name] += count
+        return {name: (own[name], total[name]) for name in total}
+
+    def report(self, limit=20):
+        """Table of functions with the most samples (including samples of functions they called)."""
+        samples = sum(self.samples.values())
+        percent = 100 / max(samples, 1)
+        lines = [f'{samples} samples', f'{"function":<30}{"self":>8}{"self %":>8}{"total":>8}{"total %":>8}']
+        functions = sorted(self.functions().items(), key=lambda item: (-item[1][1], -item[1][0], item[0]))
+        for name, (own, total) in functions[:limit]:
+            lines.append(f'{name:<30}{own:>8}{own * percent:>8.1f}{total:>8}{total * percent:>8.1f}')
+
+        statements = Counter()
+        for stack, count in self.samples.items():
+            statements[stack[-1]] += count
+        lines.append(f'{"statement":<30}{"self":>8}{"self %":>8}')
+        for kind, count in statements.most_common():
+            lines.append(f'{kind:<30}{count:>8}{count * percent:>8.1f}')
+        return '\n'.join(lines)
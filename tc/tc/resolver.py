@@ -1,23 +1,94 @@
+from copy import copy
 from tc.common import BaseVisitor
 from tc.globals import global_env
 
 global_functions = global_env().functions.keys()
 
 
+class Binding:
+    """Variable declared in some scope.
+
+    Attributes:
+        declaration: VariableDeclaration or Parameter node (None for temporaries of optimizers)
+        references (list): Variable and Assignment nodes referencing the variable
+        captured (bool): whether the variable is referenced in a nested function
+        assigned (bool): whether the variable is assigned anywhere
+    """
+
+    def __init__(self, declaration):
+        self.declaration = declaration
+        self.references = []
+        self.captured = False
+        self.assigned = False
+
+
+class Closure:
+    """Free names of a function being resolved.
+
+    Attributes:
+        params_index (int): index of the scope of function parameters
+        free (dict): map (namespace -> map (name -> index of scope the name is defined in)) of names
+            from enclosing scopes (except the global one) referenced in the function
+        outer_refs (list): (node, index of scope it is in, index of scope it references) of references
+            to names outside the function (scope depths to be set in flat closure layout)
+    """
+
+    def __init__(self, params_index):
+        self.params_index = params_index
+        self.free = {'variable': {}, 'function': {}}
+        self.outer_refs = []
+
+
 class Resolver(BaseVisitor):
-    """For each name usage (variable/function) determines which scope it references."""
+    """For each name usage (variable/function) determines which scope it references.
+
+    By default scope depths are lexical - function body environments are chained to the environment
+    the function is defined in (optimizers rely on this layout). With `flat_closures` Resolver also
+    analyzes free names of functions and lays out scopes for flat closures (see Evaluator):
+
+    - function captures only names of enclosing scopes it (or functions nested in it) references,
+      they are copied to a closure environment chained directly to the global one,
+    - captured variables which are assigned anywhere live in shared cells (`cell` attribute of their
+      declarations and references),
+    - function not capturing anything needs no closure object at all, its body environments are chained
+      to the global environment.
+
+    Functions are not first-class values, i.e. they never escape the scope they are defined in - being
+    closed over is the only way for a variable to outlive its environment.
+
+    Attributes:
+        scopes (list): stack of scopes, map (namespace -> names defined in the scope)
+        closures (list): stack of Closure of functions being resolved (with `flat_closures` only)
+        flat_closures (bool): whether scopes are laid out for flat closures
+    """
 
     def __init__(self):
-        self.scopes = [{'variable': set(), 'function': set(global_functions)}]
+        self.scopes = [{'variable': {}, 'function': set(global_functions)}]
+        self.closures = []
+        self.flat_closures = False
 
     def reset(self):
-        self.scopes = [{'variable': set(), 'function': set(global_functions)}]
+        self.scopes = [{'variable': {}, 'function': set(global_functions)}]
+        self.closures = []
+        self.flat_closures = False
+
+    def fork(self):
+        """New resolver starting with the global scope of this one (outside of any program being resolved)."""
+        resolver = Resolver()
+        variables = {name: copy(binding) for name, binding in self.scopes[0]['variable'].items()}
+        for binding in variables.values():
+            binding.references = list(binding.references)
+        resolver.scopes = [{'variable': variables, 'function': set(self.scopes[0]['function'])}]
+        return resolver
 
     def push_scope(self):
-        self.scopes.append({'variable': set(), 'function': set()})
+        self.scopes.append({'variable': {}, 'function': set()})
 
-    def define(self, name, what):
-        self.scopes[-1][what].add(name)
+    def define(self, name, what, node=None):
+        if what == 'variable':
+            self.scopes[-1][what][name] = Binding(node)
+        else:
+            self.scopes[-1][what].add(name)
 
     def resolve(self, name, what):
         for i in range(len(self.scopes)):
@@ -26,12 +97,39 @@ class Resolver(BaseVisitor):
         raise Exception(f'Failed to resolve {what} {name}')
 
     def pop_scope(self):
-        self.scopes.pop()
-
-    def run(self, statements):
+        scope = self.scopes.pop()
+        for binding in scope['variable'].values():
+            if binding.captured and binding.assigned:
+                for node in [binding.declaration, *binding.references]:
+                    if node is not None:
+                        node.cell = True
+
+    def run(self, statements, flat_closures=False):
+        self.flat_closures = flat_closures
         for stmt in statements:
             self.visit(stmt)
 
+    def reference(self, node, what):
+        """Resolves name referenced by given node, returns binding of variables (None for functions)."""
+        depth = self.resolve(node.name, what)
+        node.scope_depth = depth  # place scope info in the tree
+
+        index = len(self.scopes) - 1 - depth
+        binding = self.scopes[index][what].get(node.name) if what == 'variable' else None
+        if binding is not None:
+            binding.references.append(node)
+
+        if self.flat_closures:
+            crossed = [c for c in self.closures if c.params_index > index]
+            if crossed:
+                if index > 0:
+                    for closure in crossed:
+                        closure.free[what][node.name] = index
+                    if binding is not None:
+                        binding.captured = True
+                crossed[-1].outer_refs.append((node, len(self.scopes) - 1, index))
+        return binding
+
     def visit_block(self, node):
         self.push_scope()
         for stmt in node.statements:
@@ -43,11 +141,33 @@ class Resolver(BaseVisitor):
 
         self.push_scope()
         for p in node.parameters:
-            self.define(p.name, 'variable')
+            self.define(p.name, 'variable', p)
 
+        if self.flat_closures:
+            self.closures.append(Closure(len(self.scopes) - 1))
         self.visit(node.body)
+        if self.flat_closures:
+            self.lay_out_closure(node, self.closures.pop())
         self.pop_scope()
 
+    def lay_out_closure(self, node, closure):
+        # Closure environment (if any) encloses the parameters, the global one encloses the closure
+        has_closure = bool(closure.free['variable'] or closure.free['function'])
+        for ref, ref_index, index in closure.outer_refs:
+            ref.scope_depth = ref_index - closure.params_index + 1 + (has_closure if index == 0 else 0)
+
+        # Depths of captured names from the environment the function is defined in
+        def_index = closure.params_index - 1
+        node.free_vars = tuple((name, self.def_site_depth(def_index, index))
+                               for name, index in closure.free['variable'].items())
+        node.free_funs = tuple((name, self.def_site_depth(def_index, index))
+                               for name, index in closure.free['function'].items())
+
+    def def_site_depth(self, def_index, index):
+        if self.closures and index < self.closures[-1].params_index:
+            return def_index - self.closures[-1].params_index + 1  # closure of the enclosing function
+        return def_index - index
+
     def visit_print_stmt(self, node):
         self.visit(node.expr)
 
@@ -55,11 +175,10 @@ class Resolver(BaseVisitor):
         if node.value:
             self.visit(node.value)
         # TODO: handle repeating definitions here!
-        self.define(node.name, 'variable')
+        self.define(node.name, 'variable', node)
 
     def visit_assignment(self, node):
-        depth = self.resolve(node.name, 'variable')
-        node.scope_depth = depth  # place scope info in the tree
+        self.reference(node, 'variable').assigned = True
         self.visit(node.value)
 
     def visit_if_stmt(self, node):
@@ -83,9 +202,11 @@ class Resolver(BaseVisitor):
     def visit_binary_expr(self, node):
         self.visit(node.left)
         self.visit(node.right)
+        self.define_temp(node)
 
     def visit_unary_expr(self, node):
         self.visit(node.expr)
+        self.define_temp(node)
 
     def visit_assert_stmt(self, node):
         self.visit(node.expr)
@@ -94,15 +215,19 @@ class Resolver(BaseVisitor):
         self.visit(node.expr)
 
     def visit_call(self, node):
-        depth = self.resolve(node.name, 'function')
-        node.scope_depth = depth  # place scope info in the tree
+        self.reference(node, 'function')
 
         for a in node.args:
             self.visit(a)
+        self.define_temp(node)
 
     def visit_variable(self, node):
-        depth = self.resolve(node.name, 'variable')
-        node.scope_depth = depth  # place scope info in the tree
+        self.reference(node, 'variable')
+
+    def define_temp(self, node):
+        # Value stored in a temporary by optimizers (see ExpressionDAGOptimizer)
+        if node.temp:
+            self.define(node.temp, 'variable')
 
     @staticmethod
     def visit_literal(node):
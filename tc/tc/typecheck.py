@@ -1,5 +1,5 @@
 from tc.globals import global_env
-from tc.common import BaseVisitor, Callable, CallableSignature, Environment, Type
+from tc.common import BaseVisitor, Callable, CallableSignature, Environment, Type, array_element_types
 
 
 binary_signatures = {
@@ -52,6 +52,27 @@ unary_signatures = {
 }
 
 
+def add_array_signatures():
+    """Operators of arrays are the ones of their elements, applied element-wise (by NumPy).
+
+    Arrays are combined with arrays or scalars of their element type (broadcast to all elements),
+    results are arrays of result types of the element operators. Arrays are indexed by integers.
+    """
+    array_types = {e: a for a, e in array_element_types.items()}
+    for a_type, e_type in array_element_types.items():
+        element_signatures = binary_signatures[(e_type, e_type)]
+        vectorized = {op: array_types[t] for op, t in element_signatures.items()}
+        for operand_types in [(a_type, a_type), (a_type, e_type), (e_type, a_type)]:
+            binary_signatures[operand_types] = dict(vectorized)
+        binary_signatures.setdefault((a_type, Type.INT), {})['[]'] = e_type
+
+        if e_type in unary_signatures:
+            unary_signatures[a_type] = {'-': a_type}
+
+
+add_array_signatures()
+
+
 class TypeCheck(BaseVisitor):
     def __init__(self):
         self.env = global_env()
@@ -59,6 +80,12 @@ class TypeCheck(BaseVisitor):
     def reset(self):
         self.env = global_env()
 
+    def fork(self):
+        """New type checker starting with the global environment of this one."""
+        typecheck = TypeCheck()
+        typecheck.env = self.env.copy()
+        return typecheck
+
     def run(self, statements):
         for stmt in statements:
             self.visit(stmt)
@@ -72,18 +99,23 @@ class TypeCheck(BaseVisitor):
             self.env = self.env.enclosing
 
     def visit_function_def(self, node):
-        self.env = Environment(enclosing=self.env)
-        for p in node.parameters:
-            self.env.declare_var(p.name, p.type)
-
-        try:
-            self.visit(node.body)
-        except TypeCheck.ReturnType as r:
-            self.env = self.env.enclosing
-            return_type = r.type
+        if node.frozen:
+            # Body checked when it was compiled (see CompilationCache)
+            return_type = node.inferred_return_type
         else:
-            self.env = self.env.enclosing
-            return_type = Type.UNIT
+            self.env = Environment(enclosing=self.env)
+            for p in node.parameters:
+                self.env.declare_var(p.name, p.type)
+
+            try:
+                self.visit(node.body)
+            except TypeCheck.ReturnType as r:
+                self.env = self.env.enclosing
+                return_type = r.type
+            else:
+                self.env = self.env.enclosing
+                return_type = Type.UNIT
+            node.inferred_return_type = return_type
 
         param_types = [p.type for p in node.parameters]
 
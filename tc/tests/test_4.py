@@ -107,3 +107,60 @@ function_call_programs = [
 def test_call(test_input):
     interpreter = Interpreter()
     interpreter.run(test_input)
+
+
+closure_program = """
+    var scale: int = 10;
+
+    def counter(start: int, step: int): int {
+        var total: int = start;
+        var unused: string = 'not captured';
+
+        def add(k: int): int {
+            { total = total + k * step; }
+            return total
+        }
+
+        def times(n: int): int {
+            if (n == 0) { return 0; }
+            return add(scale) + times(n - 1)
+        }
+
+        def square(x: int): int { return x * x }
+
+        total = total + 1;
+        print times(3);
+        print total;
+        print square(total);
+        return total
+    }
+
+    print counter(0, 1);
+    print counter(5, 2)
+"""
+
+
+def test_flat_closures(capsys):
+    output = ['63', '31', '961', '31', '138', '66', '4356', '66']
+    Interpreter().run(closure_program, level=3)
+    assert capsys.readouterr().out.split() == output
+
+    interpreter = Interpreter()
+    interpreter.run(closure_program)
+    assert capsys.readouterr().out.split() == output
+
+    ast = interpreter.parser.run(closure_program)
+    interpreter.resolver.run(ast, flat_closures=True)
+    counter = ast[1]
+    add, times, square, assignment = counter.body.statements[2:6]
+    assert dict(add.free_vars).keys() == {'total', 'step'} and add.free_funs == ()
+    assert times.free_vars == () and dict(times.free_funs).keys() == {'add', 'times'}
+    assert square.free_vars is not None and not square.free_vars and not square.free_funs
+    # Only captured variables which are assigned need cells
+    assert counter.body.statements[0].cell and not counter.body.statements[1].cell
+    assert assignment.cell and not counter.parameters[0].cell and not counter.parameters[1].cell
+
+    # Function capturing nothing has no closure object, it is created once and shared by all calls
+    evaluator = interpreter.eval
+    assert [f.name for f in evaluator.closed_functions] == ['counter', 'square']
+    assert all(f.closure is evaluator.globals for f in evaluator.closed_functions.values())
@@ -1,9 +1,18 @@
 import logging
 import pytest
-from tc.common import PrettyPrinter
+from tc.benchmark import run_benchmark
+from tc.common import PrettyPrinter, Type
+from tc.generator import generate_program
+from tc.incremental import CompilationCache
 from tc.interpreter import Interpreter
-from tc.parser import Parser
-from tc.optimization import AlgebraicOptimizer, ExpressionDAGOptimizer, InOutBuilder, RedundancyOptimizer
+from tc.parser import Literal, Parser, Variable, VariableDeclaration
+from tc.optimization import (
+    AlgebraicOptimizer, CallGraphBuilder, DeadStoreOptimizer, ExpressionDAGOptimizer, FunctionInliner,
+    GenKillBuilder, GlobalValueNumberingOptimizer, InOutBuilder, MAX_LEVEL, PassManager, PurityAnalysis,
+    RedundancyOptimizer, SparseConstantPropagation, SSABuilder, StrengthReductionOptimizer
+)
+from tc.optimization.common import NodeCollector
+from tc.optimization.inlining import recursive_functions
 from tc.resolver import Resolver
 
 
@@ -257,6 +266,199 @@ def test_cs_optimizations(test_input, name):
     interpreter.run(test_input, opt=True, red_opt=False)
 
 
+reentrant_cs_program = """
+    def f(n: int): int {
+        var a: int = n;
+        if (a * 3 > 10) {
+            return a * 3
+        }
+        var r: int = f(a + 1);
+        return a * 3 + r
+    }
+
+    var x: float = 0.5;
+    print f(1);
+    print sin(x) + sin(x) * cos(x);
+    print tostring(f(2)) + '/' + tostring(f(2))
+"""
+
+
+def test_reentrant_cs_optimization(capsys):
+    interpreter = Interpreter()
+    interpreter.run(reentrant_cs_program)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(reentrant_cs_program, opt=True, red_opt=False)
+    assert capsys.readouterr().out == expected
+
+    # Common subexpressions of level 1 (value numbering of higher levels subsumes them)
+    for red_opt in (False, True):
+        interpreter = Interpreter()
+        interpreter.run(reentrant_cs_program, level=1, red_opt=red_opt)
+        assert capsys.readouterr().out == expected
+        assert interpreter.pass_stats['common_subexpressions'].nodes_changed > 0
+
+    ast = Parser().run(reentrant_cs_program)
+    Resolver().run(ast)
+    in_sets, _ = InOutBuilder().run(ast)
+    ast = ExpressionDAGOptimizer(in_sets).run(ast)
+
+    # The common value of sin(x) is kept in a temporary, calls of user defined functions are left alone
+    sum_expr = ast[3].expr
+    assert sum_expr.left.temp is not None
+    assert isinstance(sum_expr.right.left, Variable) and sum_expr.right.left.name == sum_expr.left.temp
+    concat = ast[4].expr
+    assert concat.left.left.temp is None and concat.right.temp is None
+
+
+value_numbering_test_programs = [
+    (
+        """
+            var a: int = 3;
+            var b: int = 4;
+            var s: string = 'x';
+            var t: string = 'y';
+            print a + b;
+            print b + a;
+            print s + t;
+            print t + s;
+            var y: int = a;
+            print y * 2 + a * 2;
+            if (a > b) {
+                print b < a
+            }
+            print b < a
+        """,
+        4
+    ),
+    (
+        """
+            var a: int = 3;
+            var b: int = 4;
+            var i: int = 0;
+            while (i < a + b) {
+                print a + b;
+                print i * 2;
+                i = i + 1;
+                print i * 2
+            }
+            print i * 2;
+            if (a == 3) {
+                a = 10
+            }
+            print a + b;
+            for (var j: int = 0; j < 3; j = j + 1) {
+                print j + a;
+                print a + j
+            }
+        """,
+        2
+    ),
+    (
+        """
+            var c: int = 1;
+            def bump() {
+                c = c + 1
+            }
+            print c + 1;
+            bump();
+            print c + 1;
+
+            def rec(n: int): int {
+                if (n < 1) {
+                    return 0
+                }
+                var k: int = n * n;
+                return rec(n - 1) + n * n + k
+            }
+            print rec(4);
+
+            var f: float = 0.5;
+            print sin(f) * cos(f) + cos(f) * sin(f)
+        """,
+        2
+    )
+]
+
+
+@pytest.mark.parametrize('test_input, eliminated', value_numbering_test_programs)
+def test_value_numbering(test_input, eliminated, capsys):
+    ast = Parser().run(test_input)
+    Resolver().run(ast)
+    in_sets, _ = InOutBuilder().run(ast)
+    optimizer = GlobalValueNumberingOptimizer(in_sets)
+    optimizer.run(ast)
+    assert optimizer.eliminated == eliminated
+
+    interpreter = Interpreter()
+    interpreter.run(test_input)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(test_input, opt=True)
+    assert capsys.readouterr().out == expected
+
+
+dead_store_program = """
+    def note(n: int): string {
+        print 'note ' + tostring(n);
+        return 'noted'
+    }
+
+    def hot(n: int): int {
+        var unused: int = n * 100;
+        var log: string = 'start';
+        log = note(n) + '!';
+        var total: int = 0;
+        for (var i: int = 0; i < n; i = i + 1) {
+            var sq: int = i * i;
+            total = total + i;
+            sq = i
+        }
+        var x: int = 1;
+        {
+            var x: int = 2;
+            print x
+        }
+        var acc: int = 0;
+        def getAcc(): int {
+            return acc
+        }
+        acc = n;
+        return x + total + getAcc()
+    }
+
+    print hot(3)
+"""
+
+
+def test_dead_store_elimination(capsys):
+    ast = Parser().run(dead_store_program)
+    Resolver().run(ast)
+    GenKillBuilder().run(ast)
+    optimizer = DeadStoreOptimizer()
+    optimizer.run(ast)
+    assert optimizer.removed == 5
+
+    # Unused local is gone, the call from dead assignment is kept, captured and shadowed variables are not touched
+    body = ast[1].body.statements
+    assert [type(stmt).__name__ for stmt in body] == [
+        'VariableDeclaration', 'Call', 'VariableDeclaration', 'ForStmt', 'VariableDeclaration', 'Block',
+        'VariableDeclaration', 'FunctionDef', 'Assignment', 'ReturnStmt'
+    ]
+    assert body[0].name == 'log' and body[0].value is None
+    assert body[3].body.statements[0].value is None and len(body[3].body.statements) == 2
+
+    interpreter = Interpreter()
+    interpreter.run(dead_store_program)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(dead_store_program, opt=True, red_opt=False)
+    assert capsys.readouterr().out == expected
+
+
 algebraic_test_programs = [
     (
         """
@@ -283,3 +485,482 @@ def test_algebraic_optimizations(test_input, name):
 
     pp = PrettyPrinter()
     pp.run(ast, f'out/algebraic_opt_{name}', view=False)
+
+
+def test_algebraic_non_commutative(capsys):
+    program = """
+        var x: int = 7;
+        var y: float = 2.5;
+        print 0 - x;
+        print 1 ** x;
+        print x / 1;
+        print y / 1.0;
+        print 1.0 / y
+    """
+    ast = Parser().run(program)
+    Resolver().run(ast)
+    ast = AlgebraicOptimizer().run(ast)
+    assert [type(s.expr).__name__ for s in ast[2:]] == ['BinaryExpr', 'BinaryExpr', 'BinaryExpr', 'Variable',
+                                                       'BinaryExpr']
+
+    Interpreter().run(program, level=MAX_LEVEL)
+    assert capsys.readouterr().out.split() == ['-7', '1', '7.0', '2.5', '0.4']
+
+
+strength_reduction_test_programs = [
+    (
+        """
+            var base : int = 10;
+            for (var i : int = 0; i < 10; i = i + 1) {
+                print i * 4 + 1;
+                print base + i * 3;
+                print -(i - 2) * 5
+            }
+        """,
+        'derived_iv'
+    ),
+    (
+        """
+            for (var i : int = 0; i < 4; i = i + 1) {
+                for (var j : int = 5; j > 0; j = j - 2) {
+                    print i * 7 - j * 3
+                }
+            }
+        """,
+        'nested_loops'
+    ),
+    (
+        """
+            var i : int = 0;
+            def bump() {
+                i = i + 3
+            }
+            for (i = 0; i < 10; i = i + 1) {
+                print i * 2;
+                bump()
+            }
+        """,
+        'iv_assigned_in_call'
+    ),
+    (
+        """
+            var x : int = 3;
+            var y : float = 1.5;
+            print x ** 2;
+            print y ** 2.
+        """,
+        'square'
+    )
+]
+
+
+@pytest.mark.parametrize('test_input, name', strength_reduction_test_programs)
+def test_strength_reduction(test_input, name, capsys):
+    interpreter = Interpreter()
+    interpreter.run(test_input)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(test_input, opt=True, red_opt=False)
+    assert capsys.readouterr().out == expected
+
+
+def test_strength_reduction_removes_multiplication():
+    parser = Parser()
+    ast = parser.run("""
+        for (var i : int = 0; i < 10; i = i + 1) {
+            print i * 4 + 1
+        }
+    """)
+
+    resolver = Resolver()
+    resolver.run(ast)
+
+    io_build = InOutBuilder()
+    in_sets, out_sets = io_build.run(ast)
+
+    optimizer = StrengthReductionOptimizer(in_sets)
+    ast = optimizer.run(ast)
+
+    temp_decl, loop = ast
+    assert isinstance(temp_decl, VariableDeclaration) and temp_decl.value.value == 1
+    assert loop.body.statements[0].expr == Variable(temp_decl.name, 2)
+    assert loop.body.statements[1].value.right.value == 4
+
+
+inlining_test_programs = [
+    (
+        """
+            var k : int = 3;
+            def sq(x : int) : int { return x * x + k }
+            def add(a : int, b : int) : int { return a + b }
+            var y : int = 5;
+            print sq(y);
+            print add(sq(y), y + 1);
+            {
+                var k : int = 100;
+                print sq(y)
+            }
+        """,
+        3,
+        'expression_shadowed_closure'
+    ),
+    (
+        """
+            var k : int = 3;
+            def log(s : string, n : int) {
+                var t : int = n * 2;
+                t = t + k;
+                print s + tostring(t)
+            }
+            {
+                var t : int = 7;
+                log('b', t);
+                print t
+            }
+            def counter() { k = k + 1 }
+            counter();
+            counter();
+            print k
+        """,
+        3,
+        'statement_renaming'
+    ),
+    (
+        """
+            def fib(n : int) : int {
+                if (n < 2) { return n }
+                return fib(n - 1) + fib(n - 2)
+            }
+            def outer(n : int) : int {
+                var base : int = 10;
+                def inner(m : int) : int { return m + base }
+                return inner(n) * 2
+            }
+            print fib(10);
+            print outer(4)
+        """,
+        1,
+        'recursion_and_closures'
+    ),
+    (
+        """
+            var a : int = 1;
+            def bump() : int { a = a + 10; return 0 }
+            def f(p : int) : int { return bump() + p }
+            def g(p : int) : int { return bump() * 0 + 2 * p }
+            print f(a);
+            print g(3)
+        """,
+        1,
+        'arguments_before_calls'
+    )
+]
+
+
+@pytest.mark.parametrize('test_input, n_inlined, name', inlining_test_programs)
+def test_inlining(test_input, n_inlined, name, capsys):
+    parser = Parser()
+    ast = parser.run(test_input)
+
+    resolver = Resolver()
+    resolver.run(ast)
+
+    GenKillBuilder().run(ast)
+    optimizer = FunctionInliner()
+    optimizer.run(ast)
+    assert optimizer.inlined == n_inlined
+
+    interpreter = Interpreter()
+    interpreter.run(test_input)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(test_input, opt=True)
+    assert capsys.readouterr().out == expected
+
+
+def test_call_graph():
+    parser = Parser()
+    ast = parser.run("""
+        def fib(n : int) : int {
+            if (n < 2) { return n }
+            return fib(n - 1) + fib(n - 2)
+        }
+        def twice(n : int) : int { return 2 * fib(n) }
+        print twice(3)
+    """)
+
+    resolver = Resolver()
+    resolver.run(ast)
+
+    GenKillBuilder().run(ast)
+    graph = CallGraphBuilder().run(ast)
+    fib, twice = ast[0], ast[1]
+    assert graph[fib] == {fib}
+    assert graph[twice] == {fib}
+    assert recursive_functions(graph) == {fib}
+
+
+purity_test_program = """
+    var k : int = 3;
+    var c : int = 10;
+    c = c + 1;
+    def fib(n : int) : int {
+        if (n < 2) { return n }
+        return fib(n - 1) + fib(n - 2)
+    }
+    def usesConstant(n : int) : int { return n * k }
+    def usesVariable(n : int) : int { return n + c }
+    def effective(n : int) : int { print n; return n }
+    def writesClosure(n : int) : int { c = n; return n }
+    def callsImpure(n : int) : int { return effective(n) + fib(n) }
+    def trig(x : float) : float { return sin(x) + cos(x) }
+    print fib(10) + usesConstant(1) + usesVariable(1) + writesClosure(1) + callsImpure(1);
+    print trig(1.)
+"""
+
+
+def test_purity_analysis():
+    parser = Parser()
+    ast = parser.run(purity_test_program)
+
+    resolver = Resolver()
+    resolver.run(ast)
+
+    GenKillBuilder().run(ast)
+    pure = PurityAnalysis().run(ast)
+    assert {f.name for f in pure} == {'fib', 'usesConstant', 'trig'}
+
+
+def test_memoization(capsys):
+    interpreter = Interpreter()
+    interpreter.run(purity_test_program)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(purity_test_program, opt=True, red_opt=False)
+    assert capsys.readouterr().out == expected
+
+    stats = {s.name: s for s in interpreter.eval.memo_stats.values()}
+    assert set(stats) == {'fib', 'usesConstant', 'trig'}
+    assert stats['fib'].misses == 11  # fib(0), ..., fib(10) computed once
+    assert stats['trig'].misses == 0  # inlined
+
+    interpreter = Interpreter()
+    interpreter.run(purity_test_program, opt=True, red_opt=False, memo_exclude={'fib'})
+    assert capsys.readouterr().out == expected
+    assert {s.name for s in interpreter.eval.memo_stats.values()} == {'usesConstant', 'trig'}
+
+    # Equal floats of different signs are different arguments
+    interpreter = Interpreter()
+    interpreter.run("""
+        def f(x: float): string { var s: string = tostring(x); return s }
+        print f(0.0); print f(-0.0); print f(0.0)
+    """, opt=True)
+    assert capsys.readouterr().out.split() == ['0.0', '-0.0', '0.0']
+    stats = {s.name: s for s in interpreter.eval.memo_stats.values()}
+    assert stats['f'].misses == 2 and stats['f'].hits == 1
+
+
+pass_manager_program = """
+    def square(x: int): int {
+        return x * x
+    }
+
+    var a: int = 3;
+    var b: int = a * 1 + 0;
+    var unused: int = 7;
+    for (var i: int = 0; i < 4; i = i + 1) {
+        print square(a) + 3 * i;
+        print (a + b) * 2
+    }
+"""
+
+
+@pytest.mark.parametrize('level', range(MAX_LEVEL + 1))
+def test_optimization_levels(level, capsys):
+    interpreter = Interpreter()
+    interpreter.run(pass_manager_program)
+    expected = capsys.readouterr().out
+
+    interpreter = Interpreter()
+    interpreter.run(pass_manager_program, level=level)
+    assert capsys.readouterr().out == expected
+    assert all(s.runs > 0 and s.time >= 0 for s in interpreter.pass_stats.values())
+    if level == 0:
+        assert not interpreter.pass_stats
+
+
+def test_pass_manager():
+    ast = Parser().run(pass_manager_program)
+    Resolver().run(ast)
+
+    pass_manager = PassManager(3)
+    pass_manager.run(ast)
+    stats = pass_manager.stats
+
+    # Inlining and redundancy removal change the AST, reaching definitions are recomputed after them
+    assert stats['inline'].nodes_changed > 0
+    assert stats['redundancy'].nodes_changed > 0
+    assert stats['in_sets'].runs > 1
+    # Cleanup passes are iterated until nothing changes, memoization does not change the AST
+    assert stats['redundancy'].runs == stats['algebraic'].runs > 1
+    assert stats['memoization'].nodes_changed == 0
+
+    pass_manager = PassManager(1, disabled=('redundancy',))
+    pass_manager.run(Parser().run('var x: int = 1 * 2'))
+    assert list(pass_manager.stats) == ['call_links', 'dead_stores', 'algebraic', 'in_sets', 'common_subexpressions']
+
+    with pytest.raises(ValueError):
+        PassManager(MAX_LEVEL + 1)
+
+
+incremental_program = """
+    def fib(n: int): int {
+        if (n < 2) {
+            return n
+        }
+        return fib(n - 1) + fib(n - 2)
+    }
+
+    var c: int = 2;
+    def counter(): int {
+        var k: int = c;
+        def inc() {
+            k = k + 1
+        }
+        inc();
+        inc();
+        return k * 2 + k * 2
+    }
+
+    print fib(15);
+    print counter() + fib(10)
+"""
+
+
+def test_incremental_compilation(tmp_path, capsys):
+    def run(program):
+        cache = CompilationCache(str(tmp_path))
+        interpreter = Interpreter(cache=cache)
+        interpreter.run(program, opt=True)
+        return cache, capsys.readouterr().out
+
+    cache, output = run(incremental_program)
+    assert cache.hits == [] and cache.misses == ['fib', 'counter']
+    assert output.split() == ['610', '71']
+
+    # Nothing changed - all functions restored already optimized
+    cache, output = run(incremental_program)
+    assert cache.hits == ['fib', 'counter'] and cache.misses == []
+    assert output.split() == ['610', '71']
+
+    # Edited function and the ones depending on changed definitions are compiled again
+    cache, output = run(incremental_program.replace('return k * 2 + k * 2', 'return k * 3 + k * 2'))
+    assert cache.hits == ['fib'] and cache.misses == ['counter']
+    assert output.split() == ['610', '75']
+
+    cache, output = run(incremental_program.replace('var c: int = 2', 'var c: int = 3'))
+    assert cache.hits == ['fib'] and cache.misses == ['counter']
+    assert output.split() == ['610', '75']
+
+    cache, output = run(incremental_program.replace('n - 2', 'n - 1'))
+    assert cache.hits == ['counter'] and cache.misses == ['fib']
+
+    # Different optimization options
+    cache = CompilationCache(str(tmp_path))
+    Interpreter(cache=cache).run(incremental_program, level=1)
+    assert cache.hits == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_program_generator(seed, capsys):
+    shape = dict(size=120, functions=4, depth=3, loop_density=0.5, expr_size=5)
+    program = generate_program(seed=seed, **shape)
+    assert program == generate_program(seed=seed, **shape)
+    assert program != generate_program(seed=seed + 1, **shape)
+
+    interpreter = Interpreter()
+    interpreter.run(program)
+    output = capsys.readouterr().out
+    interpreter = Interpreter()
+    interpreter.run(program, level=MAX_LEVEL, red_opt=False)
+    assert capsys.readouterr().out == output
+
+
+def test_benchmark():
+    results = run_benchmark([20, 40], repeat=1, functions=2)
+    for measurements in results.values():
+        assert [m.error for m in measurements] == [None, None]
+        assert measurements[0].nodes < measurements[1].nodes
+
+
+constant_propagation_program = """
+    var a: int = 1;
+    var b: int = 2;
+    var c: int = a + b;
+    if (c > 2) {
+        b = 3
+    }
+    print b;
+    print c * 2;
+
+    var i: int = 0;
+    var k: int = 5;
+    while (i < 10) {
+        k = 5;
+        i = i + 1
+    }
+    print k;
+    print i;
+
+    var n: int = 1;
+    def inc() {
+        n = n + 1
+    }
+    inc();
+    print n;
+
+    def f(x: int): int {
+        var y: int = 4;
+        return y * x + y
+    }
+    print f(2)
+"""
+
+
+def test_ssa_constant_propagation(capsys):
+    ast = Parser().run(constant_propagation_program)
+    Resolver().run(ast)
+    ssa = SSABuilder().run(ast)
+
+    # Phis join versions of `b` after the if statement, of `k` and `i` at the loop header
+    [if_phi] = ast[3].phis
+    i_phi, k_phi = sorted(ast[8].phis, key=lambda phi: phi.name)
+    assert (if_phi.name, k_phi.name, i_phi.name) == ('b', 'k', 'i')
+    assert if_phi.args == [ast[1].version, ast[3].body.statements[0].version]
+    assert ssa.definitions[i_phi.args[1]] is ast[8].body.statements[1]
+    assert ast[4].expr.version == if_phi.version
+    # Variables assigned in nested functions are not tracked
+    assert ast[14].expr.version is None
+
+    interpreter = Interpreter()
+    interpreter.run(constant_propagation_program)
+    expected = capsys.readouterr().out
+    assert expected.split() == ['3', '6', '5', '10', '2', '12']
+
+    ast = Parser().run(constant_propagation_program)
+    Resolver().run(ast)
+    propagation = SparseConstantPropagation()
+    ast = propagation.run(ast)
+    assert ast[5].expr == Literal(6, Type.INT) and ast[9].expr == Literal(5, Type.INT)
+    assert isinstance(ast[4].expr, Variable) and isinstance(ast[14].expr, Variable)
+    assert propagation.replaced > 0 and propagation.folded > 0
+    # Program is translated out of SSA
+    assert not any('version' in vars(node) for node in NodeCollector().run(ast).values())
+
+    interpreter = Interpreter()
+    interpreter.run(constant_propagation_program, level=2)
+    assert capsys.readouterr().out == expected
+    assert interpreter.pass_stats['constant_propagation'].nodes_changed > 0
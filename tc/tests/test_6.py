@@ -0,0 +1,464 @@
+import asyncio
+import io
+import logging
+import numpy as np
+import pickle
+import pytest
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from tc import artifact
+from tc.benchmark import concatenation_benchmark
+from tc.common import Rope, Type, concat
+from tc.interpreter import ExecutionLimitExceeded, Interpreter
+from tc.optimization import MAX_LEVEL
+from tc.output import BufferedOutput, CaptureOutput, FileOutput
+from tc.parser import Call, Literal, Parser
+
+logging.basicConfig(level=logging.INFO)
+
+
+arrays_program = """
+    var a: array[int] = array[int](1, 2, 3, 4);
+    var b: array[float] = array[float](0.5, 1.5, 2.5, 3.5);
+    print a * 2 + a;
+    print b - 0.5;
+    print a[2] + len(a);
+    print sum(a) + max(a) - min(a);
+    print dot(b, b);
+    print any(a > 3) == all(a > 0);
+
+    def scale(v: array[int], k: int): array[int] {
+        return v * k
+    }
+    print scale(a, 3)[1];
+
+    var s: int = 0;
+    for (var i: int = 0; i < len(a); i = i + 1) {
+        s = s + a[i] * a[i]
+    }
+    assert s == dot(a, a);
+    print len(array[bool]())
+"""
+
+
+@pytest.mark.parametrize('level', range(MAX_LEVEL + 1))
+def test_arrays(level, capsys):
+    interpreter = Interpreter()
+    interpreter.run(arrays_program, level=level, red_opt=False)
+    assert capsys.readouterr().out.split('\n')[:-1] == [
+        '[ 3  6  9 12]', '[0. 1. 2. 3.]', '7', '13', '21.0', 'True', '6', '0'
+    ]
+
+
+def test_array_types():
+    [declaration, index] = Parser().run('var a: array[float] = array[float](1.5); a[0] * a[0]')
+    assert declaration.type == Type.ARRAY_FLOAT
+    assert declaration.value.name == 'array[float]'
+    assert index.left.op == '[]' and index.right.op == '[]'
+
+    for program in [
+        'var a: array[int] = array[int](1, 2.5)',
+        'var a: array[int] = array[float](1.5)',
+        'var a: array[int] = array[int](1); a + 1.5',
+        'var a: array[int] = array[int](1); a[0.5]',
+        'var a: array[int] = array[int](1); if (a == a) { print a }',
+    ]:
+        with pytest.raises(TypeError):
+            Interpreter().run(program)
+
+
+def test_implicit_multiplication_by_reverse_polish(capsys):
+    # '[' of a reverse polish expression right after a value still multiplies it
+    Interpreter().run("""
+        var y: int = 2;
+        print y [3 4 +];
+        print y[3 4 +];
+        print y [3];
+        print (y)[3 4 *];
+        def f(): int { return 3 }
+        print f() [1 1 +];
+        var a: array[int] = array[int](5, 6, 7);
+        print a[a[0] - 4] + f()
+    """)
+    assert capsys.readouterr().out.split('\n')[:-1] == ['14', '14', '6', '24', '6', '9']
+
+    # Breaking change: an infix expression in brackets right after a name indexes (multiplied before arrays)
+    [index, multiplication] = Parser().run('y[3]; y [3]')
+    assert index.op == '[]' and multiplication.op == '*'
+    with pytest.raises(TypeError):
+        Interpreter().run('var y: int = 2; print y[3]')
+
+
+def test_array_int_arithmetic_errors():
+    for program, error in [
+        ('var a: array[int] = array[int](2, 3); print a ** -1', ArithmeticError),
+        ('var a: array[int] = array[int](9223372036854775807); print a + 1', OverflowError),
+        ('var a: array[int] = array[int](4611686018427387904); print a * 2', OverflowError),
+        ('var a: array[int] = array[int](3037000500); print a ** 2', OverflowError),
+        ('var a: array[int] = array[int](9223372036854775807, 1); print sum(a)', OverflowError),
+    ]:
+        with pytest.raises(error):
+            Interpreter().run(program)
+
+
+math_program = """
+    print sqrt(16) + exp(0) + log(1);
+    print abs(-3) + abs(2) * floor(2.7);
+    print pow(2, 10) + floor(-0.5);
+    print min(3, 7) + max(3, 7);
+    print max(0.5, -1.5);
+    print min(array[float](2.5, -1.5, 0.5)) + max(array[float](2.5, -1.5));
+    print sin(0) + cos(0)
+"""
+
+
+def test_native_builtins(capsys):
+    interpreter = Interpreter()
+    interpreter.run(math_program)
+    assert capsys.readouterr().out.split() == ['5.0', '7', '1023', '10', '0.5', '1.0', '1.0']
+
+    # Plain Python callables, called with evaluated arguments
+    sqrt = interpreter.eval.globals.resolve_fun('sqrt', level=0)
+    assert sqrt.native and sqrt.fun(2.25) == 1.5
+    assert interpreter.eval.visit(Call('sqrt', [Literal(4, Type.INT)], scope_depth=0)) == 2.0
+
+    for program in ['print sqrt(1, 2)', 'print min(1)', 'print abs(true)', 'print floor(array[int](1))']:
+        with pytest.raises(TypeError):
+            Interpreter().run(program)
+
+    # User defined functions shadow builtins
+    Interpreter().run('def log(x: int): int { return x * 2 } print log(4)')
+    assert capsys.readouterr().out == '8\n'
+
+
+strings_program = """
+    var s: string = '';
+    var i: int = 0;
+    while (i < 5) {
+        s = s + tostring(i);
+        i = i + 1
+    }
+    var t: string = s + 'a';
+    var u: string = s + 'b';
+    print t + u;
+    print toint(s) + 1;
+    assert tostring(s) == '01234';
+    assert s != t;
+
+    def exclaim(x: string): string {
+        return x + '!'
+    }
+    print exclaim(s) + exclaim(s)
+"""
+
+
+@pytest.mark.parametrize('level', [0, MAX_LEVEL])
+def test_ropes(level, capsys):
+    interpreter = Interpreter()
+    interpreter.run(strings_program, level=level, red_opt=False)
+    assert capsys.readouterr().out.split() == ['01234a01234b', '1235', '01234!01234!']
+
+    # Appending to the newest rope extends shared pieces, older ropes copy them
+    a = concat('x', 'y')
+    b = concat(a, 'z')
+    c = concat(a, 'w')
+    assert b.pieces is a.pieces and c.pieces is not a.pieces
+    assert (str(a), str(b), str(c)) == ('xy', 'xyz', 'xyw')
+    assert concat(b, c) == 'xyzxyw' and hash(b) == hash('xyz') and isinstance(concat('', c), Rope)
+
+
+def test_concatenation_benchmark():
+    results = concatenation_benchmark(size=4096, piece_length=16)
+    assert [m.error for m in results.values()] == [None, None]
+
+
+def test_output_sinks(tmp_path, capsys):
+    output = CaptureOutput()
+    interpreter = Interpreter(output=output)
+    interpreter.run('print 1; print "two"; print 3.5 + 1.0')
+    assert output.lines() == ['1', 'two', '4.5'] and capsys.readouterr().out == ''
+
+    # Buffered output is written in chunks and flushed after each run, even a failed one
+    stream = io.StringIO()
+    interpreter = Interpreter(output=BufferedOutput(stream, buffer_size=6))
+    with pytest.raises(AssertionError):
+        interpreter.run('print 12; print 34; print 56; assert false')
+    assert stream.getvalue() == '12\n34\n56\n'
+
+    stream = io.StringIO()
+    output = BufferedOutput(stream, buffer_size=6)
+    Interpreter(output=output).run('for (var i: int = 0; i < 3; i = i + 1) { print i }')
+    output.write('x\n')
+    assert stream.getvalue() == '0\n1\n2\n' and output.size == 2
+
+    output = FileOutput(str(tmp_path / 'out.txt'))
+    Interpreter(output=output).run('print "file"')
+    output.close()
+    assert (tmp_path / 'out.txt').read_text() == 'file\n'
+
+
+def test_run_async():
+    output = CaptureOutput()
+    program = 'var i: int = 0; while (i < 3) { print "%s"; i = i + 1 }'
+
+    async def run_programs():
+        await asyncio.gather(*[Interpreter(output=output).run_async(program % c, steps_per_yield=1) for c in 'ab'])
+
+    # Programs are interleaved - each yields after every iteration
+    asyncio.run(run_programs())
+    assert output.lines() == ['a', 'b', 'a', 'b', 'a', 'b']
+
+    async def cancel_infinite_loop():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while ticks < 10:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        interpreter = Interpreter()
+        task = asyncio.ensure_future(interpreter.run_async('while (true) { }', steps_per_yield=10))
+        await ticker()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return interpreter.eval.steps
+
+    # Infinite loop does not starve other tasks and stops when cancelled
+    assert asyncio.run(cancel_infinite_loop()) >= 100
+
+    with pytest.raises(AssertionError):
+        asyncio.run(Interpreter().run_async('var y: int = 1; assert y == 2'))
+
+
+def test_execution_limits():
+    program = '''
+    def spin(n: int): int {
+        var i: int = 0;
+        while (true) { i = i + 1 }
+        return n
+    }
+    print spin(1)
+    '''
+
+    # Step budget - counted at loop iterations and calls, the call stack is reported
+    interpreter = Interpreter()
+    with pytest.raises(ExecutionLimitExceeded) as e:
+        interpreter.run(program, max_steps=100)
+    assert e.value.steps == interpreter.steps == 100
+    assert e.value.call_stack == ['spin']
+    assert interpreter.eval.call_stack == []
+
+    # Wall-clock deadline
+    with pytest.raises(ExecutionLimitExceeded) as e:
+        Interpreter().run(program, timeout=0.05)
+    assert 'Deadline' in str(e.value)
+
+    with pytest.raises(ExecutionLimitExceeded):
+        asyncio.run(Interpreter().run_async(program, max_steps=1000, steps_per_yield=10))
+
+    # Limits apply to a single run, steps of each run are reported
+    output = CaptureOutput()
+    interpreter = Interpreter(output=output)
+    interpreter.run('var i: int = 0; while (i < 10) { i = i + 1 } print i', max_steps=11)
+    assert interpreter.steps == 10
+    interpreter.run('var j: int = 0; while (j < 1000) { j = j + 1 } print j')
+    assert interpreter.steps == 1000
+    assert output.lines() == ['10', '1000']
+
+    # The interpreter is usable after a limit hit within a top-level loop
+    with pytest.raises(ExecutionLimitExceeded):
+        interpreter.run('for (var k: int = 0; true; k = k + 1) { }', max_steps=50)
+    assert interpreter.eval.env is interpreter.eval.globals
+    interpreter.run('var x: int = 5; def f(): int { return x } print f()')
+    assert 'x' in interpreter.eval.globals.variables
+    assert output.lines() == ['10', '1000', '5']
+
+
+@pytest.mark.parametrize('level', [0, MAX_LEVEL])
+def test_fork(level):
+    prelude = '''
+    var calls: int = 0;
+    var greeting: string = "hello";
+    def square(x: int): int { calls = calls + 1; return x * x }
+    def fib(n: int): int {
+        var a: int = 0; var b: int = 1;
+        for (var i: int = 0; i < n; i = i + 1) { var t: int = a + b; a = b; b = t }
+        return a
+    }
+    '''
+    snapshot = Interpreter()
+    snapshot.run(prelude, opt=True, red_opt=False)
+
+    outputs = [CaptureOutput() for _ in range(2)]
+    forks = [snapshot.fork(output=output) for output in outputs]
+    # Functions of the prelude are unknown to optimizers of the forks, their calls are kept as they are
+    forks[0].run('greeting = "hi"; print square(3) + fib(10); print calls; print greeting', level=level)
+    forks[1].run('var x: int = square(4); print calls; print greeting; def square2(x: int): int { return x }',
+                 level=level)
+    forks[0].run('print calls', level=level)
+    assert outputs[0].lines() == ['64', '1', 'hi', '1']
+    assert outputs[1].lines() == ['1', 'hello']
+
+    # Snapshot and other forks are not affected by runs of a fork
+    assert snapshot.eval.globals.variables['calls'] == 0
+    assert 'x' not in snapshot.eval.globals.variables
+    assert 'square2' not in snapshot.eval.globals.functions
+    forks[0].run('def square2(x: int): int { return x }')
+
+    # Prelude is not analysed again - forks share the function bodies
+    assert forks[0].eval.globals.functions['fib'].body is snapshot.eval.globals.functions['fib'].body
+    with pytest.raises(TypeError):
+        snapshot.fork().run('var s: string = fib(2)')
+
+
+def test_load():
+    output = CaptureOutput()
+    interpreter = Interpreter(output=output)
+    module = interpreter.load('''
+    var weight: float = 0.5;
+    var scored: int = 0;
+    def score(a: int, b: float): float { scored = scored + 1; return tofloat(a) * weight + b }
+    def label(n: int): string { var s: string = "item"; return s + tostring(n) }
+    def mean(xs: array[float]): float { return sum(xs) / tofloat(len(xs)) }
+    def log_value(x: int) { print x }
+    print "loaded"
+    ''', opt=True)
+    assert module.functions == ['score', 'label', 'mean', 'log_value']
+
+    assert module.call('score', 3, 4.5) == 6.0
+    assert module.call('score', 1, 1.0) == 1.5
+    assert module.call('label', 7) == 'item7'
+    assert module.call('mean', np.array([1.0, 2.0, 6.0])) == 3.0
+    assert module.call('log_value', 42) is None
+    assert output.lines() == ['loaded', '42']
+
+    # Functions are bound once per combination of argument types, globals persist between calls
+    assert len(module.bound) == 4
+    assert interpreter.eval.globals.variables['scored'] == 2
+    score = module.bind('score', Type.INT, Type.FLOAT)
+    assert [score(i, 0.0) for i in range(4)] == [0.0, 0.5, 1.0, 1.5]
+    assert score.return_type == Type.FLOAT
+
+    with pytest.raises(TypeError):
+        module.call('score', 3, 4)
+    with pytest.raises(TypeError):
+        module.bind('label', Type.STRING)
+    with pytest.raises(TypeError):
+        module.call('label', [1])
+    with pytest.raises(Exception, match='not defined'):
+        module.call('sqrt', 2.0)
+
+
+@pytest.mark.parametrize('level', range(1, MAX_LEVEL + 1))
+def test_load_optimized(level):
+    # Functions never called by the program itself (nor definitions they depend on) are not redundant
+    interpreter = Interpreter()
+    module = interpreter.load('''
+    var total: int = 0;
+    var scale: int = 3;
+    def add(n: int): int { total = total + n * scale; return total }
+    def reset() { total = 0 }
+    ''', level=level)
+    assert module.functions == ['add', 'reset']
+    assert [module.call('add', n) for n in range(1, 4)] == [3, 9, 18]
+    module.call('reset')
+    assert interpreter.eval.globals.variables['total'] == 0
+
+
+def test_artifact(tmp_path):
+    program = """
+    def fib(n: int): int {
+        var a: int = 0; var b: int = 1;
+        for (var i: int = 0; i < n; i = i + 1) { var t: int = a + b; a = b; b = t }
+        return a
+    }
+    def counter(): int {
+        var n: int = 0;
+        def inc(): int { n = n + 1; return n }
+        inc();
+        return inc()
+    }
+    var s: string = "fib";
+    for (var i: int = 0; i < 5; i = i + 1) { s = s + tostring(fib(i)) }
+    print s;
+    print counter();
+    print sum(array[float](0.5, 1.5))
+    """
+    path = str(tmp_path / 'program.tcc')
+    artifact.save(Interpreter().compile(program, level=MAX_LEVEL, red_opt=False), path)
+    assert artifact.is_artifact(path)
+
+    output = CaptureOutput()
+    evaluator = artifact.run(path, output)
+    assert output.lines() == ['fib01123', '2', '2.0']
+    assert evaluator.steps > 0
+
+    # Loader imports neither PLY nor the front end
+    script = (f'import sys; from tc import artifact; artifact.run({path!r}); '
+              f'print(sorted(m for m in sys.modules if m.startswith(("ply", "tc.parser", "tc.optimization"))))')
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    assert result.stdout.splitlines() == ['fib01123', '2', '2.0', '[]']
+
+    data = open(path, 'rb').read()
+    with pytest.raises(artifact.ArtifactError, match='format version'):
+        artifact.loads(artifact.HEADER.pack(artifact.MAGIC, artifact.FORMAT_VERSION + 1) + data[artifact.HEADER.size:])
+    with pytest.raises(artifact.ArtifactError, match='Not a compiled'):
+        artifact.loads(b'var x: int = 1')
+    with pytest.raises(artifact.ArtifactError, match='forbidden'):
+        artifact.loads(artifact.HEADER.pack(artifact.MAGIC, artifact.FORMAT_VERSION) +
+                       zlib.compress(pickle.dumps([Interpreter])))
+
+
+def test_sampling_profiler():
+    program = """
+    def hot(n: int): int {
+        var s: int = 0;
+        for (var i: int = 0; i < n; i = i + 1) { s = s + i % 7 }
+        return s
+    }
+    def cold(): int { return 1 }
+    print hot(10000) + cold()
+    """
+    interpreter = Interpreter(output=CaptureOutput())
+
+    # Started at runtime, while the program is being evaluated
+    timer = threading.Timer(0.02, interpreter.start_profiling, kwargs={'interval': 0.001})
+    timer.start()
+    interpreter.run(program)
+    timer.join()
+    profiler = interpreter.stop_profiling()
+    assert not profiler.running
+    assert interpreter.output.lines() == ['29995']
+
+    functions = profiler.functions()
+    assert functions['hot'][0] > 0.8 * sum(profiler.samples.values())
+    assert functions['<top>'][1] == sum(profiler.samples.values())
+    for line in profiler.collapsed().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack.startswith('<top>;') and int(count) > 0
+    assert 'hot' in profiler.report()
+
+    # Samples are collected until stopped, profiler is reused
+    samples = sum(profiler.samples.values())
+    assert interpreter.start_profiling() is profiler
+    interpreter.run('print hot(3000)')
+    interpreter.stop_profiling()
+    assert sum(profiler.samples.values()) >= samples
+
+
+def test_profiler_idle():
+    interpreter = Interpreter(output=CaptureOutput())
+    module = interpreter.load('def inc(n: int): int { return n + 1 } print inc(1)')
+    assert module.call('inc', 2) == 3
+
+    # Nothing is evaluated between runs and calls from Python - no samples
+    profiler = interpreter.start_profiling(interval=0.001)
+    time.sleep(0.05)
+    interpreter.stop_profiling()
+    assert interpreter.eval.statement is None
+    assert not profiler.samples